@@ -300,12 +300,14 @@ class DeviceProvider with ChangeNotifier, WidgetsBindingObserver {
       final MqttPublishMessage recMess = c[0].payload as MqttPublishMessage;
       final String topic = c[0].topic;
       final String payloadText = MqttPublishPayload.bytesToStringAsString(recMess.payload.message);
+      // 구독 직후 브로커가 보내 주는 보관(retained) 메시지는 지금 장치가 살아 있다는 뜻이 아님
+      final bool retained = recMess.header?.retain ?? false;
 
       // 디버깅용 로그 (필요시 주석 해제)
-      // print('MQTT 수신: Topic=[$topic], Payload=[$payloadText]');
+      // print('MQTT 수신: Topic=[$topic], Payload=[$payloadText], retained=$retained');
 
       // 수신된 메시지 처리
-      _handleMqttMessage(topic, payloadText);
+      _handleMqttMessage(topic, payloadText, retained: retained);
     });
   }
 
@@ -363,10 +365,10 @@ class DeviceProvider with ChangeNotifier, WidgetsBindingObserver {
    * @param topic 메시지를 받은 토픽
    * @param payload 메시지 내용
    */
-  void _handleMqttMessage(String topic, String payload) {
+  void _handleMqttMessage(String topic, String payload, {bool retained = false}) {
     // 도징 펌프 토픽 우선 처리 (uniqueID/DOSE/...)
     if (_isDoseTopic(topic)) {
-      _handleDoseMessage(topic, payload);
+      _handleDoseMessage(topic, payload, retained: retained);
       return;
     }
     // waterlevel 토픽 예: uniqueID/Wlv
@@ -550,7 +552,7 @@ class DeviceProvider with ChangeNotifier, WidgetsBindingObserver {
     return List<WaterLevelRecord>.from(info.history);
   }
 
-  void _handleDoseMessage(String topic, String payload) {
+  void _handleDoseMessage(String topic, String payload, {bool retained = false}) {
     final parts = topic.split('/');
     if (parts.length < 3) return;
     final deviceId = parts[0]; // uniqueID
@@ -616,6 +618,18 @@ class DeviceProvider with ChangeNotifier, WidgetsBindingObserver {
           }
         } else if (tail == 'online') {
           info.online = payload.trim().toLowerCase() == 'true';
+        } else if (tail == 'health') {
+          // 상태 프레임 (Heartbeat 'a' 대체), 키는 펌웨어 health_frame 참고.
+          // 펌프 상태는 sta/pump1, sta/pump2 만 따른다 (보관된 옛 프레임이 최신 펌프 상태를 덮어쓰지 않도록).
+          // 보관 메시지는 장치가 꺼진 뒤에도 남아 있으므로 실시간으로 받은 프레임만 생존 신호로 본다.
+          try {
+            final data = jsonDecode(payload);
+            if (data is Map<String, dynamic> && !retained) {
+              info.lastHeartbeat = DateTime.now();
+            }
+          } catch (e) {
+            print('DOSE 상태 프레임 파싱 오류: $e');
+          }
         } else if (tail == 'log') {
           info.lastLog = payload;
         }
@@ -636,6 +650,12 @@ class DeviceProvider with ChangeNotifier, WidgetsBindingObserver {
   //   sendMqttMessage(topic, 'req');
   // }
   
+  // 도징 화면을 보는 동안 주기적으로 호출: 펌웨어가 seconds 동안 상태 프레임(sta/health)을 빠른 간격으로 발행
+  void watchDose(String deviceId, {int seconds = 120}) {
+    final topic = '${_doseBase(deviceId)}/con/watch';
+    sendMqttMessage(topic, '$seconds');
+  }
+
   void dosePumpOn(String deviceId, int pump) {
     final topic = '${_doseBase(deviceId)}/con/pump$pump';
     sendMqttMessage(topic, 'ON');
@@ -1,3 +1,4 @@
+import 'dart:async';
 import 'package:flutter/material.dart';
 import 'package:provider/provider.dart';
 import 'device_provider.dart';
@@ -18,6 +19,25 @@ class _DoseSettingsScreenState extends State<DoseSettingsScreen> {
   int _minute = 0;
   int _durationMs = 1000;
   int _intervalDays = 1;
+  Timer? _watchTimer;
+
+  @override
+  void initState() {
+    super.initState();
+    // 화면을 보는 동안 장치가 상태 프레임을 빠르게 보내도록 알림 (유지 시간 120초보다 짧은 주기로 갱신)
+    _watchDevice();
+    _watchTimer = Timer.periodic(const Duration(seconds: 60), (_) => _watchDevice());
+  }
+
+  @override
+  void dispose() {
+    _watchTimer?.cancel();
+    super.dispose();
+  }
+
+  void _watchDevice() {
+    context.read<DeviceProvider>().watchDose(widget.deviceId);
+  }
 
   @override
   Widget build(BuildContext context) {
@@ -8,21 +8,14 @@ import uos
 import ujson
 import _thread # 스레딩 모듈
 import gc # Garbage Collector
+import array
+import struct
+from micropython import const
 
 # WDT (Watchdog Timer) 설정 - 20초
 wdt = machine.WDT(timeout=320000)  # 20초 (20000ms)
 
-# *** MQTT 라이브러리 임포트 (사용자 제공 라이브러리 기준) ***
-# *** 'umqtt/simple.py' 파일이 기기에 존재해야 함 ***
-try:
-    from umqtt.simple import MQTTClient, MQTTException
-except ImportError:
-    print("오류: 'umqtt/simple.py' 라이브러리를 찾을 수 없습니다.")
-    print("기기 파일 시스템에 라이브러리를 업로드하세요.")
-    # 여기서 프로그램을 중단하거나, MQTT 기능 없이 계속 진행하도록 선택할 수 있습니다.
-    # 예: raise ImportError("umqtt.simple not found")
-    MQTTClient = None # MQTT 기능 비활성화
-    MQTTException = Exception # 기본 Exception 사용
+# MQTT 는 아래 AsyncMQTTClient (uasyncio 스트림 기반) 를 사용하므로 umqtt 라이브러리가 필요 없음
 
 import ubinascii # Client ID 생성을 위해 추가
 
@@ -44,16 +37,37 @@ CLIENT_ID =ubinascii.hexlify(machine.unique_id()).decode()
 # *** Keep-Alive 설정 (제공된 라이브러리는 connect 시 사용) ***
 MQTT_KEEP_ALIVE = 60              # MQTT Keep-Alive 간격 (초)
 MQTT_RECONNECT_DELAY_S = 10           # MQTT 재연결 시도 간격 (초)
+MQTT_SUPERVISOR_MAX_WAIT_MS = 5000    # 연결 중 감독 태스크가 Wi-Fi 상태를 다시 확인하기까지 최대 대기 (ms)
+MQTT_WIFI_CHECK_MS = 1000             # Wi-Fi 끊김 중 상태 확인 간격 (ms)
 
 # MQTT 로그 설정
 MQTT_LOG_ENABLED = True              # MQTT 로그 발행 활성화/비활성화 (False로 설정하면 로그 발행 중단)
 MQTT_LOG_MAX_LENGTH = 200            # MQTT 로그 메시지 최대 길이 (바이트)
 MQTT_LOG_LEVEL = "INFO"              # 로그 레벨: "DEBUG", "INFO", "WARNING", "ERROR"
-
-# MQTT Heartbeat 설정
-MQTT_HEARTBEAT_ENABLED = True        # Heartbeat 발행 활성화/비활성화
-MQTT_HEARTBEAT_INTERVAL_SEC = 5     # Heartbeat 발행 간격 (초) - 기본 30초
-MQTT_HEARTBEAT_PAYLOAD = "a"         # Heartbeat 메시지 내용
+MQTT_LOG_RING_SIZE = 32              # MQTT 로그 링 버퍼 크기 (레코드 수, 가득 차면 새 로그는 버려짐)
+MQTT_LOG_BATCH_RECORDS = 16          # 이만큼 쌓이면 즉시 배치 발행
+MQTT_LOG_BATCH_MAX_BYTES = 1024      # 배치 1회 발행 최대 크기 (바이트)
+MQTT_LOG_FLUSH_INTERVAL_MS = 1000    # 첫 레코드 적재 후 최대 대기 시간 (ms)
+MQTT_LOG_POLL_MS = 100               # 로그 발행 태스크 점검 주기 (ms)
+
+# 로그 레벨 설정 (숫자가 클수록 중요)
+LOG_DEBUG = const(10)
+LOG_INFO = const(20)
+LOG_WARNING = const(30)
+LOG_ERROR = const(40)
+_LOG_LEVEL_VALUES = {"DEBUG": LOG_DEBUG, "INFO": LOG_INFO, "WARNING": LOG_WARNING, "ERROR": LOG_ERROR}
+LOG_CONSOLE_LEVEL = "INFO"           # 콘솔 출력 최소 레벨 ("DEBUG"로 바꾸면 DEBUG 로그도 출력)
+# DEBUG 로그 호출부 빌드 포함 여부 (0: `if DEBUG_LOG_BUILD:` 블록이 컴파일 단계에서 제거됨)
+DEBUG_LOG_BUILD = const(0)
+
+# 태스크 성능 계측 발행 설정
+MQTT_PERF_PUBLISH_INTERVAL_SEC = 600  # sta/perf 주기 발행 간격 (초), 0이면 요청 시에만 발행
+MQTT_MEM_PUBLISH_INTERVAL_SEC = 600   # sta/mem 주기 발행 간격 (초), 0이면 요청 시에만 발행
+
+# MQTT 상태 프레임 (sta/health) 설정 - 온라인 여부는 Last Will(sta/online)로 알림
+MQTT_HEALTH_FAST_INTERVAL_SEC = 5     # 앱이 보고 있는 동안(con/watch 또는 명령 수신 후) 발행 간격 (초)
+MQTT_HEALTH_SLOW_INTERVAL_SEC = 300   # 평상시 발행 간격 (초)
+MQTT_HEALTH_WATCH_SEC = 120           # con/watch(또는 명령) 수신 후 빠른 간격을 유지하는 시간 (초)
 
 # MQTT 토픽 설정 (공통 포맷 적용)
 MQTT_BASE_TOPIC = f"{CLIENT_ID}/DOSE"
@@ -61,13 +75,28 @@ MQTT_PUMP1_COMMAND_TOPIC = f"{MQTT_BASE_TOPIC}/con/pump1"
 MQTT_PUMP2_COMMAND_TOPIC = f"{MQTT_BASE_TOPIC}/con/pump2"
 MQTT_SCHEDULE_ADD_TOPIC = f"{MQTT_BASE_TOPIC}/con/schedule/add"
 MQTT_SCHEDULE_DELETE_TOPIC = f"{MQTT_BASE_TOPIC}/con/schedule/delete"
+MQTT_SCHEDULE_SET_TOPIC = f"{MQTT_BASE_TOPIC}/con/schedule/set" # 펌프별 스케줄 전체 일괄 교체
 MQTT_REQUEST_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/con/request_status"
+MQTT_PERF_REQUEST_TOPIC = f"{MQTT_BASE_TOPIC}/con/perf" # 성능 계측 요청 ("reset" 이면 발행 후 초기화)
+MQTT_STALL_REQUEST_TOPIC = f"{MQTT_BASE_TOPIC}/con/stalls" # 이벤트 루프 정지 보고 요청
+MQTT_MEM_REQUEST_TOPIC = f"{MQTT_BASE_TOPIC}/con/mem" # 힙 메모리 보고 요청
+MQTT_WATCH_TOPIC = f"{MQTT_BASE_TOPIC}/con/watch" # 앱이 보는 중 (페이로드: 빠른 상태 프레임 유지 초, 비우면 기본값)
+MQTT_COMMAND_SUBSCRIPTION = f"{MQTT_BASE_TOPIC}/con/#" # 위 명령 토픽 전체 (구독 하나)
 MQTT_PUMP1_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/pump1"
 MQTT_PUMP2_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/pump2"
 MQTT_SCHEDULE_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/schedules"
-MQTT_ONLINE_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/online"
+MQTT_SCHEDULE_ACK_TOPIC = f"{MQTT_BASE_TOPIC}/sta/schedule/ack" # con/schedule/set 결과 (버전 포함)
+MQTT_SCHEDULE_VERSION_TOPIC = f"{MQTT_BASE_TOPIC}/sta/schedule/version" # {"version", "hash"} (retained)
+MQTT_SCHEDULE_DELTA_TOPIC = f"{MQTT_BASE_TOPIC}/sta/schedule/delta" # 변경분 {"version", "pump", "added", "removed"}
+MQTT_ONLINE_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/online" # "true" / "false" (연결 끊김은 Last Will 로 "false")
+MQTT_HEALTH_TOPIC = f"{MQTT_BASE_TOPIC}/sta/health" # 상태 프레임 (retained, health_frame 참고)
 MQTT_LOG_TOPIC = f"{MQTT_BASE_TOPIC}/sta/log" # 로그/에러 메시지 발행용
-MQTT_HEARTBEAT_TOPIC = f"{CLIENT_ID}/DOSE/a" # Heartbeat 토픽 (폰 앱 공통)
+MQTT_PERF_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/perf" # 태스크 지연 히스토그램 발행용
+MQTT_STALL_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/stalls" # 이벤트 루프 정지(최악 사례) 보고용
+MQTT_MEM_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/mem" # 힙 메모리 보고용
+MQTT_MISSED_DOSE_TOPIC = f"{MQTT_BASE_TOPIC}/sta/missed" # 누락 투여 보충/건너뜀 보고용
+MQTT_DOSE_QUEUE_STATUS_TOPIC = f"{MQTT_BASE_TOPIC}/sta/queue" # 펌프별 투여 대기열 [건수, 총 ms]
+MQTT_DOSE_EVENT_TOPIC = f"{MQTT_BASE_TOPIC}/sta/dose" # 끝난 투여 이벤트 (QoS 1, 일련번호 seq)
 
 # 핀 설정 (***사용하는 ESP32-S2 보드 및 연결에 맞게 반드시 수정***)
 I2C_SCL_PIN = 9
@@ -95,11 +124,31 @@ DEFAULT_PUMP_DURATION_MS = 5000 # 예: 5초
 MAX_PUMP_DURATION_SEC = 3600 # 최대 펌프 작동 시간 (초) - 스케줄 편집용
 MIN_PUMP_DURATION_SEC = 1 # 최소 펌프 작동 시간 (초) - 스케줄 편집용
 
+# 누락 투여 처리 (재부팅, 시간 미동기화 등으로 지나간 스케줄)
+# "late": 늦게라도 실행, "skip": 건너뜀, "window": 예정 시각 후 MISSED_DOSE_WINDOW_MIN 분 이내면 실행
+MISSED_DOSE_POLICY = {1: "window", 2: "window"}
+MISSED_DOSE_WINDOW_MIN = {1: 60, 2: 60}
+MISSED_DOSE_LOOKBACK_SEC = 24 * 3600  # 이보다 오래된 누락은 보충/보고하지 않음
+
+# 투여 큐 (펌프 작동 중 들어온 투여는 버리지 않고 펌프별 대기열에서 이어서 실행)
+DOSE_QUEUE_MAX_DEPTH = 8              # 펌프별 최대 대기 건수
+DOSE_QUEUE_MAX_ML = 100               # 펌프별 대기 중 총 투여량 상한 (ml, pump_ml_ms 로 시간 환산)
+
+# 투여 이벤트 (끝난 투여마다 일련번호 이벤트를 플래시에 남기고 MQTT QoS 1 로 전송, PUBACK 을 받으면 삭제)
+DOSE_EVENT_FILENAME = "dose_events.bin"
+DOSE_EVENT_MAX_PENDING = 64           # 미확인 이벤트 최대 보관 수 (넘으면 가장 오래된 것부터 버림 -> 일련번호 공백)
+DOSE_EVENT_INFLIGHT_MAX = 4           # PUBACK 을 기다리는 동시 전송 수
+DOSE_EVENT_ACK_TIMEOUT_MS = 10000     # 이 시간 안에 PUBACK 이 없으면 다시 전송 (ms)
+
 # 시간대 오프셋 (UTC+9 for KST)
 TIMEZONE_OFFSET = 9 * 3600
 
 # 스케줄 저장 파일명
 SCHEDULE_FILENAME = "schedules.json"
+# 스케줄 변경 저널 (추가/삭제 한 건당 SCHED_JOURNAL_RECORD_SIZE 바이트 추가 기록, 압축 시 schedules.json 으로 합침)
+SCHEDULE_JOURNAL_FILENAME = "schedules.jnl"
+SCHED_JOURNAL_COMPACT_ENTRIES = 32          # 저널 항목이 이만큼 쌓이면 즉시 압축
+SCHED_JOURNAL_IDLE_COMPACT_MS = 10 * 60 * 1000  # 마지막 변경 후 이 시간 동안 변경이 없으면 압축 (ms)
 
 # Uptime / auto-reboot 설정
 UPTIME_FILENAME = "uptime.json"
@@ -153,8 +202,10 @@ wlan = None
 mqtt_client = None
 mqtt_connected = False
 mqtt_connection_attempt_time = 0 # 마지막 연결 시도 시간 기록
-last_mqtt_publish_time = 0 # 주기적 상태 발행용
-last_heartbeat_time = 0 # 마지막 Heartbeat 발행 시간
+mqtt_connecting = False # connect_mqtt 진행 중 (여러 태스크가 동시에 연결하지 않도록)
+mqtt_connect_count = 0 # MQTT 연결 성공 횟수 (상태 프레임 오류 카운터)
+last_perf_publish_time = 0 # 마지막 sta/perf 발행 시간
+last_mem_publish_time = 0 # 마지막 sta/mem 발행 시간
 
 # WiFi 연결 관리 전역 변수
 wifi_connection_attempts = 0
@@ -174,7 +225,8 @@ wifi_rssi_history = [0, 0, 0, 0, 0]  # 최근 5개 RSSI 값
 wifi_rssi_index = 0
 wifi_current_network_index = 0
 
-schedules = {1: [], 2: []} # {pump_id: [(hour, minute, duration_ms, interval_days), ...]}
+schedules = {} # {pump_id: ScheduleStore} - load_schedules()에서 채움, 항목은 (hour, minute, duration_ms, interval_days)
+schedule_version = 0 # 스케줄이 바뀔 때마다 1 증가 (스냅샷의 "version" + 저널 레코드 수)
 pump_tasks = {1: None, 2: None} # 현재 실행 중인 펌프 작업 (asyncio task)
 
 current_screen = "MAIN" # UI 상태: MAIN, SELECT_PUMP, VIEW_SCHEDULE, ADD_SCHEDULE, PUMP_MENU, CALIBRATE_PUMP, CALIBRATE_INPUT
@@ -230,19 +282,43 @@ def safe_force_screen_update():
         force_screen_update = True
         return True
     else:
-        log_message("DEBUG: Screen update blocked - in calibration mode", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("Screen update blocked - in calibration mode")
         return False
 
-def log_message(msg, publish_mqtt=True, level="INFO"):
-    """콘솔과 MQTT로 로그 메시지 출력 (개선된 버전)"""
-    print(msg)
+def _log_level_value(level):
+    """로그 레벨 이름 -> 숫자 (알 수 없는 이름은 INFO로 취급)"""
+    return _LOG_LEVEL_VALUES.get(level, LOG_INFO)
+
+_console_log_threshold = _log_level_value(LOG_CONSOLE_LEVEL)
+_mqtt_log_threshold = _log_level_value(MQTT_LOG_LEVEL)
+# 콘솔/MQTT 중 어느 한 곳이라도 출력될 수 있는 최소 레벨 (이보다 낮으면 즉시 반환)
+_log_min_threshold = min(_console_log_threshold, _mqtt_log_threshold)
+
+def set_log_levels(console_level=None, mqtt_level=None):
+    """런타임에 콘솔/MQTT 로그 레벨 변경 ("DEBUG", "INFO", "WARNING", "ERROR")"""
+    global _console_log_threshold, _mqtt_log_threshold, _log_min_threshold
+    if console_level is not None:
+        _console_log_threshold = _log_level_value(console_level)
+    if mqtt_level is not None:
+        _mqtt_log_threshold = _log_level_value(mqtt_level)
+    _log_min_threshold = min(_console_log_threshold, _mqtt_log_threshold)
+
+log_warning_count = 0   # WARNING 로그 누적 수 (상태 프레임)
+log_error_count = 0     # ERROR 로그 누적 수
+
+def _emit_log(msg, level, publish_mqtt):
+    """레벨 검사를 통과한 메시지를 콘솔/MQTT로 출력"""
+    global log_warning_count, log_error_count
+    if level >= LOG_ERROR:
+        log_error_count += 1
+    elif level >= LOG_WARNING:
+        log_warning_count += 1
+    if level >= _console_log_threshold:
+        print(msg)
     
     # MQTT 로그 발행 조건 확인
-    if not publish_mqtt or not MQTT_LOG_ENABLED or not mqtt_connected or not mqtt_client:
-        return
-    
-    # 로그 레벨 필터링
-    if level == "DEBUG" and MQTT_LOG_LEVEL != "DEBUG":
+    if not publish_mqtt or level < _mqtt_log_threshold or not MQTT_LOG_ENABLED:
         return
     
     try:
@@ -254,20 +330,124 @@ def log_message(msg, publish_mqtt=True, level="INFO"):
             msg_bytes = truncated_msg.encode('utf-8')
             print(f"MQTT 로그 메시지 길이 제한으로 잘림: {len(msg.encode('utf-8'))} -> {len(msg_bytes)} bytes")
         
-        # QoS 0으로 발행하여 블로킹 방지
-        mqtt_client.publish(MQTT_LOG_TOPIC, msg_bytes, qos=0)
+        # 직접 발행하지 않고 링 버퍼에 적재 (mqtt_log_shipper_task가 묶어서 발행)
+        _log_ring_push(msg_bytes)
         
-    except OSError as e:
-        # 네트워크 오류 (연결 끊김 등)
-        print(f"MQTT 로그 발행 실패 (OSError): {e}")
-        # 연결 상태는 다른 곳에서 관리
     except MemoryError as e:
         # 메모리 부족
-        print(f"MQTT 로그 발행 실패 (메모리 부족): {e}")
-        gc.collect()  # 가비지 컬렉션 시도
+        print(f"MQTT 로그 적재 실패 (메모리 부족): {e}")
+        gc_collect_now()  # 가비지 컬렉션 시도
     except Exception as e:
         # 기타 오류
-        print(f"MQTT 로그 발행 실패: {e}")
+        print(f"MQTT 로그 적재 실패: {e}")
+
+# --- MQTT 로그 링 버퍼 ---
+# 고정 크기 슬롯 배열. 버튼/캘리브레이션 스레드에서도 로그가 들어오므로 락으로 보호한다.
+_log_ring = [None] * MQTT_LOG_RING_SIZE
+_log_ring_head = 0   # 가장 오래된 레코드 위치
+_log_ring_count = 0  # 적재된 레코드 수
+_log_ring_first_ms = 0  # 버퍼가 비어있다가 처음 적재된 시각
+_log_ring_lock = _thread.allocate_lock()
+mqtt_log_dropped = 0  # 버퍼가 가득 차 버려진 레코드 누적 수
+_mqtt_log_dropped_reported = 0  # 마지막으로 MQTT에 보고한 drop 누적 수
+
+def _log_ring_push(msg_bytes):
+    """링 버퍼에 로그 레코드 추가 (가득 차면 새 레코드를 버리고 카운트)"""
+    global _log_ring_count, _log_ring_first_ms, mqtt_log_dropped
+    with _log_ring_lock:
+        if _log_ring_count >= MQTT_LOG_RING_SIZE:
+            mqtt_log_dropped += 1
+            return
+        if _log_ring_count == 0:
+            _log_ring_first_ms = time.ticks_ms()
+        _log_ring[(_log_ring_head + _log_ring_count) % MQTT_LOG_RING_SIZE] = msg_bytes
+        _log_ring_count += 1
+
+def _log_ring_build_batch():
+    """버퍼 앞쪽부터 배치 페이로드를 만든다. (payload, 사용한 레코드 수) 반환 (제거는 하지 않음)"""
+    parts = []
+    total = 0
+    with _log_ring_lock:
+        dropped = mqtt_log_dropped - _mqtt_log_dropped_reported
+        if dropped > 0:
+            parts.append(("[log] dropped %d" % dropped).encode('utf-8'))
+            total = len(parts[0])
+        n = 0
+        while n < _log_ring_count and n < MQTT_LOG_BATCH_RECORDS:
+            rec = _log_ring[(_log_ring_head + n) % MQTT_LOG_RING_SIZE]
+            # 최소 1개 레코드는 항상 포함 (레코드 자체는 MQTT_LOG_MAX_LENGTH로 잘려 있음)
+            if n > 0 and total + len(rec) + 1 > MQTT_LOG_BATCH_MAX_BYTES:
+                break
+            parts.append(rec)
+            total += len(rec) + 1
+            n += 1
+    return b"\n".join(parts), n, dropped
+
+def _log_ring_consume(n, dropped):
+    """발행에 성공한 앞쪽 n개 레코드를 버퍼에서 제거"""
+    global _log_ring_head, _log_ring_count, _log_ring_first_ms, _mqtt_log_dropped_reported
+    with _log_ring_lock:
+        for i in range(n):
+            _log_ring[(_log_ring_head + i) % MQTT_LOG_RING_SIZE] = None
+        _log_ring_head = (_log_ring_head + n) % MQTT_LOG_RING_SIZE
+        _log_ring_count -= n
+        _mqtt_log_dropped_reported += dropped
+        if _log_ring_count > 0:
+            # 남은 레코드의 대기 시간은 지금부터 다시 잰다 (배치가 연달아 나가지 않도록)
+            _log_ring_first_ms = time.ticks_ms()
+
+async def mqtt_log_shipper_task():
+    """링 버퍼의 로그를 MQTT_LOG_FLUSH_INTERVAL_MS마다 또는 MQTT_LOG_BATCH_RECORDS개가 모이면 한 번에 발행"""
+    global mqtt_connection_attempt_time
+    while True:
+        await asyncio.sleep_ms(MQTT_LOG_POLL_MS)
+        if _log_ring_count == 0 or not (mqtt_connected and mqtt_client):
+            continue
+        if _log_ring_count < MQTT_LOG_BATCH_RECORDS and \
+           time.ticks_diff(time.ticks_ms(), _log_ring_first_ms) < MQTT_LOG_FLUSH_INTERVAL_MS:
+            continue
+        try:
+            payload, n, dropped = _log_ring_build_batch()
+            # QoS 0으로 발행하여 블로킹 최소화
+            with SECTION_MQTT_PUBLISH:
+                mqtt_client.publish(MQTT_LOG_TOPIC, payload, qos=0)
+            _log_ring_consume(n, dropped)
+        except OSError as e:
+            # 네트워크 오류 (연결 끊김 등) - 레코드는 버퍼에 남겨두고 다음 기회에 재시도
+            print(f"MQTT 로그 배치 발행 실패 (OSError): {e}")
+            mqtt_connection_attempt_time = time.ticks_ms()
+            await asyncio.sleep_ms(MQTT_LOG_FLUSH_INTERVAL_MS)
+        except MemoryError as e:
+            print(f"MQTT 로그 배치 발행 실패 (메모리 부족): {e}")
+            gc_collect_now()
+        except Exception as e:
+            print(f"MQTT 로그 배치 발행 실패: {e}")
+
+def log_message(msg, publish_mqtt=True, level="INFO"):
+    """콘솔과 MQTT로 로그 메시지 출력 (이미 포맷된 문자열용)"""
+    lvl = _log_level_value(level)
+    if lvl < _log_min_threshold:
+        return
+    _emit_log(msg, lvl, publish_mqtt)
+
+def log_at(level, fmt, *args, publish_mqtt=True):
+    """지연 포맷팅 로그: 레벨 검사를 먼저 하고 통과한 경우에만 fmt % args 수행
+    
+    level은 LOG_DEBUG/LOG_INFO/LOG_WARNING/LOG_ERROR 숫자 상수.
+    """
+    if level < _log_min_threshold:
+        return
+    _emit_log(fmt % args if args else fmt, level, publish_mqtt)
+
+def log_debug(fmt, *args):
+    """DEBUG 로그 (콘솔 전용, 지연 포맷팅)
+    
+    호출부는 `if DEBUG_LOG_BUILD:` 로 감싸서 DEBUG_LOG_BUILD = const(0) 빌드에서
+    컴파일 단계에 통째로 제거되도록 한다.
+    """
+    if _console_log_threshold > LOG_DEBUG:
+        return
+    print("DEBUG: " + (fmt % args if args else fmt))
 
 
 def load_uptime_accumulator():
@@ -296,208 +476,1055 @@ def save_uptime_accumulator():
     except Exception as e:
         log_message(f"Uptime save failed: {e}", publish_mqtt=False)
 
+def replace_file(tmp_path, path):
+    """다 쓴 tmp_path 로 path 를 교체 (LittleFS 의 rename 은 원자적이라 전원이 꺼져도 이전/새 파일 중 하나가 남는다).
+    FAT 처럼 기존 파일 위로 rename 을 거부하면 삭제 후 이름을 바꾸고, 그 사이 전원이 꺼지면 recover_replaced_file 이 복구한다."""
+    try:
+        uos.rename(tmp_path, path)
+    except OSError:
+        try:
+            uos.remove(path)
+        except OSError:
+            pass
+        uos.rename(tmp_path, path)
 
-# --- MQTT 관련 함수 ---
-def mqtt_callback(topic, msg):
-    """MQTT 메시지 수신 시 호출될 콜백 함수"""
-    global schedules, current_screen, force_screen_update, schedule_cursor, selected_pump
+def recover_replaced_file(path):
+    """replace_file 도중 원본만 지워진 경우 남은 임시 파일(path + ".tmp")을 원래 이름으로 되돌림 (로드 전 호출)"""
     try:
-        topic_str = topic.decode('utf-8')
-        msg_str = msg.decode('utf-8')
-        log_message(f"MQTT 수신: Topic='{topic_str}', Message='{msg_str}'", publish_mqtt=False)
-
-        pump_id = -1
-        if topic_str == MQTT_PUMP1_COMMAND_TOPIC: 
-            pump_id = 1
-        elif topic_str == MQTT_PUMP2_COMMAND_TOPIC: 
-            pump_id = 2
-
-        if pump_id != -1:
-            if msg_str.upper() == "ON":
-                if pump_tasks.get(pump_id) is None:
-                    log_message(f"MQTT: P{pump_id} ON 요청 (1초간 실행)")
-                    asyncio.create_task(run_pump_for_duration(pump_id, 1000))
-                else: 
-                    log_message(f"MQTT: P{pump_id} ON 요청 무시 (작동 중)")
-            elif msg_str.upper() == "OFF":
-                if pump_tasks.get(pump_id) is not None:
-                    log_message(f"MQTT: P{pump_id} OFF 요청")
-                    try:
-                        pump_tasks[pump_id].cancel()
-                    except asyncio.CancelledError:
-                        pass
-                    pump_tasks[pump_id] = None
-                    pump_off(pump_id)
-                    publish_pump_status(pump_id)
-                    safe_force_screen_update()
-                else:
-                    log_message(f"MQTT: P{pump_id} OFF 요청 (이미 꺼짐)")
-                    pump_off(pump_id)
-                    publish_pump_status(pump_id)
-                    publish_pump_status(pump_id)
-            elif msg_str.upper().startswith("RUN:"):
-                try:
-                    duration_ms = int(msg_str.split(":")[1])
-                    if duration_ms > 0:
-                        if pump_tasks.get(pump_id) is None:
-                            log_message(f"MQTT: P{pump_id} RUN 요청 ({duration_ms}ms)")
-                            asyncio.create_task(run_pump_for_duration(pump_id, duration_ms))
-                        else: 
-                            log_message(f"MQTT: P{pump_id} RUN 요청 무시 (작동 중)")
-                    else: 
-                        log_message(f"MQTT: 잘못된 작동 시간 ({duration_ms}ms)")
-                except (IndexError, ValueError) as e:
-                    log_message(f"MQTT: RUN 명령어 형식 오류 '{msg_str}': {e}")
-            else: 
-                log_message(f"MQTT: 알 수 없는 P{pump_id} 명령어 '{msg_str}'")
+        uos.stat(path)
+        return
+    except OSError:
+        pass
+    try:
+        uos.rename(path + ".tmp", path)
+        log_message(f"'{path}' 임시 파일에서 복구", publish_mqtt=False)
+    except OSError:
+        pass
+
+
+# --- 태스크 성능 계측 ---
+# 태스크별 고정 버킷 히스토그램 (반복 처리 시간 / 기상 지연). 기록 시 힙 할당 없음.
+PERF_TASK_DISPLAY = const(0)
+PERF_TASK_BUTTONS = const(1)
+PERF_TASK_SCHEDULES = const(2)
+PERF_TASK_MQTT = const(3)
+PERF_TASK_PERIODIC = const(4)
+PERF_TASK_NAMES = ("display", "buttons", "schedules", "mqtt", "periodic")
+# 버킷 상한 (us). 마지막 버킷은 그 이상 전부
+PERF_BUCKET_BOUNDS_US = (100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+_PERF_NBUCKETS = const(13)  # len(PERF_BUCKET_BOUNDS_US) + 1
+# 태스크별 array 레이아웃: [반복 버킷 x13][지연 버킷 x13][반복 횟수, 반복 최대, 지연 최대]
+_PERF_LAG_OFFSET = const(13)
+_PERF_COUNT = const(26)
+_PERF_ITER_MAX = const(27)
+_PERF_LAG_MAX = const(28)
+_PERF_SLOTS = const(29)
+perf_stats = [array.array('I', [0] * _PERF_SLOTS) for _ in PERF_TASK_NAMES]
+
+def _perf_bucket(us):
+    """us 값이 들어갈 버킷 인덱스"""
+    i = 0
+    for bound in PERF_BUCKET_BOUNDS_US:
+        if us <= bound:
+            return i
+        i += 1
+    return i
+
+def perf_iter_done(task_id, t_start_us):
+    """태스크 반복 1회 처리 시간 기록. 현재 ticks_us를 반환 (이어지는 sleep의 시작 시각으로 사용)"""
+    now = time.ticks_us()
+    us = time.ticks_diff(now, t_start_us)
+    st = perf_stats[task_id]
+    st[_perf_bucket(us)] += 1
+    st[_PERF_COUNT] += 1
+    if us > st[_PERF_ITER_MAX]:
+        st[_PERF_ITER_MAX] = us
+    return now
+
+def perf_wake(task_id, t_sleep_us, requested_ms):
+    """sleep 후 요청 시간 대비 늦게 깨어난 정도(기상 지연) 기록"""
+    lag = time.ticks_diff(time.ticks_us(), t_sleep_us) - requested_ms * 1000
+    if lag < 0:
+        lag = 0
+    st = perf_stats[task_id]
+    st[_PERF_LAG_OFFSET + _perf_bucket(lag)] += 1
+    if lag > st[_PERF_LAG_MAX]:
+        st[_PERF_LAG_MAX] = lag
+
+def perf_reset():
+    """모든 태스크 계측값 초기화"""
+    for st in perf_stats:
+        for i in range(_PERF_SLOTS):
+            st[i] = 0
+
+def perf_report():
+    """계측값을 JSON 문자열로 변환 (MQTT 발행용, 요청 시에만 호출)"""
+    tasks = {}
+    for task_id, name in enumerate(PERF_TASK_NAMES):
+        st = perf_stats[task_id]
+        tasks[name] = {
+            'n': st[_PERF_COUNT],
+            'it': list(st[0:_PERF_NBUCKETS]),
+            'it_max': st[_PERF_ITER_MAX],
+            'lag': list(st[_PERF_LAG_OFFSET:_PERF_LAG_OFFSET + _PERF_NBUCKETS]),
+            'lag_max': st[_PERF_LAG_MAX],
+        }
+    return ujson.dumps({'bounds_us': PERF_BUCKET_BOUNDS_US, 'tasks': tasks})
+
+# --- 이벤트 루프 정지(stall) 감지 ---
+# 블로킹 호출 주변에 `with SECTION_xxx:` 마커를 두고, stall_monitor_task가 측정한
+# 스케줄링 지연을 마지막으로 실행된 마커 구간에 귀속시켜 최악 사례를 기록한다.
+STALL_MONITOR_INTERVAL_MS = 100   # 감시 태스크 sleep 간격 (ms)
+STALL_THRESHOLD_MS = 200          # 이 이상 늦게 깨어나면 정지로 기록 (ms)
+STALL_WORST_SLOTS = 8             # 보관할 최악 사례 수
+_stall_section = None             # 현재 실행 중인 마커 구간 이름
+_stall_last_section = None        # 이번 감시 구간에서 귀속 대상으로 고른 종료된 마커 구간 이름
+_stall_last_exit_ms = 0           # 그 구간 종료 시각 (ticks_ms)
+_stall_last_duration_ms = 0       # 그 구간 소요 시간 (ms)
+stall_count = 0                   # 감지된 정지 총 횟수
+stall_worst = []                  # [[구간 이름, 지연 ms, 시각 문자열], ...] (지연 큰 순 아님)
+
+class StallSection:
+    """블로킹 호출 구간 마커 (with 문으로 사용, 중첩 가능)"""
+    def __init__(self, name):
+        self.name = name
+        self.prev = None
+        self.start_ms = 0
+
+    def __enter__(self):
+        global _stall_section
+        self.prev = _stall_section
+        _stall_section = self.name
+        self.start_ms = time.ticks_ms()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _stall_section, _stall_last_section, _stall_last_exit_ms, _stall_last_duration_ms
+        now = time.ticks_ms()
+        duration = time.ticks_diff(now, self.start_ms)
+        # 감시 구간마다 가장 긴 구간을 남긴다. 단, 이 구간 안에서 끝난(안쪽) 구간이
+        # 이미 임계값 이상이면 바깥 구간이 더 길어도 안쪽 구간을 유지한다.
+        if _stall_last_section is None or (
+                duration > _stall_last_duration_ms and not (
+                    time.ticks_diff(_stall_last_exit_ms, self.start_ms) >= 0 and
+                    _stall_last_duration_ms >= STALL_THRESHOLD_MS)):
+            _stall_last_section = self.name
+            _stall_last_exit_ms = now
+            _stall_last_duration_ms = duration
+        _stall_section = self.prev
+        return False
+
+SECTION_MQTT_CALLBACK = StallSection("mqtt.callback")
+SECTION_MQTT_PUBLISH = StallSection("mqtt.publish")
+SECTION_WIFI_SCAN = StallSection("wifi.scan")
+SECTION_NTP_SYNC = StallSection("ntp.settime")
+SECTION_FLASH_SCHEDULES = StallSection("flash.schedules")
+SECTION_FLASH_SCHEDULE_LOG = StallSection("flash.schedule_log")
+SECTION_FLASH_SCHEDULE_JOURNAL = StallSection("flash.schedule_journal")
+SECTION_FLASH_DOSE_EVENTS = StallSection("flash.dose_events")
+
+def _stall_record(name, lag_ms):
+    """정지 기록: 슬롯이 차 있으면 가장 작은 항목보다 클 때만 교체"""
+    global stall_count
+    stall_count += 1
+    if len(stall_worst) >= STALL_WORST_SLOTS:
+        min_idx = 0
+        for i in range(1, len(stall_worst)):
+            if stall_worst[i][1] < stall_worst[min_idx][1]:
+                min_idx = i
+        if stall_worst[min_idx][1] >= lag_ms:
+            return
+        del stall_worst[min_idx]
+    now = get_local_time()
+    stamp = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(now[0], now[1], now[2], now[3], now[4], now[5])
+    stall_worst.append([name, lag_ms, stamp])
 
-        elif topic_str == MQTT_SCHEDULE_ADD_TOPIC:
+async def stall_monitor_task():
+    """이벤트 루프 스케줄링 지연 감시 (워치독 방식)"""
+    global _stall_last_section
+    while True:
+        t_sleep = time.ticks_ms()
+        await asyncio.sleep_ms(STALL_MONITOR_INTERVAL_MS)
+        now = time.ticks_ms()
+        window = time.ticks_diff(now, t_sleep)
+        lag = window - STALL_MONITOR_INTERVAL_MS
+        last_section = _stall_last_section
+        _stall_last_section = None  # 다음 감시 구간은 새로 고른다
+        if lag < STALL_THRESHOLD_MS:
+            continue
+        # 이번 감시 구간 안에서 끝난 마커 구간 중 충분히 길었던 것에 귀속
+        if _stall_section is not None:
+            name = _stall_section
+        elif last_section is not None and \
+             time.ticks_diff(now, _stall_last_exit_ms) <= window and \
+             _stall_last_duration_ms >= STALL_THRESHOLD_MS:
+            name = last_section
+        else:
+            name = "untagged"
+        _stall_record(name, lag)
+        log_message(f"STALL: 이벤트 루프 {lag}ms 정지 ({name})", level="WARNING")
+
+def stall_report():
+    """정지 감지 결과를 JSON 문자열로 변환 (지연 큰 순)"""
+    worst = sorted(stall_worst, key=lambda x: x[1], reverse=True)
+    return ujson.dumps({
+        'threshold_ms': STALL_THRESHOLD_MS,
+        'count': stall_count,
+        'worst': [{'section': w[0], 'ms': w[1], 'at': w[2]} for w in worst],
+    })
+
+# --- 힙 메모리 계측 ---
+# 주요 작업 전후의 gc.mem_alloc() 차이(작업별 할당 증감)와 힙 최고/최저 수위를 기록한다.
+MEM_OP_MQTT_CALLBACK = const(0)
+MEM_OP_SAVE_SCHEDULES = const(1)
+MEM_OP_PUBLISH_SCHEDULES = const(2)
+MEM_OP_DISPLAY_FRAME = const(3)
+MEM_OP_WIFI_RECONNECT = const(4)
+MEM_OP_NAMES = ("mqtt_cb", "save_sched", "pub_sched", "display", "wifi")
+# 작업별 array 레이아웃: [횟수, 최대 증감, 마지막 증감]
+_MEM_COUNT = const(0)
+_MEM_MAX = const(1)
+_MEM_LAST = const(2)
+MEM_PROBE_RESOLUTION = 256   # 최대 연속 free 블록 탐색 해상도 (바이트)
+mem_op_stats = [array.array('i', [0, 0, 0]) for _ in MEM_OP_NAMES]
+mem_op_sums = [0] * len(MEM_OP_NAMES)  # 작업별 증감 합계 (int32 array에 두면 수일 만에 넘치므로 Python int)
+mem_alloc_peak = 0           # 관측된 최대 할당량 (high-water mark)
+mem_free_low = -1            # 관측된 최소 free (-1: 아직 측정 안 됨)
+
+def mem_sample(op_id, alloc_before):
+    """작업 종료 시 호출: alloc_before(작업 시작 시 gc.mem_alloc())와의 차이와 수위를 기록"""
+    global mem_alloc_peak, mem_free_low
+    alloc = gc.mem_alloc()
+    free = gc.mem_free()
+    delta = alloc - alloc_before
+    st = mem_op_stats[op_id]
+    st[_MEM_COUNT] += 1
+    mem_op_sums[op_id] += delta
+    st[_MEM_LAST] = delta
+    if delta > st[_MEM_MAX]:
+        st[_MEM_MAX] = delta
+    if alloc > mem_alloc_peak:
+        mem_alloc_peak = alloc
+    if mem_free_low < 0 or free < mem_free_low:
+        mem_free_low = free
+
+def _probe_largest_free_block():
+    """할당 가능한 최대 연속 블록 크기 추정 (이진 탐색으로 실제 할당 시도)
+    
+    힙 거의 전체를 잠깐 할당하므로 con/mem 요청 시에만 호출한다 (주기 보고에서는 생략).
+    """
+    lo = 0
+    hi = gc.mem_free()
+    while hi - lo > MEM_PROBE_RESOLUTION:
+        mid = (lo + hi) // 2
+        try:
+            buf = bytearray(mid)
+            buf = None
+            lo = mid
+        except MemoryError:
+            hi = mid
+    return lo
+
+def mem_report(probe=False):
+    """힙 상태를 압축 JSON 문자열로 변환 (ops: [횟수, 평균 증감, 최대 증감, 마지막 증감], sched: [항목 수, 바이트],
+    outbox: [대기 항목 수, 바이트, 생략한 발행 수, 버린 발행 수])
+    
+    probe=True일 때만 최대 연속 free 블록('largest')을 탐색해 포함한다.
+    """
+    gc_collect_now()
+    ops = {}
+    for op_id, name in enumerate(MEM_OP_NAMES):
+        st = mem_op_stats[op_id]
+        n = st[_MEM_COUNT]
+        ops[name] = [n, mem_op_sums[op_id] // n if n else 0, st[_MEM_MAX], st[_MEM_LAST]]
+    report = {
+        'free': gc.mem_free(),
+        'alloc': gc.mem_alloc(),
+        'free_min': mem_free_low,
+        'alloc_max': mem_alloc_peak,
+        'ops': ops,
+        'gc': gc_stats(),
+        'sched': schedule_memory_stats(),
+        'outbox': mqtt_outbox_stats(),
+    }
+    if probe:
+        report['largest'] = _probe_largest_free_block()
+    return ujson.dumps(report)
+
+# --- GC 정책 ---
+# 흩어져 있던 gc.collect() 호출을 gc_request()로 모아, 펌프 종료 시각이나 화면 갱신이
+# 임박하지 않은 유휴 구간에서 gc_idle_task가 한 번에 수집한다. 자동 GC 임계값
+# (gc.threshold)은 측정된 할당 속도에 맞춰 주기적으로 재설정한다.
+GC_IDLE_CHECK_MS = 250          # 유휴 수집 판단 주기 (ms)
+GC_IDLE_INTERVAL_MS = 10000     # 요청이 없어도 이 간격마다 유휴 수집 (ms)
+GC_MAX_DEFER_MS = 3000          # 유휴 구간을 못 찾아도 요청 후 이 시간이 지나면 강제 수집 (ms)
+GC_GUARD_MARGIN_MS = 20         # 펌프 종료/화면 갱신까지 (예상 정지시간 + 이 값) 이상 남아야 유휴로 판단 (ms)
+GC_LOW_FREE_BYTES = 16384       # free가 이보다 작으면 유휴 여부와 관계없이 즉시 수집
+GC_RETUNE_INTERVAL_MS = 10000   # gc.threshold 재설정 주기 (ms)
+GC_TARGET_PERIOD_MS = 20000     # 자동 GC가 이 주기보다 자주 돌지 않도록 임계값 설정 (유휴 수집이 먼저 처리)
+GC_THRESHOLD_MIN = 4096         # 자동 GC 임계값 하한 (바이트)
+GC_THRESHOLD_MAX = 32768        # 자동 GC 임계값 상한 (바이트)
+_gc_pending = False             # 수집 요청 대기 여부
+_gc_requested_at = 0            # 첫 요청 시각 (ticks_ms)
+_gc_last_collect_ms = 0         # 마지막 수집 시각 (ticks_ms)
+_gc_alloc_after_collect = 0     # 마지막 수집 직후 gc.mem_alloc()
+_gc_last_retune_ms = 0
+gc_threshold_bytes = -1         # 현재 설정된 자동 GC 임계값 (-1: 미설정)
+gc_pause_count = 0              # 정책을 거친 수집 횟수
+gc_pause_total_us = 0
+gc_pause_max_us = 0
+gc_pause_last_us = 0
+pump_deadline_ms = {1: None, 2: None}  # 실행 중인 펌프의 종료 예정 시각 (ticks_ms)
+display_next_frame_ms = 0       # 다음 화면 갱신 예정 시각 (ticks_ms)
+
+def gc_request():
+    """GC 요청: 즉시 수집하지 않고 다음 유휴 구간으로 미룬다 (메모리 부족 시에만 즉시 수집)"""
+    global _gc_pending, _gc_requested_at
+    if not _gc_pending:
+        _gc_pending = True
+        _gc_requested_at = time.ticks_ms()
+    if gc.mem_free() < GC_LOW_FREE_BYTES:
+        gc_collect_now()
+
+def gc_collect_now():
+    """정책을 거쳐 즉시 전체 수집 (정지시간 기록)"""
+    global _gc_pending, _gc_last_collect_ms, _gc_alloc_after_collect, \
+           gc_pause_count, gc_pause_total_us, gc_pause_max_us, gc_pause_last_us
+    t0 = time.ticks_us()
+    gc.collect()
+    pause = time.ticks_diff(time.ticks_us(), t0)
+    _gc_pending = False
+    _gc_last_collect_ms = time.ticks_ms()
+    _gc_alloc_after_collect = gc.mem_alloc()
+    gc_pause_count += 1
+    gc_pause_total_us += pause
+    gc_pause_last_us = pause
+    if pause > gc_pause_max_us:
+        gc_pause_max_us = pause
+
+def _gc_is_idle_slot(now):
+    """펌프 종료 시각이나 화면 갱신이 예상 정지시간 안에 있으면 False"""
+    guard_ms = gc_pause_last_us // 1000 + GC_GUARD_MARGIN_MS
+    for deadline in pump_deadline_ms.values():
+        if deadline is not None and time.ticks_diff(deadline, now) < guard_ms:
+            return False
+    if current_screen != "MAIN" or force_screen_update:
+        # 메뉴/캘리브레이션 화면은 갱신 주기가 짧아 유휴 구간이 아님
+        return False
+    remaining = time.ticks_diff(display_next_frame_ms, now)
+    return remaining < 0 or remaining >= guard_ms
+
+def _gc_retune_threshold(now):
+    """마지막 수집 이후 할당 속도로 gc.threshold 재설정"""
+    global _gc_last_retune_ms, gc_threshold_bytes
+    _gc_last_retune_ms = now
+    elapsed = time.ticks_diff(now, _gc_last_collect_ms)
+    if elapsed <= 0:
+        return
+    allocated = gc.mem_alloc() - _gc_alloc_after_collect
+    if allocated < 0:
+        allocated = 0
+    threshold = allocated * GC_TARGET_PERIOD_MS // elapsed
+    threshold = max(GC_THRESHOLD_MIN, min(GC_THRESHOLD_MAX, gc.mem_free() // 2, threshold))
+    if threshold != gc_threshold_bytes:
+        gc.threshold(threshold)
+        gc_threshold_bytes = threshold
+
+async def gc_idle_task():
+    """유휴 구간에 GC 수행 및 자동 GC 임계값 조정"""
+    global _gc_pending, _gc_requested_at
+    gc_collect_now()
+    while True:
+        await asyncio.sleep_ms(GC_IDLE_CHECK_MS)
+        try:
+            now = time.ticks_ms()
+            if time.ticks_diff(now, _gc_last_retune_ms) >= GC_RETUNE_INTERVAL_MS:
+                _gc_retune_threshold(now)
+            if not _gc_pending and time.ticks_diff(now, _gc_last_collect_ms) >= GC_IDLE_INTERVAL_MS:
+                _gc_pending = True
+                _gc_requested_at = now
+            if not _gc_pending:
+                continue
+            if _gc_is_idle_slot(now) or time.ticks_diff(now, _gc_requested_at) >= GC_MAX_DEFER_MS:
+                gc_collect_now()
+        except Exception as e:
+            log_message(f"GC 정책 태스크 오류: {e}", False)
+
+def gc_stats():
+    """GC 정지시간 통계 [횟수, 평균 us, 최대 us, 마지막 us, 현재 임계값]"""
+    avg = gc_pause_total_us // gc_pause_count if gc_pause_count else 0
+    return [gc_pause_count, avg, gc_pause_max_us, gc_pause_last_us, gc_threshold_bytes]
+
+# --- 비동기 MQTT 클라이언트 ---
+# umqtt.simple 의 블로킹 소켓 호출(connect/subscribe/publish 가 브로커 응답을 기다리는 동안 화면, 버튼,
+# 펌프 정지 시각까지 멈춤)을 대체하는 MQTT 3.1.1 클라이언트 (QoS 0/1, uasyncio 스트림 기반).
+# - connect()/subscribe()/disconnect() 는 코루틴이며 모든 대기에 시간 제한이 있다.
+# - publish() 는 동기 함수로 패킷을 송신 버퍼에 쌓기만 하고, 송신 태스크가 한꺼번에 소켓에 쓴다.
+# - 수신 태스크가 패킷이 도착하는 즉시 읽어 콜백(topic: bytes, msg: bytes)을 호출한다.
+# - 송신 태스크가 keepalive 기한에 맞춰 PINGREQ 를 보내고, 응답이 없으면 연결을 끊는다.
+# 연결이 끊기면 is_connected() 가 False 가 되고 closed_event 가 set 된다 (재연결은 호출한 쪽 책임).
+MQTT_CONNECT_TIMEOUT_MS = 10000     # TCP 연결 + CONNACK 대기 (ms)
+MQTT_ACK_TIMEOUT_MS = 5000          # SUBACK 대기 (ms)
+MQTT_WRITE_TIMEOUT_MS = 5000        # 송신 버퍼를 소켓에 다 쓰기까지 (ms)
+MQTT_TX_BUFFER_MAX = 16384          # 송신 대기 바이트 상한 (넘으면 publish 가 MQTTException)
+MQTT_TX_ACK_RESERVE = 1024          # 상한 위에 PUBACK 용으로 남겨 두는 바이트 (publish 가 버퍼를 채워도 응답 가능)
+
+class MQTTException(Exception):
+    pass
+
+class AsyncMQTTClient:
+    """uasyncio 스트림 기반 MQTT 3.1.1 클라이언트 (umqtt.simple 과 비슷한 인터페이스)"""
+    def __init__(self, client_id, server, port=1883, user=None, password=None, keepalive=0):
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.cb = None
+        self.puback_cb = None
+        self.lw = None              # (topic, msg, retain, qos)
+        self._reader = None
+        self._writer = None
+        self._tx_buf = bytearray()
+        self._tx_event = asyncio.Event()
+        self._drained_event = asyncio.Event()
+        self.closed_event = asyncio.Event()
+        self._tasks = []
+        self._pid = 0
+        self._last_tx_ms = 0
+        self._last_rx_ms = 0
+        self._ping_sent_ms = None
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_puback_callback(self, f):
+        """QoS 1 발행의 PUBACK 수신 시 f(패킷 ID) 호출"""
+        self.puback_cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.lw = (topic, msg, retain, qos)
+
+    def is_connected(self):
+        return self._writer is not None
+
+    def tx_pending(self):
+        """소켓에 아직 쓰지 않은 송신 버퍼 바이트 수"""
+        return len(self._tx_buf)
+
+    async def wait_drained(self):
+        """송신 버퍼가 비거나 연결이 끊길 때까지 대기"""
+        if self._tx_buf and self._writer is not None:
+            await self._drained_event.wait()
+
+    # 패킷 인코딩
+    @staticmethod
+    def _str(s):
+        if isinstance(s, str):
+            s = s.encode()
+        return struct.pack("!H", len(s)) + s
+
+    @staticmethod
+    def _packet(first_byte, body):
+        n = len(body)
+        hdr = bytearray((first_byte,))
+        while True:
+            b = n & 0x7F
+            n >>= 7
+            hdr.append(b | 0x80 if n else b)
+            if not n:
+                break
+        return hdr + body
+
+    def _next_pid(self):
+        self._pid = self._pid % 0xFFFF + 1
+        return self._pid
+
+    def _send(self, packet, limit=MQTT_TX_BUFFER_MAX):
+        if self._writer is None:
+            raise OSError(9)    # EBADF: 연결 안 됨
+        if len(self._tx_buf) + len(packet) > limit:
+            raise MQTTException("tx buffer full")
+        self._tx_buf += packet
+        self._drained_event.clear()
+        self._tx_event.set()
+
+    async def _flush(self):
+        while self._tx_buf:
+            data = bytes(self._tx_buf)
+            self._tx_buf = bytearray()
+            self._writer.write(data)
+            await asyncio.wait_for_ms(self._writer.drain(), MQTT_WRITE_TIMEOUT_MS)
+            self._last_tx_ms = time.ticks_ms()
+        self._drained_event.set()
+
+    async def _read_packet(self):
+        """패킷 하나 읽기 -> (첫 바이트, 본문)"""
+        first = (await self._reader.readexactly(1))[0]
+        n = 0
+        shift = 0
+        while True:
+            b = (await self._reader.readexactly(1))[0]
+            n |= (b & 0x7F) << shift
+            if not b & 0x80:
+                break
+            shift += 7
+        body = await self._reader.readexactly(n) if n else b""
+        self._last_rx_ms = time.ticks_ms()
+        return first, body
+
+    # 연결 관리
+    async def connect(self, clean_session=True):
+        """브로커 연결 (CONNACK 까지, 실패 시 OSError/MQTTException/asyncio.TimeoutError)"""
+        self.close()
+        reader, writer = await asyncio.wait_for_ms(asyncio.open_connection(self.server, self.port),
+                                                   MQTT_CONNECT_TIMEOUT_MS)
+        self._reader, self._writer = reader, writer
+        self.closed_event = asyncio.Event()
+        try:
+            flags = 0x02 if clean_session else 0
+            payload = self._str(self.client_id)
+            if self.lw:
+                topic, msg, retain, qos = self.lw
+                flags |= 0x04 | (qos & 0x03) << 3 | (0x20 if retain else 0)
+                payload += self._str(topic) + self._str(msg)
+            if self.user is not None:
+                flags |= 0x80
+                payload += self._str(self.user)
+                if self.pswd is not None:
+                    flags |= 0x40
+                    payload += self._str(self.pswd)
+            body = b"\x00\x04MQTT\x04" + bytes((flags,)) + struct.pack("!H", self.keepalive) + payload
+            self._tx_buf = bytearray(self._packet(0x10, body))
+            await self._flush()
+            first, body = await asyncio.wait_for_ms(self._read_packet(), MQTT_CONNECT_TIMEOUT_MS)
+            if first != 0x20 or len(body) != 2:
+                raise MQTTException("unexpected packet 0x%02x" % first)
+            if body[1]:
+                raise MQTTException("connect refused (rc=%d)" % body[1])
+        except BaseException:
+            self.close()
+            raise
+        self._ping_sent_ms = None
+        self._tasks = [asyncio.create_task(self._tx_loop())]
+        return body[0] & 1     # session present
+
+    async def subscribe(self, topics, qos=0):
+        """토픽(들) 구독 - SUBSCRIBE 한 번 보내고 SUBACK 까지 대기 (수신 태스크 시작 전에만 사용)"""
+        if isinstance(topics, (str, bytes)):
+            topics = (topics,)
+        pid = self._next_pid()
+        body = bytearray(struct.pack("!H", pid))
+        for topic in topics:
+            body += self._str(topic)
+            body.append(qos)
+        self._send(self._packet(0x82, body))
+        deadline = time.ticks_add(time.ticks_ms(), MQTT_ACK_TIMEOUT_MS)
+        while True:
+            remaining = time.ticks_diff(deadline, time.ticks_ms())
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            first, body = await asyncio.wait_for_ms(self._read_packet(), remaining)
+            if first == 0x90 and struct.unpack_from("!H", body)[0] == pid:
+                if b"\x80" in body[2:]:
+                    raise MQTTException("subscribe refused")
+                return
+            self._dispatch(first, body)
+
+    def start(self):
+        """수신 태스크 시작 (connect/subscribe 이후 호출)"""
+        self._tasks.append(asyncio.create_task(self._rx_loop()))
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        """송신 버퍼에 PUBLISH 추가 (블로킹 없음). QoS 1 은 패킷 ID 를 반환하고,
+        PUBACK 은 기다리지 않고 set_puback_callback 의 콜백으로 알린다"""
+        if isinstance(msg, str):
+            msg = msg.encode()
+        body = self._str(topic)
+        pid = 0
+        if qos:
+            pid = self._next_pid()
+            body += struct.pack("!H", pid)
+        self._send(self._packet(0x30 | qos << 1 | (1 if retain else 0), body + msg))
+        return pid
+
+    async def disconnect(self):
+        """대기 중인 송신을 마저 보내고 DISCONNECT 후 종료"""
+        try:
+            if self._writer is not None:
+                self._tx_buf += b"\xe0\x00"
+                await self._flush()
+        except Exception:
+            pass
+        self.close()
+
+    def close(self):
+        """연결 즉시 종료 (송신하지 않은 데이터는 버림)"""
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        self._tasks = []
+        writer = self._writer
+        self._reader = self._writer = None
+        self._tx_buf = bytearray()
+        self._drained_event.set()
+        if writer is not None:
             try:
-                data = ujson.loads(msg_str)
-                p_id = data.get('pump')
-                h = data.get('hour')
-                m = data.get('minute')
-                dur_ms = data.get('duration_ms')
-                interval_days = data.get('interval_days', 1)  # 기본값: 매일
-                
-                if p_id in [1, 2] and isinstance(h, int) and isinstance(m, int) and isinstance(dur_ms, int) and \
-                   isinstance(interval_days, int) and 0 <= h < 24 and 0 <= m < 60 and dur_ms > 0 and interval_days >= 1:
-                    new_schedule = (h, m, dur_ms, interval_days)
-                    current_pump_schedules = schedules.setdefault(p_id, [])
-                    
-                    # 중복 체크 (시간만 체크, 기존 스케줄의 형식에 관계없이)
-                    is_duplicate = False
-                    for existing_schedule in current_pump_schedules:
-                        if existing_schedule[0] == h and existing_schedule[1] == m:
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        current_pump_schedules.append(new_schedule)
-                        log_message(f"MQTT: 스케줄 추가됨 - P{p_id}: {new_schedule}")
-                        save_schedules()
-                        safe_force_screen_update()
+                writer.close()
+            except Exception:
+                pass
+            self.closed_event.set()
+
+    # 내부 태스크
+    def _send_ack(self, packet):
+        """응답 패킷을 예약 영역까지 써서 큐에 넣기 - 수신 루프에서 호출되므로 예외를 던지지 않음"""
+        try:
+            self._send(packet, MQTT_TX_BUFFER_MAX + MQTT_TX_ACK_RESERVE)
+        except MQTTException:
+            # 예약 영역까지 찬 경우는 송신이 멈춘 상태 - 응답을 빼도 브로커가 재연결 후 재전송한다
+            log_message("MQTT PUBACK 생략: 송신 버퍼 가득 참", False, level="WARNING")
+
+    def _dispatch(self, first, body):
+        kind = first & 0xF0
+        if kind == 0x30:    # PUBLISH
+            n = struct.unpack_from("!H", body)[0]
+            topic = body[2:2 + n]
+            pos = 2 + n
+            qos = (first >> 1) & 0x03
+            if qos:
+                pid = body[pos:pos + 2]
+                pos += 2
+                if qos == 1:
+                    self._send_ack(b"\x40\x02" + pid)   # PUBACK
+            if self.cb:
+                with SECTION_MQTT_CALLBACK:
+                    self.cb(topic, body[pos:])
+        elif kind == 0x40:  # PUBACK
+            if self.puback_cb:
+                self.puback_cb(struct.unpack_from("!H", body)[0])
+        elif kind == 0xD0:  # PINGRESP
+            self._ping_sent_ms = None
+
+    async def _rx_loop(self):
+        try:
+            while True:
+                first, body = await self._read_packet()
+                self._dispatch(first, body)
+        except asyncio.CancelledError:
+            raise
+        except EOFError:
+            log_message("MQTT 수신 종료: 브로커가 연결을 닫음", False)
+            self.close()
+        except Exception as e:
+            log_message(f"MQTT 수신 종료: {e}", False)
+            self.close()
+
+    async def _tx_loop(self):
+        keepalive_ms = self.keepalive * 1000
+        try:
+            while True:
+                if keepalive_ms:
+                    now = time.ticks_ms()
+                    if self._ping_sent_ms is not None:
+                        if time.ticks_diff(now, self._ping_sent_ms) >= keepalive_ms // 2:
+                            raise OSError(110)  # ETIMEDOUT: PINGRESP 없음
+                        wait_ms = keepalive_ms // 2 - time.ticks_diff(now, self._ping_sent_ms)
                     else:
-                        log_message(f"MQTT: 스케줄 중복 - P{p_id} {h:02d}:{m:02d}")
-                else: 
-                    log_message(f"MQTT: 잘못된 스케줄 추가 데이터: {msg_str}")
-            except Exception as e: 
-                log_message(f"MQTT: 스케줄 추가 처리 오류: {e}")
-                
-        elif topic_str == MQTT_SCHEDULE_DELETE_TOPIC:
+                        # 마지막 송신 후 keepalive 의 절반이 지나면 PINGREQ
+                        wait_ms = keepalive_ms // 2 - time.ticks_diff(now, self._last_tx_ms)
+                        if wait_ms <= 0:
+                            self._tx_buf += b"\xc0\x00"
+                            self._ping_sent_ms = now
+                            wait_ms = keepalive_ms // 2
+                    if not self._tx_buf:
+                        try:
+                            await asyncio.wait_for_ms(self._tx_event.wait(), wait_ms)
+                        except asyncio.TimeoutError:
+                            pass
+                else:
+                    await self._tx_event.wait()
+                self._tx_event.clear()
+                await self._flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_message(f"MQTT 송신 종료: {e}", False)
+            self.close()
+
+# --- MQTT 관련 함수 ---
+def mqtt_pump_command(pump_id, msg):
+    """con/pumpN 명령 처리 (ON, OFF, RUN:<ms> - 페이로드 bytes 를 디코딩 없이 해석)"""
+    cmd = msg.upper()
+    if cmd == b"ON":
+        log_at(LOG_INFO, "MQTT: P%s ON 요청 (1초간 실행)", pump_id)
+        dose_enqueue(pump_id, 1000, DOSE_PRIO_MANUAL, "mqtt")
+    elif cmd == b"OFF":
+        # 대기 중인 투여도 함께 취소
+        dose_queue_clear(pump_id)
+        if pump_tasks.get(pump_id) is not None:
+            log_at(LOG_INFO, "MQTT: P%s OFF 요청", pump_id)
             try:
-                data = ujson.loads(msg_str)
-                p_id = data.get('pump')
-                h = data.get('hour')
-                m = data.get('minute')
-                if p_id in [1, 2] and isinstance(h, int) and isinstance(m, int) and \
-                   0 <= h < 24 and 0 <= m < 60:
-                    current_pump_schedules = schedules.get(p_id, [])
-                    schedule_to_delete = None
-                    for sched in current_pump_schedules:
-                        if sched[0] == h and sched[1] == m:
-                            schedule_to_delete = sched
-                            break
-                    if schedule_to_delete:
-                        current_pump_schedules.remove(schedule_to_delete)
-                        log_message(f"MQTT: 스케줄 삭제됨 - P{p_id}: {schedule_to_delete}")
-                        save_schedules()
-                        safe_force_screen_update()
-                        if current_screen == "VIEW_SCHEDULE" and selected_pump == p_id:
-                            num_schedules_after_delete = len(schedules[p_id])
-                            schedule_cursor = max(0, min(schedule_cursor, num_schedules_after_delete - 1))
-                    else: 
-                        log_message(f"MQTT: 삭제할 스케줄 없음 - P{p_id} {h:02d}:{m:02d}")
-                else: 
-                    log_message(f"MQTT: 잘못된 스케줄 삭제 데이터: {msg_str}")
-            except Exception as e:
-                log_message(f"MQTT: 스케줄 삭제 처리 오류: {e}")
-                
-        elif topic_str == MQTT_REQUEST_STATUS_TOPIC:
-            log_message("MQTT: 상태 정보 요청 수신")
-            publish_all_status()
-            
+                pump_tasks[pump_id].cancel()
+            except asyncio.CancelledError:
+                pass
+            pump_tasks[pump_id] = None
+            pump_off(pump_id)
+            publish_pump_status(pump_id)
+            safe_force_screen_update()
+        else:
+            log_at(LOG_INFO, "MQTT: P%s OFF 요청 (이미 꺼짐)", pump_id)
+            pump_off(pump_id)
+            publish_pump_status(pump_id)
+    elif cmd.startswith(b"RUN:"):
+        try:
+            duration_ms = int(cmd[4:])
+            if duration_ms > 0:
+                log_at(LOG_INFO, "MQTT: P%s RUN 요청 (%sms)", pump_id, duration_ms)
+                dose_enqueue(pump_id, duration_ms, DOSE_PRIO_MANUAL, "mqtt")
+            else: 
+                log_at(LOG_INFO, "MQTT: 잘못된 작동 시간 (%sms)", duration_ms)
+        except ValueError as e:
+            log_at(LOG_INFO, "MQTT: RUN 명령어 형식 오류 %s: %s", msg, e)
+    else: 
+        log_at(LOG_INFO, "MQTT: 알 수 없는 P%s 명령어 %s", pump_id, msg)
+
+def mqtt_pump1_command(msg):
+    mqtt_pump_command(1, msg)
+
+def mqtt_pump2_command(msg):
+    mqtt_pump_command(2, msg)
+
+def mqtt_schedule_add(msg):
+    """con/schedule/add 처리 (항목 검증은 con/schedule/set, 파일 로드와 같은 parse_schedule_item)"""
+    try:
+        data = ujson.loads(msg)
+        p_id = data.get('pump')
+        # 객체 형식: hour, minute, duration_ms, interval_days(기본 매일),
+        # 선택 반복 규칙 weekdays [0(월)..6(일)], monthdays [1..31], anchor "YYYY-MM-DD" (interval_days 기준일)
+        parsed = parse_schedule_item(data) if p_id in [1, 2] else None
+        
+        if parsed is not None:
+            h, m = parsed[0], parsed[1]
+            new_schedule = parsed[:4]
+            # 같은 시각(시, 분)이 이미 있으면 add()가 False 반환
+            if schedules[p_id].add(*parsed):
+                log_message(f"MQTT: 스케줄 추가됨 - P{p_id}: {new_schedule}")
+                if not journal_schedule_change(SCHED_JOURNAL_OP_ADD, p_id, h, m):
+                    log_message(f"MQTT: 스케줄 추가 저장 실패 - P{p_id} {h:02d}:{m:02d} (재부팅 시 사라짐)", level="WARNING")
+                safe_force_screen_update()
+            else:
+                log_message(f"MQTT: 스케줄 중복 - P{p_id} {h:02d}:{m:02d}")
+        else: 
+            log_message(f"MQTT: 잘못된 스케줄 추가 데이터: {msg}")
+    except Exception as e: 
+        log_message(f"MQTT: 스케줄 추가 처리 오류: {e}")
+
+def mqtt_schedule_delete(msg):
+    """con/schedule/delete 처리"""
+    global schedule_cursor
+    try:
+        data = ujson.loads(msg)
+        p_id = data.get('pump')
+        h = data.get('hour')
+        m = data.get('minute')
+        if p_id in [1, 2] and isinstance(h, int) and isinstance(m, int) and \
+           0 <= h < 24 and 0 <= m < 60:
+            schedule_to_delete = schedules[p_id].delete(h, m)
+            if schedule_to_delete:
+                log_message(f"MQTT: 스케줄 삭제됨 - P{p_id}: {schedule_to_delete}")
+                if not journal_schedule_change(SCHED_JOURNAL_OP_DELETE, p_id, h, m):
+                    log_message(f"MQTT: 스케줄 삭제 저장 실패 - P{p_id} {h:02d}:{m:02d} (재부팅 시 되살아남)", level="WARNING")
+                safe_force_screen_update()
+                if current_screen == "VIEW_SCHEDULE" and selected_pump == p_id:
+                    num_schedules_after_delete = len(schedules[p_id])
+                    schedule_cursor = max(0, min(schedule_cursor, num_schedules_after_delete - 1))
+            else: 
+                log_message(f"MQTT: 삭제할 스케줄 없음 - P{p_id} {h:02d}:{m:02d}")
+        else: 
+            log_message(f"MQTT: 잘못된 스케줄 삭제 데이터: {msg}")
+    except Exception as e:
+        log_message(f"MQTT: 스케줄 삭제 처리 오류: {e}")
+
+def mqtt_schedule_set(msg):
+    """con/schedule/set 처리 (결과는 sta/schedule/ack)"""
+    global schedule_cursor
+    request_id = None
+    try:
+        data = ujson.loads(msg)
+        request_id = data.get('id')
+        counts = replace_schedules(data.get('schedules'))
+        log_message(f"MQTT: 스케줄 일괄 교체 - {counts} (v{schedule_version})")
+        safe_force_screen_update()
+        if current_screen == "VIEW_SCHEDULE":
+            schedule_cursor = max(0, min(schedule_cursor, len(schedules[selected_pump]) - 1))
+        publish_status(MQTT_SCHEDULE_ACK_TOPIC, ujson.dumps(
+            {"id": request_id, "ok": True, "version": schedule_version, "counts": counts}))
+    except Exception as e:
+        log_message(f"MQTT: 스케줄 일괄 교체 거부: {e}")
+        publish_status(MQTT_SCHEDULE_ACK_TOPIC, ujson.dumps(
+            {"id": request_id, "ok": False, "version": schedule_version, "error": str(e)}))
+
+def mqtt_request_status(msg):
+    log_message("MQTT: 상태 정보 요청 수신")
+    publish_all_status(force=True)
+
+def mqtt_perf_request(msg):
+    log_message("MQTT: 성능 계측 요청 수신")
+    publish_perf_status()
+    if msg.strip().lower() == b"reset":
+        perf_reset()
+
+def mqtt_stall_request(msg):
+    log_message("MQTT: 이벤트 루프 정지 보고 요청 수신")
+    publish_status(MQTT_STALL_STATUS_TOPIC, stall_report(), retain=False)
+
+def mqtt_mem_request(msg):
+    log_message("MQTT: 힙 메모리 보고 요청 수신")
+    publish_status(MQTT_MEM_STATUS_TOPIC, mem_report(probe=True), retain=False)
+
+def mqtt_watch_request(msg):
+    """con/watch: 앱이 보는 동안 상태 프레임을 빠른 간격으로 (페이로드: 유지 초, 10~600)"""
+    try:
+        seconds = int(msg) if msg else MQTT_HEALTH_WATCH_SEC
+    except ValueError:
+        seconds = MQTT_HEALTH_WATCH_SEC
+    health_watch(max(10, min(seconds, 600)))
+
+# 수신 토픽(bytes) -> 처리 함수(msg: bytes). 구독은 MQTT_COMMAND_SUBSCRIPTION 하나로 받는다.
+MQTT_COMMAND_HANDLERS = {
+    MQTT_PUMP1_COMMAND_TOPIC.encode(): mqtt_pump1_command,
+    MQTT_PUMP2_COMMAND_TOPIC.encode(): mqtt_pump2_command,
+    MQTT_SCHEDULE_ADD_TOPIC.encode(): mqtt_schedule_add,
+    MQTT_SCHEDULE_DELETE_TOPIC.encode(): mqtt_schedule_delete,
+    MQTT_SCHEDULE_SET_TOPIC.encode(): mqtt_schedule_set,
+    MQTT_REQUEST_STATUS_TOPIC.encode(): mqtt_request_status,
+    MQTT_PERF_REQUEST_TOPIC.encode(): mqtt_perf_request,
+    MQTT_STALL_REQUEST_TOPIC.encode(): mqtt_stall_request,
+    MQTT_MEM_REQUEST_TOPIC.encode(): mqtt_mem_request,
+    MQTT_WATCH_TOPIC.encode(): mqtt_watch_request,
+}
+
+def mqtt_callback(topic, msg):
+    """MQTT 메시지 수신 시 호출될 콜백 함수 (토픽으로 처리 함수를 찾아 호출)"""
+    mem_before = gc.mem_alloc()
+    try:
+        handler = MQTT_COMMAND_HANDLERS.get(topic)
+        if DEBUG_LOG_BUILD:
+            log_debug("MQTT 수신: Topic=%s, Message=%s", topic, msg)
+        if handler is None:
+            log_at(LOG_INFO, "MQTT: 처리하지 않는 토픽 %s", topic, publish_mqtt=False)
+        else:
+            # 앱이 명령을 보냈으면 보고 있는 중이므로 상태 프레임을 빠른 간격으로
+            health_watch()
+            handler(msg)
     except Exception as e:
-        log_message(f"MQTT 콜백 처리 중 오류: {e}")
+        log_at(LOG_INFO, "MQTT 콜백 처리 중 오류: %s", e)
+    finally:
+        mem_sample(MEM_OP_MQTT_CALLBACK, mem_before)
+        gc_request()
+
+async def connect_mqtt():
+    """MQTT 브로커에 연결하고 구독 (소켓 대기는 모두 비동기, 시간 제한 있음)"""
+    global mqtt_connecting
+    if mqtt_connecting:
+        return False
+    mqtt_connecting = True
+    try:
+        return await _connect_mqtt()
     finally:
-        gc.collect()
+        mqtt_connecting = False
 
-def connect_mqtt():
-    """MQTT 브로커에 연결하고 구독 (라이브러리 호환)"""
-    global mqtt_client, mqtt_connected, force_screen_update
+async def _connect_mqtt():
+    """connect_mqtt 본체 (await 사이에 전역 mqtt_client 가 바뀔 수 있으므로 지역 변수 client 로만 다룸)"""
+    global mqtt_client, mqtt_connected, force_screen_update, mqtt_connect_count, _health_due_now
     
     if not wlan or not wlan.isconnected():
         log_message("MQTT 연결 실패: Wi-Fi 연결 안됨", False)
         mqtt_connected = False
         return False
 
-    if mqtt_client is None:
-        if MQTTClient is None:
-            return False
+    client = mqtt_client
+    if client is None:
         log_message(f"MQTT Client 생성: ID='{CLIENT_ID}', Broker='{MQTT_BROKER}'")
-        try:
-            mqtt_client = MQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT, 
-                                     user=MQTT_USER, password=MQTT_PASSWORD,
-                                     keepalive=MQTT_KEEP_ALIVE)
-            mqtt_client.set_callback(mqtt_callback)
-        except Exception as e:
-            log_message(f"MQTT Client 생성 실패: {e}", False)
-            mqtt_client = None
-            mqtt_connected = False
-            return False
+        client = AsyncMQTTClient(CLIENT_ID, MQTT_BROKER, port=MQTT_PORT, 
+                                 user=MQTT_USER, password=MQTT_PASSWORD,
+                                 keepalive=MQTT_KEEP_ALIVE)
+        client.set_callback(mqtt_callback)
+        client.set_puback_callback(dose_event_on_puback)
+        # 연결이 비정상 종료되면 브로커가 대신 offline 발행 (정상 종료 시에는 직접 "false" 발행 후 DISCONNECT)
+        client.set_last_will(MQTT_ONLINE_STATUS_TOPIC, "false", retain=True, qos=1)
+        mqtt_client = client
 
     log_message("MQTT 브로커 연결 시도...")
     try:
-        mqtt_client.connect()
+        await client.connect()
         log_message("MQTT 연결 성공")
+
+        # con/ 아래 명령 토픽 전체를 와일드카드 하나로 구독 (SUBACK 왕복 한 번)
+        await client.subscribe(MQTT_COMMAND_SUBSCRIPTION, qos=0)
+        log_message(f"구독 완료: {MQTT_COMMAND_SUBSCRIPTION} ({len(MQTT_COMMAND_HANDLERS)}개 명령)")
+        if mqtt_client is not client:
+            raise OSError("연결 중 클라이언트가 닫힘")
+        client.start()
+        mqtt_outbox_reset_sent()
         mqtt_connected = True
+        mqtt_connect_count += 1
+        _health_due_now = True      # 연결 직후 상태 프레임 한 번
         safe_force_screen_update()
 
-        topics_to_subscribe = [
-            MQTT_PUMP1_COMMAND_TOPIC, MQTT_PUMP2_COMMAND_TOPIC,
-            MQTT_SCHEDULE_ADD_TOPIC, MQTT_SCHEDULE_DELETE_TOPIC,
-            MQTT_REQUEST_STATUS_TOPIC
-        ]
-        for topic in topics_to_subscribe:
-            mqtt_client.subscribe(topic, qos=0)
-            log_message(f"구독 완료: {topic}")
-
-        publish_all_status()
+        # 연결 직후에는 브로커의 retained 상태를 믿지 않고 스케줄까지 모두 다시 발행
+        publish_all_status(force=True)
         publish_status(MQTT_ONLINE_STATUS_TOPIC, "true", retain=True)
+        publish_missed_dose_reports()
+        mqtt_outbox_event.set()     # 끊겨 있던 동안 대기열에 남은 항목도 송신
+        dose_event_reset_inflight() # 이전 연결에서 PUBACK 을 못 받은 투여 이벤트는 다시 전송
         if oled:
             oled.text("MQTT Ready!", 0, 40)
             oled.show()
-            time.sleep(1.5)
+            await asyncio.sleep_ms(1500)
         return True
         
     except Exception as e:
         log_message(f"MQTT 연결 실패: {e}")
         mqtt_connected = False
-        try:
-            mqtt_client.disconnect()
-        except Exception as e:
-            pass
-        mqtt_client = None
+        client.close()
+        if mqtt_client is client:
+            mqtt_client = None
         if oled: 
             oled.text(f"MQTT Err", 0, 40)
             oled.show()
-            time.sleep(2)
+            await asyncio.sleep_ms(2000)
         return False
     finally:
         safe_force_screen_update()
 
-def publish_status(topic, payload, retain=False):
-    """MQTT 상태 발행 헬퍼 함수 (QoS 0 사용)"""
-    global mqtt_connected, force_screen_update, mqtt_client, mqtt_connection_attempt_time
-    
-    if mqtt_connected and mqtt_client:
+# --- MQTT 송신 대기열 ---
+# 상태 발행은 호출한 자리에서 소켓에 쓰지 않고 대기열에 넣기만 하며, mqtt_sender_task 가 모아서
+# 클라이언트 송신 버퍼로 넘긴다 (송신 태스크가 한 번의 write 로 소켓에 씀).
+# - 합치는 항목(retained 상태)은 토픽이 키이며, 아직 안 보낸 값이 있으면 자리는 그대로 두고
+#   값만 최신으로 바꾼다 (같은 상태의 연속 발행은 한 번만 나감).
+# - 합치지 않는 항목(ack, delta, 보고)은 순서대로 모두 보낸다.
+# retained 상태는 이번 연결에서 마지막으로 보낸 값과 같으면 보내지 않는다 (브로커가 이미 갖고 있음,
+# 재연결 때 mqtt_outbox_reset_sent() 후 전체 상태를 다시 발행).
+# 항목 수/바이트가 상한을 넘으면 가장 오래된 합치지 않는 항목부터 버린다 (상태 항목은 토픽 수로 제한됨).
+# 클라이언트 송신 버퍼가 MQTT_OUTBOX_BATCH_BYTES 이상 쌓여 있으면 비워질 때까지 넘기지 않는다.
+MQTT_OUTBOX_MAX_ENTRIES = 32        # 대기열 항목 수 상한
+MQTT_OUTBOX_MAX_BYTES = 8192        # 대기열 페이로드 합계 상한 (bytes)
+MQTT_OUTBOX_BATCH_BYTES = 4096      # 송신 버퍼가 이만큼 차 있으면 소켓에 쓸 때까지 대기 (bytes)
+MQTT_RETAINED_DEDUP_MAX_LEN = 128   # 마지막 송신 값을 기억해 중복을 거르는 retained 페이로드 최대 길이
+
+mqtt_outbox_keys = []               # 송신 순서 (토픽 문자열 또는 합치지 않는 항목의 일련번호)
+mqtt_outbox = {}                    # 키 -> (토픽, 페이로드, retain)
+mqtt_outbox_bytes = 0
+mqtt_outbox_event = asyncio.Event()
+mqtt_retained_sent = {}             # 토픽 -> 이번 연결에서 마지막으로 보낸 retained 페이로드
+_mqtt_outbox_seq = 0
+mqtt_outbox_coalesced = 0           # 최신 값으로 대체되었거나 이미 보낸 값이라 생략한 발행 수
+mqtt_outbox_dropped = 0             # 상한 초과로 버린 발행 수
+
+def mqtt_outbox_put(topic, payload, retain=False, coalesce=False):
+    """송신 대기열에 발행 추가 (coalesce 면 같은 토픽의 대기 중인 값을 대체)"""
+    global mqtt_outbox_bytes, _mqtt_outbox_seq, mqtt_outbox_coalesced, mqtt_outbox_dropped
+    if coalesce:
+        key = topic
+        old = mqtt_outbox.get(key)
+        if old is not None:
+            mqtt_outbox_bytes -= len(old[1])
+            mqtt_outbox_coalesced += 1
+        elif retain and mqtt_retained_sent.get(topic) == payload:
+            mqtt_outbox_coalesced += 1
+            return
+        else:
+            mqtt_outbox_keys.append(key)
+    else:
+        _mqtt_outbox_seq = (_mqtt_outbox_seq + 1) & 0x3FFFFFFF
+        key = _mqtt_outbox_seq
+        mqtt_outbox_keys.append(key)
+    mqtt_outbox[key] = (topic, payload, retain)
+    mqtt_outbox_bytes += len(payload)
+
+    # 상한 초과: 가장 오래된 합치지 않는 항목부터 버림
+    i = 0
+    while (len(mqtt_outbox_keys) > MQTT_OUTBOX_MAX_ENTRIES or mqtt_outbox_bytes > MQTT_OUTBOX_MAX_BYTES) \
+            and i < len(mqtt_outbox_keys):
+        k = mqtt_outbox_keys[i]
+        if isinstance(k, int):
+            del mqtt_outbox_keys[i]
+            dropped_topic, dropped_payload, _ = mqtt_outbox.pop(k)
+            mqtt_outbox_bytes -= len(dropped_payload)
+            mqtt_outbox_dropped += 1
+            if mqtt_outbox_dropped & 0x0F == 1:     # 16건마다 한 번만 기록
+                log_message(f"MQTT 송신 대기열 가득 참: {dropped_topic} 버림 (누적 {mqtt_outbox_dropped})", level="WARNING")
+        else:
+            i += 1
+    mqtt_outbox_event.set()
+
+def mqtt_outbox_reset_sent():
+    """새 연결: 마지막 송신 retained 값을 잊음 (다음 상태 발행은 모두 실제로 보냄)"""
+    mqtt_retained_sent.clear()
+
+def mqtt_outbox_transfer(max_pending=MQTT_OUTBOX_BATCH_BYTES):
+    """대기열 항목을 클라이언트 송신 버퍼로 넘김 (송신 버퍼가 max_pending 이상이면 멈춤).
+    다 넘겼으면 True"""
+    global mqtt_outbox_bytes, mqtt_outbox_coalesced, mqtt_connection_attempt_time
+    client = mqtt_client
+    while mqtt_outbox_keys:
+        if not (mqtt_connected and client and client.is_connected()):
+            return False
+        if max_pending is not None and client.tx_pending() >= max_pending:
+            return False
+        key = mqtt_outbox_keys.pop(0)
+        topic, payload, retain = mqtt_outbox.pop(key)
+        mqtt_outbox_bytes -= len(payload)
+        if retain:
+            if mqtt_retained_sent.get(topic) == payload:
+                mqtt_outbox_coalesced += 1
+                continue
+            if len(payload) <= MQTT_RETAINED_DEDUP_MAX_LEN:
+                mqtt_retained_sent[topic] = payload
+            else:
+                mqtt_retained_sent.pop(topic, None)
         try:
-            mqtt_client.publish(topic.encode('utf-8'), payload.encode('utf-8'), retain=retain, qos=0)
+            with SECTION_MQTT_PUBLISH:
+                client.publish(topic, payload, retain=retain, qos=0)
         except OSError as e:
             log_message(f"MQTT 발행 오류 (OSError on {topic}): {e}. 연결 끊김 가능성.")
             mqtt_connection_attempt_time = time.ticks_ms()
         except Exception as e:
             log_message(f"MQTT 발행 중 오류 ({topic}): {e}")
+    return True
+
+async def mqtt_sender_task():
+    """송신 대기열을 클라이언트 송신 버퍼로 옮기는 태스크 (발행한 쪽은 소켓 쓰기를 기다리지 않음)"""
+    while True:
+        try:
+            await mqtt_outbox_event.wait()
+            mqtt_outbox_event.clear()
+            while not mqtt_outbox_transfer():
+                client = mqtt_client
+                if not (mqtt_connected and client and client.is_connected()):
+                    break   # 재연결 후 connect_mqtt 가 이벤트를 다시 set
+                # 송신 버퍼가 소켓에 써질 때까지 대기 (느린 브로커에 대한 역압)
+                await client.wait_drained()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_message(f"MQTT 송신 대기열 태스크 오류: {e}", False)
+            await asyncio.sleep_ms(100)
+
+def mqtt_outbox_stats():
+    """송신 대기열 통계 [항목 수, 바이트, 대체/중복으로 생략한 발행 수, 버린 발행 수]"""
+    return [len(mqtt_outbox_keys), mqtt_outbox_bytes, mqtt_outbox_coalesced, mqtt_outbox_dropped]
+
+def publish_status(topic, payload, retain=False, coalesce=None):
+    """MQTT 상태 발행 헬퍼 함수 (QoS 0, 송신 대기열에 넣었으면 True).
+    coalesce 기본값은 retain 과 같음 (retained 상태는 최신 값만 보냄)"""
+    if mqtt_connected and mqtt_client:
+        mqtt_outbox_put(topic, payload, retain, retain if coalesce is None else coalesce)
+        return True
+    return False
 
 def publish_pump_status(pump_id):
     """특정 펌프의 상태를 MQTT로 발행 (QoS 0)"""
@@ -505,61 +1532,443 @@ def publish_pump_status(pump_id):
     topic = MQTT_PUMP1_STATUS_TOPIC if pump_id == 1 else MQTT_PUMP2_STATUS_TOPIC
     publish_status(topic, status, retain=True)
 
-def publish_schedule_status():
-    """현재 스케줄 목록을 MQTT로 발행 (QoS 0)"""
+# 스케줄 상태는 retained 이므로 주기 발행(publish_all_status) 때 버전이 그대로면 다시 보내지 않는다.
+# 버전이 바뀌어도 내용 해시가 같으면 전체 목록은 생략하고 버전 토픽만 갱신한다.
+_published_schedule_version = -1    # 마지막으로 발행한 schedule_version
+_published_schedule_hash = -1       # 마지막으로 발행한 전체 목록의 내용 해시
+
+def schedule_content_hash():
+    """전체 스케줄 내용의 CRC32 (펌프 순서대로 레코드 버퍼)"""
+    crc = 0
+    for pump_id in sorted(schedules):
+        crc = ubinascii.crc32(bytes((pump_id,)), crc)
+        crc = ubinascii.crc32(schedules[pump_id].buf, crc)
+    return crc & 0xFFFFFFFF
+
+def publish_schedule_status(force=False):
+    """현재 스케줄 목록을 MQTT로 발행 (QoS 0, force 가 아니면 마지막 발행 이후 바뀐 경우만)"""
+    global _published_schedule_version, _published_schedule_hash
     if not (mqtt_connected and mqtt_client): 
         return
+    if not force and schedule_version == _published_schedule_version:
+        return
+    mem_before = gc.mem_alloc()
     try:
-        schedules_str_keys = {str(k): v for k, v in schedules.items()}
-        payload = ujson.dumps(schedules_str_keys)
-        publish_status(MQTT_SCHEDULE_STATUS_TOPIC, payload, retain=True)
+        digest = schedule_content_hash()
+        if force or digest != _published_schedule_hash:
+            schedules_str_keys = {str(k): v.to_list() for k, v in schedules.items()}
+            payload = ujson.dumps(schedules_str_keys)
+            schedules_str_keys = None
+            if not publish_status(MQTT_SCHEDULE_STATUS_TOPIC, payload, retain=True):
+                return
+            _published_schedule_hash = digest
+        if publish_status(MQTT_SCHEDULE_VERSION_TOPIC,
+                          '{"version": %d, "hash": "%08x"}' % (schedule_version, digest), retain=True):
+            _published_schedule_version = schedule_version
     except Exception as e:
         log_message(f"스케줄 상태 발행 오류: {e}")
+    finally:
+        mem_sample(MEM_OP_PUBLISH_SCHEDULES, mem_before)
 
-def publish_all_status():
-    """모든 현재 상태를 MQTT로 발행 (QoS 0)"""
+def publish_schedule_delta(pump_id, added, removed):
+    """스케줄 변경분 발행 (retained 아님): added 는 저장 형식 항목(같은 시각은 교체), removed 는 [hour, minute]"""
+    if not (added or removed):
+        return
+    publish_status(MQTT_SCHEDULE_DELTA_TOPIC, ujson.dumps(
+        {"version": schedule_version, "pump": pump_id, "added": added, "removed": removed}))
+
+def publish_all_status(force=False):
+    """모든 현재 상태를 MQTT로 발행 (QoS 0, 스케줄은 바뀌었거나 force 일 때만).
+    force 가 아니면 이미 보낸 값과 같은 retained 상태는 송신 대기열에서 생략된다"""
     if not (mqtt_connected and mqtt_client): 
         return
+    if force:
+        mqtt_outbox_reset_sent()
     log_message("전체 상태 MQTT 발행 시도 (QoS 0)...", False)
     publish_pump_status(1)
     publish_pump_status(2)
-    publish_schedule_status()
+    publish_schedule_status(force)
+    publish_dose_queue_status()
+
+def publish_perf_status():
+    """태스크 지연 히스토그램을 MQTT로 발행 (QoS 0)"""
+    if not (mqtt_connected and mqtt_client):
+        return
+    try:
+        publish_status(MQTT_PERF_STATUS_TOPIC, perf_report(), retain=False)
+    except Exception as e:
+        log_message(f"성능 계측 발행 오류: {e}")
+
+# --- 상태 프레임 ---
+# 상태 요약 한 건을 sta/health 에 retained 로 발행한다 (5초마다 "a" 를 보내던 heartbeat 를 대체).
+# 평상시에는 MQTT_HEALTH_SLOW_INTERVAL_SEC 간격, 앱이 보고 있다고 알리면(con/watch 또는 명령 수신)
+# MQTT_HEALTH_WATCH_SEC 동안 MQTT_HEALTH_FAST_INTERVAL_SEC 간격으로 발행한다. 기기 생존 여부는
+# 연결 시 설정한 Last Will(sta/online "false")이 알려 주므로 잦은 발행에 의존하지 않는다.
+last_health_time = 0            # 마지막 상태 프레임 발행 시각 (ticks_ms)
+health_watch_until = None       # 이 시각(ticks_ms)까지 빠른 간격 (None 이면 평상시)
+_health_due_now = True          # 다음 확인 때 간격과 관계없이 발행
+_uptime_ms = 0                  # 부팅 후 가동 시간 (ms, ticks 순환과 무관하게 누적)
+_uptime_tick = time.ticks_ms()
+
+def uptime_seconds():
+    """부팅 후 가동 시간 (초)"""
+    global _uptime_ms, _uptime_tick
+    now = time.ticks_ms()
+    _uptime_ms += time.ticks_diff(now, _uptime_tick)
+    _uptime_tick = now
+    return _uptime_ms // 1000
+
+def health_watching():
+    global health_watch_until
+    if health_watch_until is None:
+        return False
+    if time.ticks_diff(health_watch_until, time.ticks_ms()) > 0:
+        return True
+    health_watch_until = None   # 만료 (ticks 순환 후 다시 미래로 보이지 않도록 지움)
+    return False
 
-def publish_heartbeat():
-    """Heartbeat 메시지를 MQTT로 발행"""
-    global last_heartbeat_time
-    if not (mqtt_connected and mqtt_client) or not MQTT_HEARTBEAT_ENABLED:
+def health_watch(seconds=MQTT_HEALTH_WATCH_SEC):
+    """앱이 보는 중: seconds 동안 빠른 간격으로 발행 (새로 보기 시작하면 즉시 한 번)"""
+    global health_watch_until, _health_due_now
+    started = not health_watching()
+    health_watch_until = time.ticks_add(time.ticks_ms(), seconds * 1000)
+    if started:
+        _health_due_now = True
+        publish_health()
+
+def health_interval_ms():
+    return (MQTT_HEALTH_FAST_INTERVAL_SEC if health_watching() else MQTT_HEALTH_SLOW_INTERVAL_SEC) * 1000
+
+def health_frame():
+    """상태 프레임 JSON 문자열
+    up: 가동 초, rssi: dBm, heap: 여유 힙, pumps: [P1, P2] 동작 1/0, q: [P1, P2] 대기 투여 수,
+    sv: 스케줄 버전, last: 마지막 투여 [seq, 펌프, 실제 ms, 종료 time.time()] 또는 null,
+    pend: PUBACK 대기 투여 이벤트 수, err: [WARNING, ERROR, 루프 정지, MQTT 연결 횟수, 버린 메시지],
+    iv: 현재 발행 간격 (초)"""
+    dropped = mqtt_outbox_dropped + dose_events_dropped + mqtt_log_dropped
+    return ujson.dumps({
+        'up': uptime_seconds(),
+        'rssi': measure_wifi_signal_strength(),
+        'heap': gc.mem_free(),
+        'pumps': [1 if pump_tasks.get(1) is not None else 0, 1 if pump_tasks.get(2) is not None else 0],
+        'q': [len(dose_queues[1]), len(dose_queues[2])],
+        'sv': schedule_version,
+        'last': dose_event_last,
+        'pend': len(dose_event_pending),
+        'err': [log_warning_count, log_error_count, stall_count, mqtt_connect_count, dropped],
+        'iv': health_interval_ms() // 1000,
+    })
+
+def health_wait_ms():
+    """다음 상태 프레임 기한까지 남은 시간 (ms, 최대 MQTT_SUPERVISOR_MAX_WAIT_MS)"""
+    if _health_due_now:
+        return 0
+    remaining = health_interval_ms() - time.ticks_diff(time.ticks_ms(), last_health_time)
+    return max(0, min(remaining, MQTT_SUPERVISOR_MAX_WAIT_MS))
+
+def publish_health():
+    """기한이 됐으면 상태 프레임을 MQTT로 발행"""
+    global last_health_time, _health_due_now
+    if not (mqtt_connected and mqtt_client):
         return
     
     current_time = time.ticks_ms()
-    if time.ticks_diff(current_time, last_heartbeat_time) >= MQTT_HEARTBEAT_INTERVAL_SEC * 1000:
+    if _health_due_now or time.ticks_diff(current_time, last_health_time) >= health_interval_ms():
         try:
-            # Heartbeat 메시지 발행 (retain=False, QoS=0)
-            publish_status(MQTT_HEARTBEAT_TOPIC, MQTT_HEARTBEAT_PAYLOAD, retain=False)
-            last_heartbeat_time = current_time
-            log_message(f"Heartbeat sent: {MQTT_HEARTBEAT_PAYLOAD}", level="DEBUG")
+            publish_status(MQTT_HEALTH_TOPIC, health_frame(), retain=True)
+            last_health_time = current_time
+            _health_due_now = False
         except Exception as e:
-            log_message(f"Heartbeat 발행 실패: {e}", level="WARNING")
+            log_message(f"상태 프레임 발행 실패: {e}", level="WARNING")
+
+# --- 스케줄 저장소 ---
+# 펌프별 스케줄을 분 순서로 정렬된 bytearray 하나에 고정 길이 레코드로 보관한다.
+# 튜플 리스트(항목마다 힙 객체 여러 개) 대신 항목당 SCHED_RECORD_SIZE 바이트만 쓰고,
+# 추가/삭제 시에도 버퍼 하나만 새로 할당하므로 힙 단편화가 적다.
+# 반복 규칙은 저장 시점에 정수로 컴파일해 둔다: 요일 비트(월=bit0 ... 일=bit6), 날짜 비트(1일=bit0),
+# 기준일(로컬 epoch 이후 일수, SCHED_FLAG_ANCHOR 일 때만 유효).
+SCHED_RECORD_FMT = "<HIHBBIH"       # 분(0~1439), duration_ms, interval_days, flags, 요일 마스크, 날짜 마스크, 기준일
+SCHED_RECORD_SIZE = const(16)
+SCHED_FLAG_ENABLED = const(0x01)
+SCHED_FLAG_ANCHOR = const(0x02)     # interval_days 를 마지막 실행일이 아닌 기준일부터 계산
+SCHED_NO_ANCHOR = -1
+SCHED_ANCHOR_MAX = 0xFFFF           # 기준일은 uint16 으로 저장 (2000-01-01 ~ 2179년)
+SCHED_DURATION_MAX = 0xFFFFFFFF     # duration_ms 는 uint32 로 저장
+
+def date_to_day(date_str):
+    """'YYYY-MM-DD' 문자열 -> 로컬 epoch 이후 일수"""
+    y, mo, d = map(int, date_str.split('-'))
+    return int(time.mktime((y, mo, d, 0, 0, 0, 0, 0))) // 86400
+
+def day_to_date(day):
+    """로컬 epoch 이후 일수 -> 'YYYY-MM-DD' 문자열"""
+    t = time.localtime(day * 86400)
+    return "{:04d}-{:02d}-{:02d}".format(t[0], t[1], t[2])
+
+def compile_day_mask(values, low, high):
+    """[low..high] 정수 목록 -> 비트마스크 (low 가 bit0), 범위를 벗어나면 ValueError"""
+    mask = 0
+    for v in values:
+        if not isinstance(v, int) or not low <= v <= high:
+            raise ValueError(v)
+        mask |= 1 << (v - low)
+    return mask
+
+class ScheduleStore:
+    """펌프 한 대의 스케줄 (len/인덱스/반복 지원, 항목은 (hour, minute, duration_ms, interval_days) 튜플,
+    반복 규칙은 recurrence(i) 로 조회)"""
+    def __init__(self, buf=None):
+        self.buf = buf if buf is not None else bytearray()
+
+    @staticmethod
+    def _pack_into(buf, offset, minute_of_day, duration_ms, interval_days, weekdays, monthdays, anchor_day):
+        flags = SCHED_FLAG_ENABLED
+        if anchor_day is None or anchor_day < 0:
+            anchor_day = 0
+        else:
+            flags |= SCHED_FLAG_ANCHOR
+        struct.pack_into(SCHED_RECORD_FMT, buf, offset, minute_of_day, duration_ms, interval_days,
+                         flags, weekdays, monthdays, anchor_day)
+
+    @staticmethod
+    def from_items(items):
+        """(hour, minute, duration_ms[, interval_days[, weekdays, monthdays, anchor_day]]) 항목들로 생성
+        (분 순 정렬, 같은 시각은 처음 항목만 유지)"""
+        entries = []
+        seen = set()
+        for item in items:
+            minute_of_day = item[0] * 60 + item[1]
+            if minute_of_day in seen:
+                continue
+            seen.add(minute_of_day)
+            entries.append(item)
+        entries.sort(key=lambda e: e[0] * 60 + e[1])
+        buf = bytearray(len(entries) * SCHED_RECORD_SIZE)
+        for i, item in enumerate(entries):
+            n = len(item)
+            ScheduleStore._pack_into(buf, i * SCHED_RECORD_SIZE, item[0] * 60 + item[1], item[2],
+                                     item[3] if n > 3 else 1,
+                                     item[4] if n > 4 else 0,
+                                     item[5] if n > 5 else 0,
+                                     item[6] if n > 6 else SCHED_NO_ANCHOR)
+        return ScheduleStore(buf)
+
+    def __len__(self):
+        return len(self.buf) // SCHED_RECORD_SIZE
+
+    def minute_at(self, i):
+        """i 번째 항목의 분(hour*60+minute) - 할당 없음"""
+        o = i * SCHED_RECORD_SIZE
+        return self.buf[o] | (self.buf[o + 1] << 8)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        minute_of_day, duration_ms, interval_days = struct.unpack_from("<HIH", self.buf, i * SCHED_RECORD_SIZE)
+        return (minute_of_day // 60, minute_of_day % 60, duration_ms, interval_days)
+
+    def recurrence(self, i):
+        """(요일 마스크, 날짜 마스크, 기준일 또는 SCHED_NO_ANCHOR)"""
+        _, _, _, flags, weekdays, monthdays, anchor_day = struct.unpack_from(SCHED_RECORD_FMT, self.buf, i * SCHED_RECORD_SIZE)
+        return (weekdays, monthdays, anchor_day if flags & SCHED_FLAG_ANCHOR else SCHED_NO_ANCHOR)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _lower_bound(self, minute_of_day):
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self.minute_at(mid) < minute_of_day:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, minute_of_day):
+        """해당 분의 항목 인덱스 (없으면 -1)"""
+        i = self._lower_bound(minute_of_day)
+        if i < len(self) and self.minute_at(i) == minute_of_day:
+            return i
+        return -1
+
+    def add(self, hour, minute, duration_ms, interval_days=1, weekdays=0, monthdays=0, anchor_day=SCHED_NO_ANCHOR):
+        """정렬 위치에 추가 (같은 시각이 이미 있으면 False)"""
+        minute_of_day = hour * 60 + minute
+        i = self._lower_bound(minute_of_day)
+        if i < len(self) and self.minute_at(i) == minute_of_day:
+            return False
+        o = i * SCHED_RECORD_SIZE
+        record = bytearray(SCHED_RECORD_SIZE)
+        ScheduleStore._pack_into(record, 0, minute_of_day, duration_ms, interval_days, weekdays, monthdays, anchor_day)
+        self.buf = self.buf[:o] + record + self.buf[o:]
+        return True
+
+    def delete(self, hour, minute):
+        """해당 시각 항목 삭제 후 삭제된 튜플 반환 (없으면 None)"""
+        i = self.find(hour * 60 + minute)
+        if i < 0:
+            return None
+        item = self[i]
+        o = i * SCHED_RECORD_SIZE
+        self.buf = self.buf[:o] + self.buf[o + SCHED_RECORD_SIZE:]
+        return item
+
+    def record(self, i):
+        """i 번째 항목의 레코드 바이트 (비교/저널 기록용)"""
+        o = i * SCHED_RECORD_SIZE
+        return self.buf[o:o + SCHED_RECORD_SIZE]
+
+    def to_item(self, i):
+        """JSON 저장/발행용 항목: 반복 규칙이 없으면 (hour, minute, duration_ms, interval_days),
+        있으면 (..., 요일 마스크, 날짜 마스크, "YYYY-MM-DD" 또는 None)"""
+        item = self[i]
+        weekdays, monthdays, anchor_day = self.recurrence(i)
+        if weekdays or monthdays or anchor_day != SCHED_NO_ANCHOR:
+            anchor = day_to_date(anchor_day) if anchor_day != SCHED_NO_ANCHOR else None
+            item = item + (weekdays, monthdays, anchor)
+        return item
+
+    def to_list(self):
+        """JSON 저장/발행용 목록 (항목 형식은 to_item 참고)"""
+        return [self.to_item(i) for i in range(len(self))]
+
+    def diff(self, old):
+        """old 대비 변경분: (추가되거나 바뀐 항목 목록, 없어진 [hour, minute] 목록)"""
+        added = []
+        removed = []
+        for i in range(len(self)):
+            j = old.find(self.minute_at(i))
+            if j < 0 or old.record(j) != self.record(i):
+                added.append(self.to_item(i))
+        for j in range(len(old)):
+            minute_of_day = old.minute_at(j)
+            if self.find(minute_of_day) < 0:
+                removed.append([minute_of_day // 60, minute_of_day % 60])
+        return added, removed
+
+def _empty_schedules():
+    return {1: ScheduleStore(), 2: ScheduleStore()}
+
+def schedule_memory_stats():
+    """[전체 항목 수, 레코드 버퍼 바이트] - 항목당 SCHED_RECORD_SIZE 바이트"""
+    entries = 0
+    nbytes = 0
+    for store in schedules.values():
+        entries += len(store)
+        nbytes += len(store.buf)
+    return [entries, nbytes]
+
+def parse_schedule_item(item):
+    """저장/전송 형식의 스케줄 항목 하나를 (hour, minute, duration_ms, interval_days, 요일 마스크, 날짜 마스크, 기준일)
+    로 변환 (형식이 맞지 않으면 None). 목록 형식 [h, m, dur(, interval(, 요일 마스크, 날짜 마스크, "YYYY-MM-DD"|null))]
+    과 con/schedule/add 와 같은 객체 형식 {"hour", "minute", "duration_ms", "interval_days", "weekdays", "monthdays", "anchor"} 지원"""
+    if isinstance(item, dict):
+        try:
+            item = [item.get('hour'), item.get('minute'), item.get('duration_ms'), item.get('interval_days', 1),
+                    compile_day_mask(item.get('weekdays', []), 0, 6),
+                    compile_day_mask(item.get('monthdays', []), 1, 31),
+                    item.get('anchor')]
+        except (ValueError, TypeError):
+            return None
+    if not isinstance(item, (list, tuple)) or len(item) not in (3, 4, 7):
+        return None
+    n = len(item)
+    if not all(isinstance(x, int) for x in item[:min(n, 6)]):
+        return None
+    h, m, duration_ms = item[0], item[1], item[2]
+    interval_days = item[3] if n > 3 else 1  # 기존 3개 요소 형식은 매일
+    if not (0 <= h < 24 and 0 <= m < 60 and 0 < duration_ms <= SCHED_DURATION_MAX and 1 <= interval_days <= 0xFFFF):
+        return None
+    if n == 3 or n == 4:
+        return (h, m, duration_ms, interval_days, 0, 0, SCHED_NO_ANCHOR)
+    weekdays, monthdays, anchor = item[4], item[5], item[6]
+    if not (0 <= weekdays < 0x80 and 0 <= monthdays < 0x80000000) or \
+       not (anchor is None or isinstance(anchor, str)):
+        return None
+    anchor_day = SCHED_NO_ANCHOR
+    if anchor:
+        try:
+            anchor_day = date_to_day(anchor)
+        except ValueError:
+            return None
+        if not 0 <= anchor_day <= SCHED_ANCHOR_MAX:
+            # 레코드에 담을 수 없는 기준일은 잘라내거나 버리지 않고 항목 자체를 거부
+            return None
+    return (h, m, duration_ms, interval_days, weekdays, monthdays, anchor_day)
+
+def replace_schedules(new_schedules):
+    """{"1": [항목, ...], "2": [...]} 로 펌프별 스케줄 전체를 교체 (포함된 펌프만, 전부 검증 후 한 번에 적용,
+    파일 저장/발행도 한 번). 잘못된 항목이 하나라도 있으면 아무것도 바꾸지 않고 ValueError.
+    파일 저장(임시 파일 + rename)이 실패하면 메모리의 스케줄도 되돌리고 OSError - 플래시에는 이전 스냅샷과
+    저널이 그대로 남아 있으므로 재부팅해도 같은 상태다. 펌프별 항목 수 반환"""
+    global schedule_version
+    if not isinstance(new_schedules, dict) or not new_schedules:
+        raise ValueError("schedules 없음")
+    stores = {}
+    for k_str, v_list in new_schedules.items():
+        pump_id = int(k_str) if isinstance(k_str, str) and k_str.isdigit() else None
+        if pump_id not in schedules:
+            raise ValueError(f"잘못된 펌프 ID '{k_str}'")
+        if not isinstance(v_list, list):
+            raise ValueError(f"P{pump_id} 스케줄이 리스트 아님")
+        items = []
+        seen = set()
+        for item in v_list:
+            parsed = parse_schedule_item(item)
+            if parsed is None:
+                raise ValueError(f"P{pump_id} 잘못된 항목 {item}")
+            minute_of_day = parsed[0] * 60 + parsed[1]
+            if minute_of_day in seen:
+                raise ValueError(f"P{pump_id} 중복 시각 {parsed[0]:02d}:{parsed[1]:02d}")
+            seen.add(minute_of_day)
+            items.append(parsed)
+        stores[pump_id] = ScheduleStore.from_items(items)
+    deltas = [(p, store.diff(schedules[p])) for p, store in stores.items()]
+    previous = {p: schedules[p] for p in stores}
+    schedules.update(stores)
+    schedule_version += 1
+    if not save_schedules():
+        schedules.update(previous)
+        schedule_version -= 1
+        rebuild_schedule_index()
+        raise OSError("스케줄 파일 저장 실패")
+    for pump_id, (added, removed) in deltas:
+        publish_schedule_delta(pump_id, added, removed)
+    return {str(p): len(store) for p, store in stores.items()}
 
 # --- 스케줄 저장 및 로드 ---
 # (save_schedules 내부에서 publish_schedule_status 호출됨)
 def save_schedules():
-    """현재 스케줄을 파일에 저장"""
-    global schedules
+    """현재 스케줄 전체를 파일에 저장 (저널 압축 겸용, 저장 후 저널 삭제). 성공하면 True
+    
+    임시 파일에 다 쓴 뒤 rename 으로 교체하고 그 다음에 저널을 지우므로, 도중에 전원이 꺼져도
+    이전 스냅샷 + 저널 또는 새 스냅샷 중 하나가 남는다.
+    """
     log_message(f"'{SCHEDULE_FILENAME}'에 스케줄 저장 시도...", publish_mqtt=False)
+    mem_before = gc.mem_alloc()
     try:
-        schedules_to_save = {}
-        for pump_id, sched_list in schedules.items():
-            sorted_list = sorted([tuple(s) for s in sched_list], key=lambda x: (x[0], x[1]))
-            schedules_to_save[str(pump_id)] = sorted_list
+        schedules_to_save = {"version": schedule_version}
+        for pump_id, store in schedules.items():
+            schedules_to_save[str(pump_id)] = store.to_list()
         
-        with open(SCHEDULE_FILENAME, 'w') as f:
-            ujson.dump(schedules_to_save, f)
+        tmp_path = SCHEDULE_FILENAME + ".tmp"
+        with SECTION_FLASH_SCHEDULES:
+            with open(tmp_path, 'w') as f:
+                ujson.dump(schedules_to_save, f)
+            replace_file(tmp_path, SCHEDULE_FILENAME)
         log_message("스케줄 저장 완료.", publish_mqtt=False)
-        
-        schedules = {int(k): v for k, v in schedules_to_save.items()}
+        schedules_to_save = None
+        _reset_schedule_journal()
+
+        rebuild_schedule_index()
         publish_schedule_status()
-        gc.collect()
+        mem_sample(MEM_OP_SAVE_SCHEDULES, mem_before)
+        gc_request()
+        return True
     except Exception as e:
         log_message(f"스케줄 저장 실패: {e}")
         if oled: 
@@ -568,16 +1977,24 @@ def save_schedules():
             oled.show()
             time.sleep(2)
             oled.fill(0)
+        # 파일 저장에 실패해도 메모리의 스케줄은 이미 바뀌었으므로 인덱스는 맞춰 둔다
+        rebuild_schedule_index()
+        return False
 
 def load_schedules():
     """파일에서 스케줄을 로드하여 전역 변수 업데이트"""
-    global schedules
+    global schedules, schedule_version
     log_message(f"'{SCHEDULE_FILENAME}'에서 스케줄 로드 시도...", publish_mqtt=False)
+    schedule_version = 0
     loaded_schedules = {}
     try:
+        recover_replaced_file(SCHEDULE_FILENAME)
         uos.stat(SCHEDULE_FILENAME)
         with open(SCHEDULE_FILENAME, 'r') as f:
             loaded_data = ujson.load(f)
+            version = loaded_data.pop("version", 0)
+            if isinstance(version, int):
+                schedule_version = version
             for k_str, v_list in loaded_data.items():
                 try:
                     k_int = int(k_str)
@@ -588,107 +2005,470 @@ def load_schedules():
                     valid_schedules = []
                     if isinstance(v_list, list):
                         for item in v_list:
-                            if isinstance(item, (list, tuple)):
-                                # 기존 3개 요소 형식 (hour, minute, duration_ms) 지원
-                                if len(item) == 3 and all(isinstance(x, int) for x in item) and \
-                                   0 <= item[0] < 24 and 0 <= item[1] < 60 and item[2] > 0:
-                                    # 기본 간격 1일 추가
-                                    valid_schedules.append(tuple(list(item) + [1]))
-                                # 새로운 4개 요소 형식 (hour, minute, duration_ms, interval_days) 지원
-                                elif len(item) == 4 and all(isinstance(x, int) for x in item) and \
-                                     0 <= item[0] < 24 and 0 <= item[1] < 60 and item[2] > 0 and item[3] >= 1:
-                                    valid_schedules.append(tuple(item))
-                                else:
-                                    log_message(f"경고: P{k_int} 잘못된 항목 {item}. 무시.", publish_mqtt=False)
+                            # 3개(매일)/4개/7개(반복 규칙 포함) 요소 형식 지원
+                            parsed = parse_schedule_item(item)
+                            if parsed is not None:
+                                valid_schedules.append(parsed)
                             else:
                                 log_message(f"경고: P{k_int} 잘못된 항목 {item}. 무시.", publish_mqtt=False)
                     else: 
                         log_message(f"경고: P{k_int} 스케줄이 리스트 아님 {v_list}. 무시.", publish_mqtt=False)
                     
-                    loaded_schedules[k_int] = sorted(valid_schedules, key=lambda x: (x[0], x[1]))
+                    loaded_schedules[k_int] = ScheduleStore.from_items(valid_schedules)
                 except ValueError: 
                     log_message(f"경고: 잘못된 키 '{k_str}'. 무시.", publish_mqtt=False)
         
         if loaded_schedules:
             schedules = loaded_schedules
             if 1 not in loaded_schedules: 
-                schedules[1] = []
+                schedules[1] = ScheduleStore()
             if 2 not in loaded_schedules: 
-                schedules[2] = []
+                schedules[2] = ScheduleStore()
             log_message("스케줄 로드 완료.", publish_mqtt=False)
         else:
             log_message("로드된 스케줄 비어있음. 기본값 사용.", publish_mqtt=False)
-            schedules = {1: [], 2: []}
+            schedules = _empty_schedules()
             
     except OSError:
         log_message(f"'{SCHEDULE_FILENAME}' 파일 없음. 기본값 사용.", publish_mqtt=False)
-        schedules = {1: [], 2: []}
+        schedules = _empty_schedules()
     except Exception as e:
         log_message(f"스케줄 로드 실패: {e}. 기본값 사용.")
-        schedules = {1: [], 2: []}
+        schedules = _empty_schedules()
     finally:
-        gc.collect()
+        replay_schedule_journal()
+        rebuild_schedule_index()
+        gc_request()
+
+# --- 스케줄 변경 저널 ---
+# 앱/화면에서 스케줄 한 건을 추가/삭제할 때 schedules.json 전체를 다시 쓰지 않고
+# 변경 레코드 하나(SCHED_JOURNAL_RECORD_SIZE 바이트)만 저널 파일 끝에 덧붙인다.
+# 레코드: 동작('A' 추가 / 'D' 삭제), 펌프, ScheduleStore 레코드 (삭제는 분만 유효).
+# 로드 시 스냅샷(schedules.json) 위에 저널을 순서대로 재생하고, 항목이 SCHED_JOURNAL_COMPACT_ENTRIES 개
+# 쌓이거나 SCHED_JOURNAL_IDLE_COMPACT_MS 동안 변경이 없으면 save_schedules() 로 스냅샷에 합친다.
+# 추가는 같은 시각을 덮어쓰고 삭제는 없으면 무시하므로, 압축 중 전원이 꺼져 저널이 남아도 다시 재생하면 결과가 같다.
+SCHED_JOURNAL_OP_ADD = const(0x41)      # 'A'
+SCHED_JOURNAL_OP_DELETE = const(0x44)   # 'D'
+SCHED_JOURNAL_RECORD_SIZE = const(18)   # 2 + SCHED_RECORD_SIZE
+schedule_journal_entries = 0            # 현재 저널 파일의 레코드 수
+_journal_last_append = 0                # 마지막 저널 기록 시각 (ticks_ms)
+
+def _reset_schedule_journal():
+    """스냅샷 저장 후 저널 삭제"""
+    global schedule_journal_entries
+    if schedule_journal_entries:
+        try:
+            uos.remove(SCHEDULE_JOURNAL_FILENAME)
+        except OSError:
+            pass
+        schedule_journal_entries = 0
+
+def replay_schedule_journal():
+    """저널 레코드를 현재 schedules 에 순서대로 적용 (끝의 불완전한 레코드는 무시)"""
+    global schedule_journal_entries, _journal_last_append, schedule_version
+    try:
+        with open(SCHEDULE_JOURNAL_FILENAME, 'rb') as f:
+            data = f.read()
+    except OSError:
+        schedule_journal_entries = 0
+        return
+    applied = 0
+    count = len(data) // SCHED_JOURNAL_RECORD_SIZE
+    for n in range(count):
+        o = n * SCHED_JOURNAL_RECORD_SIZE
+        op, pump_id = data[o], data[o + 1]
+        minute_of_day, duration_ms, interval_days, flags, weekdays, monthdays, anchor_day = \
+            struct.unpack_from(SCHED_RECORD_FMT, data, o + 2)
+        if op != SCHED_JOURNAL_OP_ADD and op != SCHED_JOURNAL_OP_DELETE:
+            # 알 수 없는 동작(손상된 레코드)을 삭제로 처리하면 스케줄이 사라지므로 건너뜀
+            log_message(f"스케줄 저널 레코드 {n}: 알 수 없는 동작 0x{op:02x}. 무시.", publish_mqtt=False)
+            continue
+        store = schedules.get(pump_id)
+        if store is None or minute_of_day >= 1440:
+            continue
+        h, m = divmod(minute_of_day, 60)
+        store.delete(h, m)
+        if op == SCHED_JOURNAL_OP_ADD:
+            store.add(h, m, duration_ms, interval_days, weekdays, monthdays,
+                      anchor_day if flags & SCHED_FLAG_ANCHOR else SCHED_NO_ANCHOR)
+        applied += 1
+    if len(data) % SCHED_JOURNAL_RECORD_SIZE:
+        # 기록 중 전원이 꺼진 경우: 잘린 레코드를 잘라내야 다음 추가 기록이 레코드 경계에 맞는다
+        log_message(f"스케줄 저널 끝의 불완전한 레코드 {len(data) % SCHED_JOURNAL_RECORD_SIZE}바이트 무시", publish_mqtt=False)
+        try:
+            tmp_path = SCHEDULE_JOURNAL_FILENAME + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data[:count * SCHED_JOURNAL_RECORD_SIZE])
+            replace_file(tmp_path, SCHEDULE_JOURNAL_FILENAME)
+        except OSError as e:
+            log_message(f"스케줄 저널 정리 실패: {e}", publish_mqtt=False)
+    schedule_journal_entries = count
+    schedule_version += count
+    _journal_last_append = time.ticks_ms()
+    log_message(f"스케줄 저널 {applied}건 재생", publish_mqtt=False)
+
+def journal_schedule_change(op, pump_id, hour, minute):
+    """스케줄 한 건 추가/삭제를 저널에 기록하고 인덱스/상태 갱신 (save_schedules 대신 호출). 성공하면 True
+    
+    schedule_version 은 저널 기록이나 스냅샷 저장이 성공한 뒤에만 올린다. 둘 다 실패하면 버전과 delta 를
+    발행하지 않는다 (재부팅 후 스냅샷 + 저널로 다시 만든 버전이 발행한 버전보다 작아지지 않도록).
+    """
+    global schedule_journal_entries, _journal_last_append, schedule_version
+    record = bytearray(SCHED_JOURNAL_RECORD_SIZE)
+    record[0] = op
+    record[1] = pump_id
+    minute_of_day = hour * 60 + minute
+    store = schedules[pump_id]
+    if op == SCHED_JOURNAL_OP_ADD:
+        i = store.find(minute_of_day)
+        record[2:] = store.record(i)
+        delta = ([store.to_item(i)], [])
+    else:
+        struct.pack_into("<H", record, 2, minute_of_day)
+        delta = ([], [[hour, minute]])
+    journaled = False
+    if schedule_journal_entries < SCHED_JOURNAL_COMPACT_ENTRIES:
+        try:
+            with SECTION_FLASH_SCHEDULE_JOURNAL:
+                with open(SCHEDULE_JOURNAL_FILENAME, 'ab') as f:
+                    f.write(record)
+            journaled = True
+        except Exception as e:
+            log_message(f"스케줄 저널 기록 실패: {e}. 전체 저장으로 대체.")
+    # 저널이 가득 찼거나 기록에 실패하면 이번 변경까지 포함해 스냅샷으로 저장 (스냅샷에 새 버전이 들어감)
+    schedule_version += 1
+    if journaled:
+        schedule_journal_entries += 1
+        _journal_last_append = time.ticks_ms()
+        rebuild_schedule_index()
+        publish_schedule_status()
+    elif not save_schedules():
+        schedule_version -= 1
+        return False
+    publish_schedule_delta(pump_id, *delta)
+    return True
+
+def compact_schedule_journal_if_idle():
+    """마지막 변경 후 SCHED_JOURNAL_IDLE_COMPACT_MS 가 지났으면 저널을 스냅샷에 합침"""
+    if schedule_journal_entries and \
+       time.ticks_diff(time.ticks_ms(), _journal_last_append) >= SCHED_JOURNAL_IDLE_COMPACT_MS:
+        log_message(f"스케줄 저널 {schedule_journal_entries}건 압축", publish_mqtt=False)
+        save_schedules()
+
+# --- 스케줄 인덱스 ---
+# 스케줄이 바뀔 때(save_schedules/load_schedules)만 다시 만든다. 분 단위 검사와 화면의 "Next:" 는
+# 정렬된 분(0~1439) 표에서 이분 탐색하므로 스케줄 개수와 관계없이 비용이 일정하다.
+schedule_pump_minutes = {}                   # 펌프별 정렬된 분 (ScheduleStore 순서와 같음, 이분 탐색용)
+schedule_merged_minutes = array.array('H')  # 전체 펌프 병합 분 (분, 펌프 순 정렬)
+schedule_merged_pumps = bytearray()          # 같은 순서의 펌프 번호
+_next_cursor_minute = -1                 # 마지막으로 조회한 현재 분
+_next_cursor_label = None                # 그 분 기준 다음 스케줄 표시 문자열
+SCHED_MAX_SLEEP_S = 3600                 # 다음 스케줄이 멀어도 이 간격마다 깨어 시각 재확인 (RTC 보정 대비)
+SCHED_UNSYNCED_RETRY_S = 10              # 시간 미동기화 상태에서 재확인 주기
+schedule_wake_event = asyncio.Event()    # 스케줄 변경/시계 변경 시 check_schedules_task 를 깨움
+
+def schedule_wake():
+    """스케줄러가 다음 실행 시각을 다시 계산하도록 깨움"""
+    schedule_wake_event.set()
+
+def _bisect_right(values, x):
+    """정렬된 리스트에서 x 보다 큰 첫 위치"""
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if x < values[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+def _bisect_left(values, x):
+    """정렬된 리스트에서 x 이상인 첫 위치"""
+    lo, hi = 0, len(values)
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if values[mid] < x:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def rebuild_schedule_index():
+    """schedules 로부터 펌프별 분 표와 병합 표를 다시 만든다"""
+    global schedule_pump_minutes, schedule_merged_minutes, schedule_merged_pumps, \
+           _next_cursor_minute, _next_cursor_label
+    pump_minutes = {}
+    merged = []
+    for pump_id in schedules:
+        store = schedules[pump_id]
+        minutes = array.array('H', [store.minute_at(i) for i in range(len(store))])
+        pump_minutes[pump_id] = minutes
+        for minute_of_day in minutes:
+            merged.append((minute_of_day, pump_id))
+    merged.sort()
+    schedule_pump_minutes = pump_minutes
+    schedule_merged_minutes = array.array('H', [e[0] for e in merged])
+    schedule_merged_pumps = bytearray([e[1] for e in merged])
+    _next_cursor_minute = -1
+    _next_cursor_label = None
+    schedule_wake()
+
+def schedule_due_index(pump_id, minute_of_day):
+    """해당 분에 예정된 펌프 스케줄의 저장소 인덱스 (없으면 -1)"""
+    minutes = schedule_pump_minutes.get(pump_id)
+    if not minutes:
+        return -1
+    i = _bisect_left(minutes, minute_of_day)
+    if i < len(minutes) and minutes[i] == minute_of_day:
+        return i
+    return -1
+
+def seconds_until_next_schedule(second_of_day):
+    """현재 시각(로컬 자정 이후 초) 다음 분부터 가장 가까운 스케줄까지 남은 초 (스케줄 없으면 None)"""
+    if not schedule_merged_minutes:
+        return None
+    i = _bisect_right(schedule_merged_minutes, second_of_day // 60)
+    if i < len(schedule_merged_minutes):
+        next_minute = schedule_merged_minutes[i]
+    else:
+        next_minute = schedule_merged_minutes[0] + 1440  # 내일 첫 스케줄
+    return next_minute * 60 - second_of_day
+
+def next_schedule_label(minute_of_day):
+    """현재 분 이후 첫 스케줄 표시 문자열 (오늘 남은 것이 없으면 내일 첫 스케줄, 없으면 None)"""
+    global _next_cursor_minute, _next_cursor_label
+    if minute_of_day != _next_cursor_minute:
+        _next_cursor_minute = minute_of_day
+        if schedule_merged_minutes:
+            i = _bisect_right(schedule_merged_minutes, minute_of_day)
+            if i == len(schedule_merged_minutes):
+                i = 0
+            m = schedule_merged_minutes[i]
+            _next_cursor_label = "P{} {:02d}:{:02d}".format(schedule_merged_pumps[i], m // 60, m % 60)
+        else:
+            _next_cursor_label = None
+    return _next_cursor_label
 
 # --- 스케줄 실행 기록 관리 ---
+# 실행 기록(마지막 실행 날짜)은 부팅 시 한 번 읽어 RAM 에 두고, 스케줄 검사에서는 플래시를
+# 읽거나 쓰지 않는다. 변경분은 schedule_ledger_writer_task 가 LEDGER_FLUSH_DELAY_MS 동안
+# 모아서 한 번에 저장한다. 날짜는 로컬 기준 epoch 이후 일수(정수)로 비교한다.
+LEDGER_FLUSH_CHECK_MS = 1000    # 저장 필요 여부 확인 주기 (ms)
+LEDGER_FLUSH_DELAY_MS = 2000    # 첫 변경 후 이 시간 동안 들어온 변경을 모아서 저장 (ms)
+schedule_ledger = {}            # pump_id*10000 + hour*100 + minute -> 마지막 실행 일수
+schedule_last_eval = None       # 스케줄러가 마지막으로 처리한 로컬 분 (epoch 이후 분, 실행 기록 파일에 함께 저장)
+_ledger_dirty = False
+_ledger_dirty_since = 0         # 첫 미저장 변경 시각 (ticks_ms)
+schedule_ledger_flush_event = asyncio.Event()   # 지연 없이 저장할 변경이 있을 때 writer 를 깨움
+
+def local_day_number():
+    """로컬 날짜의 epoch 이후 일수"""
+    return int(time.time() + TIMEZONE_OFFSET) // 86400
+
+def _ledger_key(pump_id, hour, minute):
+    return pump_id * 10000 + hour * 100 + minute
+
 def load_schedule_log():
-    """스케줄 실행 기록 로드"""
+    """스케줄 실행 기록 파일을 schedule_ledger 로 로드 (부팅 시 1회)"""
+    global schedule_ledger, schedule_last_eval, _ledger_dirty
+    ledger = {}
     try:
-        with open(SCHEDULE_LOG_FILENAME, 'r') as f:
-            return ujson.load(f)
+        with SECTION_FLASH_SCHEDULE_LOG:
+            with open(SCHEDULE_LOG_FILENAME, 'r') as f:
+                data = ujson.load(f)
+        for key, value in data.items():
+            try:
+                if key == "last_eval":
+                    schedule_last_eval = int(value)
+                    continue
+                # 키 형식: "P1_08_00"
+                pump_id = int(key[1])
+                hour = int(key[3:5])
+                minute = int(key[6:8])
+                if isinstance(value, str):
+                    # 이전 형식 "YYYY-MM-DD" 는 로드할 때 한 번만 일수로 변환
+                    value = date_to_day(value)
+                ledger[_ledger_key(pump_id, hour, minute)] = int(value)
+            except (ValueError, IndexError, TypeError):
+                log_message(f"경고: 잘못된 실행 기록 항목 {key}={value}. 무시.", False)
+    except OSError:
+        pass
     except Exception as e:
-        return {}
-
-def save_schedule_log(schedule_log):
-    """스케줄 실행 기록 저장"""
+        log_message(f"스케줄 실행 기록 로드 실패: {e}", False)
+    schedule_ledger = ledger
+    _ledger_dirty = False
+
+def save_schedule_log():
+    """schedule_ledger 를 파일에 저장 (성공하면 True)"""
+    global _ledger_dirty
+    data = {}
+    for key, day in schedule_ledger.items():
+        data["P{}_{:02d}_{:02d}".format(key // 10000, key // 100 % 100, key % 100)] = day
+    if schedule_last_eval is not None:
+        data["last_eval"] = schedule_last_eval
     try:
-        with open(SCHEDULE_LOG_FILENAME, 'w') as f:
-            ujson.dump(schedule_log, f)
+        with SECTION_FLASH_SCHEDULE_LOG:
+            with open(SCHEDULE_LOG_FILENAME, 'w') as f:
+                ujson.dump(data, f)
+        _ledger_dirty = False
+        return True
     except Exception as e:
         log_message(f"스케줄 실행 기록 저장 실패: {e}", False)
+        return False
 
-def should_run_schedule(pump_id, hour, minute, interval_days):
-    """스케줄이 실행되어야 하는지 확인 (날짜 간격 체크)"""
-    if interval_days == 1:  # 매일 실행
-        return True
-    
-    schedule_log = load_schedule_log()
-    schedule_key = f"P{pump_id}_{hour:02d}_{minute:02d}"
-    
-    now = get_local_time()
-    current_date = f"{now[0]}-{now[1]:02d}-{now[2]:02d}"
+def flush_schedule_log():
+    """미저장 실행 기록이 있으면 즉시 저장 (재부팅 전 등)"""
+    if _ledger_dirty:
+        save_schedule_log()
+
+async def schedule_ledger_writer_task():
+    """실행 기록 변경을 모아 지연 저장 (유휴 시 스케줄 저널 압축, 확인된 투여 이벤트 정리도 함께 처리)"""
+    global _ledger_dirty_since
+    while True:
+        try:
+            await asyncio.wait_for_ms(schedule_ledger_flush_event.wait(), LEDGER_FLUSH_CHECK_MS)
+        except asyncio.TimeoutError:
+            pass
+        # 타임아웃과 같은 틱에 set 된 요청도 놓치지 않도록 이벤트 상태로 판단
+        flush_now = schedule_ledger_flush_event.is_set()
+        schedule_ledger_flush_event.clear()
+        try:
+            if _ledger_dirty and (flush_now or
+                                  time.ticks_diff(time.ticks_ms(), _ledger_dirty_since) >= LEDGER_FLUSH_DELAY_MS):
+                if not save_schedule_log():
+                    # 실패 시 한 주기 뒤 재시도
+                    _ledger_dirty_since = time.ticks_ms()
+            compact_schedule_journal_if_idle()
+            flush_dose_events_if_idle()
+        except Exception as e:
+            log_message(f"실행 기록 저장 태스크 오류: {e}", False)
+
+def _mark_ledger_dirty():
+    global _ledger_dirty, _ledger_dirty_since
+    if not _ledger_dirty:
+        _ledger_dirty = True
+        _ledger_dirty_since = time.ticks_ms()
+
+def should_run_schedule(pump_id, hour, minute, interval_days, day=None):
+    """스케줄이 실행되어야 하는지 확인 (날짜 간격 체크, day 가 None 이면 오늘)
     
-    if schedule_key not in schedule_log:
+    매일 실행(interval_days == 1)도 실행 기록을 확인한다. 같은 분 안에서 재부팅하면 RAM 의
+    처리 기록이 사라지므로, 오늘 이미 실행했는지는 실행 기록 파일로만 알 수 있다.
+    """
+    last_day = schedule_ledger.get(_ledger_key(pump_id, hour, minute))
+    if last_day is None:
         # 처음 실행
         return True
-    
-    last_run_date = schedule_log[schedule_key]
-    
-    try:
-        # 날짜 차이 계산
-        last_year, last_month, last_day = map(int, last_run_date.split('-'))
-        current_year, current_month, current_day = now[0], now[1], now[2]
-        
-        # 간단한 날짜 차이 계산 (년도가 바뀌지 않는다고 가정)
-        import time
-        last_timestamp = time.mktime((last_year, last_month, last_day, 0, 0, 0, 0, 0))
-        current_timestamp = time.mktime((current_year, current_month, current_day, 0, 0, 0, 0, 0))
-        days_diff = int((current_timestamp - last_timestamp) / 86400)  # 86400초 = 1일
-        
-        return days_diff >= interval_days
-    except Exception as e:
-        # 날짜 파싱 오류 시 실행
-        return True
-
-def record_schedule_run(pump_id, hour, minute):
-    """스케줄 실행 기록"""
-    schedule_log = load_schedule_log()
-    schedule_key = f"P{pump_id}_{hour:02d}_{minute:02d}"
-    
-    now = get_local_time()
-    current_date = f"{now[0]}-{now[1]:02d}-{now[2]:02d}"
-    
-    schedule_log[schedule_key] = current_date
-    save_schedule_log(schedule_log)
+    if day is None:
+        day = local_day_number()
+    return day - last_day >= interval_days
+
+_day_bits_cache = [-1, 0, 0]    # [일수, 요일 비트, 날짜 비트] - 하루에 한 번만 localtime 계산
+
+def _day_bits(day):
+    """해당 일의 (요일 비트, 날짜 비트)"""
+    c = _day_bits_cache
+    if c[0] != day:
+        t = time.localtime(day * 86400)
+        c[0] = day
+        c[1] = 1 << t[6]
+        c[2] = 1 << (t[2] - 1)
+    return c[1], c[2]
+
+def schedule_runs_on(pump_id, store, i, day=None):
+    """store 의 i 번째 스케줄이 해당 일(None 이면 오늘)에 실행되는지 (요일/날짜 마스크, 기준일 또는 실행 기록 간격)"""
+    if day is None:
+        day = local_day_number()
+    h, m, _, interval_days = store[i]
+    weekdays, monthdays, anchor_day = store.recurrence(i)
+    if weekdays or monthdays:
+        wbit, mbit = _day_bits(day)
+        if weekdays and not weekdays & wbit:
+            return False
+        if monthdays and not monthdays & mbit:
+            return False
+    if anchor_day != SCHED_NO_ANCHOR:
+        return day >= anchor_day and (day - anchor_day) % interval_days == 0
+    return should_run_schedule(pump_id, h, m, interval_days, day)
+
+def record_schedule_run(pump_id, hour, minute, day=None):
+    """스케줄 실행 기록 (RAM 갱신, 파일 저장은 schedule_ledger_writer_task 가 담당)"""
+    key = _ledger_key(pump_id, hour, minute)
+    if day is None:
+        day = local_day_number()
+    last_day = schedule_ledger.get(key)
+    if last_day is not None and last_day >= day:
+        return
+    schedule_ledger[key] = day
+    _mark_ledger_dirty()
+
+def mark_schedule_evaluated(local_minute):
+    """스케줄러가 local_minute(epoch 이후 로컬 분)까지 처리했음을 기록"""
+    global schedule_last_eval
+    if local_minute != schedule_last_eval:
+        schedule_last_eval = local_minute
+        _mark_ledger_dirty()
+
+# --- 누락 투여 보충 ---
+# 스케줄러가 마지막으로 처리한 분(schedule_last_eval)과 현재 분 사이에 지나간 스케줄을 찾아
+# 펌프별 MISSED_DOSE_POLICY 에 따라 늦게 실행하거나 건너뛰고, 결과를 sta/missed 로 보고한다.
+MISSED_REPORT_MAX = 16          # 발행 대기 보고 최대 개수 (넘치면 오래된 것부터 버림)
+missed_dose_reports = []        # MQTT 미연결 중 쌓인 보고 (JSON 문자열)
+
+def _missed_dose_report(pump_id, occ_minute, duration_ms, action, late_min):
+    day, minute_of_day = divmod(occ_minute, 1440)
+    t = time.localtime(day * 86400)
+    when = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}".format(t[0], t[1], t[2], minute_of_day // 60, minute_of_day % 60)
+    log_message(f"SCHED: P{pump_id} 누락 {when} -> {action} ({late_min}분 지남)")
+    missed_dose_reports.append(ujson.dumps({'pump': pump_id, 'time': when, 'duration_ms': duration_ms,
+                                            'action': action, 'late_min': late_min}))
+    if len(missed_dose_reports) > MISSED_REPORT_MAX:
+        missed_dose_reports.pop(0)
+
+def publish_missed_dose_reports():
+    """쌓인 누락 투여 보고 발행 (MQTT 연결 시)"""
+    while missed_dose_reports and mqtt_connected:
+        publish_status(MQTT_MISSED_DOSE_TOPIC, missed_dose_reports.pop(0), retain=False)
+
+def find_missed_doses(pump_id, after_minute, before_minute):
+    """(after_minute, before_minute) 사이에 예정됐던 펌프 스케줄 [(분, 저장소 인덱스), ...] (시간순)"""
+    store = schedules.get(pump_id)
+    if not store:
+        return []
+    missed = []
+    for day in range(after_minute // 1440, before_minute // 1440 + 1):
+        base = day * 1440
+        for i in range(len(store)):
+            occ = base + store.minute_at(i)
+            if after_minute < occ < before_minute:
+                missed.append((occ, i))
+    return missed
+
+def catch_up_missed_doses(now_minute):
+    """마지막 처리 분 이후 지나간 스케줄을 정책에 따라 보충/건너뜀"""
+    if schedule_last_eval is None or now_minute - schedule_last_eval <= 1:
+        return
+    after = max(schedule_last_eval, now_minute - MISSED_DOSE_LOOKBACK_SEC // 60 - 1)
+    for pump_id in schedules:
+        policy = MISSED_DOSE_POLICY.get(pump_id, "skip")
+        window = MISSED_DOSE_WINDOW_MIN.get(pump_id, 0)
+        store = schedules[pump_id]
+        for occ, i in find_missed_doses(pump_id, after, now_minute):
+            h, m, duration_ms, _ = store[i]
+            occ_day = occ // 1440
+            if schedule_ledger.get(_ledger_key(pump_id, h, m), -1) >= occ_day:
+                continue  # 이미 실행됨
+            if not schedule_runs_on(pump_id, store, i, occ_day):
+                continue  # 반복 규칙상 원래 실행 안 될 날
+            late_min = now_minute - occ
+            # 보충 투여는 가장 낮은 우선순위로 큐에 넣고, 큐가 가득 차면 건너뜀으로 보고
+            if (policy == "late" or (policy == "window" and late_min <= window)) and \
+               dose_enqueue(pump_id, duration_ms, DOSE_PRIO_CATCH_UP, "catchup"):
+                record_schedule_run(pump_id, h, m, occ_day)
+                _missed_dose_report(pump_id, occ, duration_ms, "run", late_min)
+            else:
+                _missed_dose_report(pump_id, occ, duration_ms, "skip", late_min)
+    publish_missed_dose_reports()
 
 
 # --- 하드웨어 초기화 ---
@@ -857,22 +2637,25 @@ def calibrate_pump(pump_id, ml_amount=200):
 def pump_on(pump_id):
     """펌프를 PWM으로 동작"""
     global pump1_pwm, pump2_pwm
-    log_message(f"DEBUG: pump_on called for pump {pump_id}, PWM duty: {pump_pwm_duty[pump_id]}", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("pump_on called for pump %s, PWM duty: %s", pump_id, pump_pwm_duty[pump_id])
     
     if pump_id == 1 and pump1_in1 and pump1_in2:
         pump1_in2.off()
         if pump1_pwm is not None:
             pump1_pwm.deinit()
         pump1_pwm = machine.PWM(pump1_in1, freq=PUMP_PWM_FREQ, duty=int(pump_pwm_duty[pump_id]))
-        log_message(f"DEBUG: Pump 1 PWM started with duty {int(pump_pwm_duty[pump_id])}", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("Pump 1 PWM started with duty %s", int(pump_pwm_duty[pump_id]))
     elif pump_id == 2 and pump2_in1 and pump2_in2:
         pump2_in2.off()
         if pump2_pwm is not None:
             pump2_pwm.deinit()
         pump2_pwm = machine.PWM(pump2_in1, freq=PUMP_PWM_FREQ, duty=int(pump_pwm_duty[pump_id]))
-        log_message(f"DEBUG: Pump 2 PWM started with duty {int(pump_pwm_duty[pump_id])}", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("Pump 2 PWM started with duty %s", int(pump_pwm_duty[pump_id]))
     else:
-        log_message(f"ERROR: pump_on failed for pump {pump_id} - pins not initialized", False)
+        log_at(LOG_INFO, "ERROR: pump_on failed for pump %s - pins not initialized", pump_id, publish_mqtt=False)
 
 def pump_off(pump_id):
     """PWM으로 펌프를 끔"""
@@ -911,13 +2694,16 @@ def calibration_pump_thread(pump_id, duration_ms):
     calibration_elapsed_sec = 0
     calibration_remaining_sec = duration_ms // 1000
     
-    log_message(f"DEBUG: calibration_pump_thread started for pump {pump_id}, duration {duration_ms}ms", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("calibration_pump_thread started for pump %s, duration %sms", pump_id, duration_ms)
     
     try:
         # 펌프 시작
-        log_message(f"DEBUG: About to call pump_on({pump_id}) in thread", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("About to call pump_on(%s) in thread", pump_id)
         pump_on(pump_id)
-        log_message(f"DEBUG: pump_on({pump_id}) called successfully in thread!", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("pump_on(%s) called successfully in thread!", pump_id)
         
         # 시작 시간 기록
         start_time = time.ticks_ms()
@@ -935,8 +2721,8 @@ def calibration_pump_thread(pump_id, duration_ms):
             calibration_remaining_sec = max(0, (duration_ms - elapsed_ms) // 1000)
             
             # 1초마다 진행상황 로그
-            if elapsed_ms % 1000 < check_interval_ms:  # 1초 근처에서만 로그
-                log_message(f"DEBUG: Calibration running - {calibration_elapsed_sec}s elapsed, {calibration_remaining_sec}s remaining", False)
+            if DEBUG_LOG_BUILD and elapsed_ms % 1000 < check_interval_ms:  # 1초 근처에서만 로그
+                log_debug("Calibration running - %ss elapsed, %ss remaining", calibration_elapsed_sec, calibration_remaining_sec)
             
             # 종료 조건 체크
             if elapsed_ms >= duration_ms or calibration_thread_stop_flag:
@@ -953,7 +2739,8 @@ def calibration_pump_thread(pump_id, duration_ms):
         # 자동으로 입력 화면으로 이동 (중단되지 않았을 때만)
         if not calibration_thread_stop_flag:
             current_screen = "CALIBRATE_INPUT"
-            log_message("DEBUG: Calibration completed - moved to input screen", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Calibration completed - moved to input screen")
             
     except Exception as e:
         log_message(f"P{pump_id} error during calibration thread: {e}")
@@ -962,18 +2749,22 @@ def calibration_pump_thread(pump_id, duration_ms):
         
     finally:
         # 펌프 정지
-        log_message(f"DEBUG: About to call pump_off({pump_id}) in thread", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("About to call pump_off(%s) in thread", pump_id)
         pump_off(pump_id)
-        log_message(f"DEBUG: pump_off({pump_id}) called successfully in thread!", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("pump_off(%s) called successfully in thread!", pump_id)
         
         calibration_thread_running = False
-        log_message(f"DEBUG: calibration_pump_thread finished for pump {pump_id}", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("calibration_pump_thread finished for pump %s", pump_id)
 
 # --- 기존 run_calibration_pump 함수를 백업용으로 유지하되 사용하지 않음 ---
 async def run_calibration_pump_backup(pump_id, duration_ms):
     """캘리브레이션용 펌프 실행 함수 (백업용 - 현재 사용 안함)"""
     global pump_tasks, force_screen_update, calibration_stage, current_screen
-    log_message(f"DEBUG: run_calibration_pump called for pump {pump_id}, duration {duration_ms}ms", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("run_calibration_pump called for pump %s, duration %sms", pump_id, duration_ms)
     
     if pump_id not in [1, 2]: 
         log_message(f"ERROR: Invalid pump_id {pump_id}", False)
@@ -988,10 +2779,12 @@ async def run_calibration_pump_backup(pump_id, duration_ms):
     log_message(f"P{pump_id} Calibration ON for {duration_ms}ms")
 
     try:
-        log_message(f"DEBUG: About to call pump_on({pump_id})", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("About to call pump_on(%s)", pump_id)
         pump_on(pump_id)
-        log_message(f"DEBUG: pump_on({pump_id}) called successfully!", False)
-        log_message(f"DEBUG: Starting sleep for {duration_ms}ms", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("pump_on(%s) called successfully!", pump_id)
+            log_debug("Starting sleep for %sms", duration_ms)
         await asyncio.sleep_ms(duration_ms)
         log_message(f"P{pump_id} Calibration completed after {duration_ms}ms")
         calibration_stage = 2  # 완료 상태로 변경
@@ -999,14 +2792,16 @@ async def run_calibration_pump_backup(pump_id, duration_ms):
         current_screen = "CALIBRATE_INPUT"
         if oled:
             display_calibrate_input_screen()
-            log_message("DEBUG: Calibration completed - moved to input screen", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Calibration completed - moved to input screen")
     except asyncio.CancelledError:
         log_message(f"P{pump_id} calibration cancelled.")
         calibration_stage = 2  # 취소되어도 입력 단계로 이동
         # 캘리브레이션 취소 시에는 입력 화면으로 이동하지 않음 (이미 버튼 핸들러에서 처리됨)
         if oled and current_screen == "CALIBRATE_PUMP":
             display_calibrate_pump_screen()
-            log_message("DEBUG: Calibration cancelled - screen updated", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Calibration cancelled - screen updated")
     except Exception as e:
         log_message(f"P{pump_id} error during calibration: {e}")
         calibration_stage = 2
@@ -1014,11 +2809,14 @@ async def run_calibration_pump_backup(pump_id, duration_ms):
         current_screen = "CALIBRATE_INPUT"
         if oled:
             display_calibrate_input_screen()
-            log_message("DEBUG: Calibration error - moved to input screen", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Calibration error - moved to input screen")
     finally:
-        log_message(f"DEBUG: About to call pump_off({pump_id})", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("About to call pump_off(%s)", pump_id)
         pump_off(pump_id)
-        log_message(f"DEBUG: pump_off({pump_id}) called successfully!", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("pump_off(%s) called successfully!", pump_id)
         if pump_tasks.get(pump_id) == task:
             pump_tasks[pump_id] = None
         force_screen_update = True
@@ -1102,7 +2900,8 @@ async def connect_wifi_single_attempt(ssid, password, timeout=30):
         # WiFi 네트워크 스캔으로 대상 네트워크 확인
         try:
             log_message("WiFi 네트워크 스캔 중...")
-            networks = wlan.scan()
+            with SECTION_WIFI_SCAN:
+                networks = wlan.scan()
             target_found = False
             
             for net in networks:
@@ -1258,6 +3057,14 @@ async def connect_wifi_single_attempt(ssid, password, timeout=30):
 
 async def connect_wifi():
     """개선된 WiFi 연결 (다중 재시도 및 지수 백오프)"""
+    mem_before = gc.mem_alloc()
+    try:
+        return await _connect_wifi()
+    finally:
+        mem_sample(MEM_OP_WIFI_RECONNECT, mem_before)
+
+async def _connect_wifi():
+    """connect_wifi 본체"""
     global wifi_connection_attempts, wifi_connection_stats, wifi_current_network_index, force_screen_update
     
     # 이미 연결되어 있으면 신호 강도만 체크
@@ -1431,7 +3238,7 @@ async def monitor_wifi_connection():
                         log_message("WiFi 자동 재연결 성공")
                         # MQTT 재연결도 시도
                         if not mqtt_connected:
-                            connect_mqtt()
+                            await connect_mqtt()
                     safe_force_screen_update()
             
             # 모니터링 간격 대기
@@ -1570,21 +3377,25 @@ async def sync_time_ntp():
         
         for i in range(2):  # 각 서버당 2회 시도
             try:
-                ntptime.settime()
+                with SECTION_NTP_SYNC:
+                    ntptime.settime()
                 log_message(f"NTP 시간 동기화 완료 (서버: {server})")
                 
-                try:
-                    current_utc_secs_after_sync = time.time()
-                    log_message(f"DEBUG: time.time() after sync = {current_utc_secs_after_sync}")
-                    log_message(f"DEBUG: time.localtime() after sync = {time.localtime(current_utc_secs_after_sync)}")
-                except Exception as log_err:
-                    log_message(f"DEBUG: Error logging time after sync: {log_err}")
+                if DEBUG_LOG_BUILD:
+                    try:
+                        current_utc_secs_after_sync = time.time()
+                        log_debug("time.time() after sync = %s", current_utc_secs_after_sync)
+                        log_debug("time.localtime() after sync = %s", time.localtime(current_utc_secs_after_sync))
+                    except Exception as log_err:
+                        log_debug("Error logging time after sync: %s", log_err)
                 
                 if oled: 
                     oled.text("Time OK!", 0, 30)
                     oled.show()
                     await asyncio.sleep(1)
                 synced = True
+                # 시계가 바뀌었으므로 스케줄러가 다음 실행 시각을 다시 계산
+                schedule_wake()
                 break
             except OSError as e:
                 log_message(f"NTP 실패 {server} (시도 {i+1}): OSError {e}")
@@ -1603,20 +3414,20 @@ async def sync_time_ntp():
             await asyncio.sleep(1.5)
     
     force_screen_update = True
-    gc.collect()
+    gc_request()
     return synced
 
-async def run_pump_for_duration(pump_id, duration_ms):
-    """지정된 시간(ms) 동안 펌프를 PWM으로 동작"""
+async def run_pump_for_duration(pump_id, duration_ms, source=None):
+    """지정된 시간(ms) 동안 펌프를 PWM으로 동작 (끝나면 투여 이벤트 기록, source 는 투여 큐의 출처)"""
     global pump_tasks, force_screen_update, manual_pump_states
     if pump_id not in [1, 2]: 
         return
     if pump_tasks.get(pump_id) is not None:
-        log_message(f"P{pump_id} run request ignored, already running.", False)
+        log_at(LOG_INFO, "P%s run request ignored, already running.", pump_id, publish_mqtt=False)
         return
 
     if manual_pump_states.get(pump_id, False):
-        log_message(f"P{pump_id}: Scheduled run starting, clearing manual ON state.", False)
+        log_at(LOG_INFO, "P%s: Scheduled run starting, clearing manual ON state.", pump_id, publish_mqtt=False)
         manual_pump_states[pump_id] = False
 
     task = asyncio.current_task()
@@ -1626,19 +3437,28 @@ async def run_pump_for_duration(pump_id, duration_ms):
         force_screen_update = True
     else:
         safe_force_screen_update()
-    log_message(f"P{pump_id} ON for {duration_ms}ms")
+    log_at(LOG_INFO, "P%s ON for %sms", pump_id, duration_ms)
     publish_pump_status(pump_id)
 
+    started_ms = None
+    result = DOSE_RESULT_DONE
     try:
         pump_on(pump_id)
+        started_ms = time.ticks_ms()
+        pump_deadline_ms[pump_id] = time.ticks_add(started_ms, duration_ms)
         await asyncio.sleep_ms(duration_ms)
-        log_message(f"P{pump_id} OFF after {duration_ms}ms schedule")
+        log_at(LOG_INFO, "P%s OFF after %sms schedule", pump_id, duration_ms)
     except asyncio.CancelledError:
-        log_message(f"P{pump_id} scheduled run cancelled.")
+        result = DOSE_RESULT_CANCELLED
+        log_at(LOG_INFO, "P%s scheduled run cancelled.", pump_id)
     except Exception as e:
-        log_message(f"P{pump_id} error during scheduled run: {e}")
+        result = DOSE_RESULT_ERROR
+        log_at(LOG_INFO, "P%s error during scheduled run: %s", pump_id, e)
     finally:
         pump_off(pump_id)
+        actual_ms = time.ticks_diff(time.ticks_ms(), started_ms) if started_ms is not None else 0
+        pump_deadline_ms[pump_id] = None
+        record_dose_event(pump_id, duration_ms, actual_ms, result, source)
         if pump_tasks.get(pump_id) == task:
             pump_tasks[pump_id] = None
         # 수동 제어 모드에서는 화면 업데이트, 캘리브레이션 모드에서는 보호
@@ -1647,7 +3467,261 @@ async def run_pump_for_duration(pump_id, duration_ms):
         else:
             safe_force_screen_update()
         publish_pump_status(pump_id)
-        gc.collect()
+        gc_request()
+
+# --- 투여 큐 ---
+# 수동(MQTT ON/RUN) > 스케줄 > 누락 보충 순으로 우선하고, 같은 우선순위는 들어온 순서대로 실행한다.
+# 펌프별 dose_worker_task 가 앞의 투여가 끝나는 즉시 다음 투여를 시작한다.
+DOSE_PRIO_MANUAL = const(0)
+DOSE_PRIO_SCHEDULED = const(1)
+DOSE_PRIO_CATCH_UP = const(2)
+DOSE_QUEUE_BUSY_POLL_MS = 200   # 다른 작업이 펌프를 쓰는 동안 재확인 주기 (ms)
+dose_queues = {1: [], 2: []}    # 펌프별 [(우선순위, duration_ms, 출처), ...] - 실행 순서대로 정렬
+dose_queue_events = {1: asyncio.Event(), 2: asyncio.Event()}
+
+def dose_queued_ms(pump_id):
+    """대기 중인 투여의 총 동작 시간 (ms)"""
+    total = 0
+    for entry in dose_queues[pump_id]:
+        total += entry[1]
+    return total
+
+def dose_enqueue(pump_id, duration_ms, priority, source):
+    """투여를 펌프 대기열에 추가 (건수/총량 상한을 넘으면 False)"""
+    queue = dose_queues[pump_id]
+    if len(queue) >= DOSE_QUEUE_MAX_DEPTH:
+        log_at(LOG_WARNING, "QUEUE: P%s %s %sms 거부 (대기 %s건, 최대 %s)", pump_id, source, duration_ms, len(queue), DOSE_QUEUE_MAX_DEPTH)
+        return False
+    # 총량 상한은 밀려 있는 양에만 적용 (빈 큐에 들어오는 한 건은 크기와 관계없이 허용)
+    if queue and dose_queued_ms(pump_id) + duration_ms > DOSE_QUEUE_MAX_ML * pump_ml_ms.get(pump_id, 1000):
+        log_at(LOG_WARNING, "QUEUE: P%s %s %sms 거부 (대기 총량 %sml 초과)", pump_id, source, duration_ms, DOSE_QUEUE_MAX_ML)
+        return False
+    i = len(queue)
+    while i > 0 and queue[i - 1][0] > priority:
+        i -= 1
+    queue.insert(i, (priority, duration_ms, source))
+    dose_queue_events[pump_id].set()
+    publish_dose_queue_status()
+    return True
+
+def dose_queue_clear(pump_id):
+    """대기 중인 투여 모두 취소 (실행 중인 투여는 그대로)"""
+    if dose_queues[pump_id]:
+        log_at(LOG_INFO, "QUEUE: P%s 대기 %s건 취소", pump_id, len(dose_queues[pump_id]))
+        dose_queues[pump_id] = []
+        publish_dose_queue_status()
+
+def publish_dose_queue_status():
+    """펌프별 대기열 상태 발행 {"1": [건수, 총 ms], "2": [...]}"""
+    q1, q2 = dose_queues[1], dose_queues[2]
+    payload = f'{{"1": [{len(q1)}, {dose_queued_ms(1)}], "2": [{len(q2)}, {dose_queued_ms(2)}]}}'
+    publish_status(MQTT_DOSE_QUEUE_STATUS_TOPIC, payload, retain=True)
+
+async def dose_worker_task(pump_id):
+    """펌프 대기열의 투여를 순서대로 이어서 실행"""
+    event = dose_queue_events[pump_id]
+    while True:
+        try:
+            if not dose_queues[pump_id]:
+                event.clear()
+                await event.wait()
+                continue
+            # 캘리브레이션 등 다른 작업이 펌프를 쓰는 중이면 끝날 때까지 대기
+            while pump_tasks.get(pump_id) is not None:
+                await asyncio.sleep_ms(DOSE_QUEUE_BUSY_POLL_MS)
+            queue = dose_queues[pump_id]
+            if not queue:
+                continue
+            _, duration_ms, source = queue.pop(0)
+            publish_dose_queue_status()
+            # 이 태스크가 pump_tasks 에 등록되므로 OFF/수동 조작의 cancel() 은 현재 투여만 멈춘다
+            await run_pump_for_duration(pump_id, duration_ms, source)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            log_at(LOG_INFO, "P%s 투여 큐 태스크 오류: %s", pump_id, e)
+            await asyncio.sleep(1)
+
+# --- 투여 이벤트 ---
+# 끝난 투여마다 (일련번호, 펌프, 결과, 계획 ms, 실제 ms, 종료 시각) 레코드를 dose_events.bin 끝에 덧붙이고,
+# dose_event_sender_task 가 sta/dose 로 QoS 1 발행한다. PUBACK 을 받은 이벤트는 RAM 에서 지우고,
+# 파일은 schedule_ledger_writer_task 가 나중에 미확인 이벤트만 남기도록 다시 쓴다.
+# Wi-Fi/브로커가 끊긴 동안의 이벤트도 재연결 후 순서대로 전송된다 (최대 DOSE_EVENT_MAX_PENDING 건).
+# 재부팅 직전에 확인된 이벤트가 파일에 남아 있으면 다시 전송될 수 있으므로 소비자는 seq 로 중복을 거른다.
+# 파일: 헤더(다음 일련번호 "<I") + 레코드 DOSE_EVENT_FMT 반복
+DOSE_EVENT_FMT = "<IBBBIII"             # seq, pump, result, source, planned_ms, actual_ms, 종료 time.time()
+DOSE_EVENT_RECORD_SIZE = const(19)
+DOSE_RESULT_DONE = const(0)
+DOSE_RESULT_CANCELLED = const(1)
+DOSE_RESULT_ERROR = const(2)
+DOSE_RESULT_NAMES = ("done", "cancelled", "error")
+DOSE_SOURCE_NAMES = ("other", "mqtt", "sched", "catchup")   # 투여 큐 출처 -> 인덱스로 저장
+
+dose_event_pending = []                 # PUBACK 을 받지 못한 이벤트 레코드 (bytes, 오래된 순)
+dose_event_next_seq = 1
+dose_event_inflight = {}                # 패킷 ID -> seq
+dose_event_signal = asyncio.Event()
+dose_events_dropped = 0                 # 보관 상한 초과로 버린 이벤트 수
+dose_event_last = None                  # 마지막 투여 [seq, 펌프, 실제 ms, 종료 time.time()] (상태 프레임)
+_dose_event_file_records = 0            # 파일에 있는 레코드 수 (확인된 것 포함)
+_dose_event_dirty = False               # 확인된 이벤트가 파일에 남아 있음
+_dose_event_dirty_since = 0
+_dose_event_sent_ms = 0                 # 마지막 QoS 1 전송 시각 (ticks_ms)
+
+def load_dose_events():
+    """미확인 투여 이벤트와 다음 일련번호 로드 (부팅 시 1회)"""
+    global dose_event_next_seq, _dose_event_file_records
+    recover_replaced_file(DOSE_EVENT_FILENAME)
+    try:
+        with open(DOSE_EVENT_FILENAME, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return
+    if len(data) < 4:
+        return
+    next_seq = struct.unpack_from("<I", data)[0]
+    count = (len(data) - 4) // DOSE_EVENT_RECORD_SIZE
+    pending = []
+    for n in range(count):
+        o = 4 + n * DOSE_EVENT_RECORD_SIZE
+        pending.append(data[o:o + DOSE_EVENT_RECORD_SIZE])
+    if pending:
+        next_seq = max(next_seq, struct.unpack_from("<I", pending[-1])[0] + 1)
+    dose_event_pending[:] = pending[-DOSE_EVENT_MAX_PENDING:]
+    dose_event_next_seq = next_seq
+    _dose_event_file_records = count
+    if (len(data) - 4) % DOSE_EVENT_RECORD_SIZE:
+        # 기록 중 전원이 꺼진 경우: 잘린 레코드를 없애야 다음 추가 기록이 레코드 경계에 맞는다
+        save_dose_events()
+    log_message(f"투여 이벤트 미확인 {len(dose_event_pending)}건 로드 (다음 seq {dose_event_next_seq})", publish_mqtt=False)
+
+def save_dose_events():
+    """파일을 미확인 이벤트만으로 다시 씀 (임시 파일에 쓴 뒤 rename 으로 교체, 성공하면 True)"""
+    global _dose_event_file_records, _dose_event_dirty
+    try:
+        tmp_path = DOSE_EVENT_FILENAME + ".tmp"
+        with SECTION_FLASH_DOSE_EVENTS:
+            with open(tmp_path, 'wb') as f:
+                f.write(struct.pack("<I", dose_event_next_seq))
+                for rec in dose_event_pending:
+                    f.write(rec)
+            replace_file(tmp_path, DOSE_EVENT_FILENAME)
+        _dose_event_file_records = len(dose_event_pending)
+        _dose_event_dirty = False
+        return True
+    except Exception as e:
+        log_message(f"투여 이벤트 저장 실패: {e}")
+        return False
+
+def flush_dose_events():
+    """확인된 이벤트가 파일에 남아 있으면 정리 (재부팅 전 등)"""
+    if _dose_event_dirty:
+        save_dose_events()
+
+def flush_dose_events_if_idle():
+    """PUBACK 으로 확인된 이벤트를 LEDGER_FLUSH_DELAY_MS 만큼 모았다가 파일에서 정리"""
+    global _dose_event_dirty_since
+    if _dose_event_dirty and time.ticks_diff(time.ticks_ms(), _dose_event_dirty_since) >= LEDGER_FLUSH_DELAY_MS:
+        if not save_dose_events():
+            _dose_event_dirty_since = time.ticks_ms()
+
+def record_dose_event(pump_id, planned_ms, actual_ms, result, source=None):
+    """끝난 투여를 일련번호 이벤트로 기록 (파일에 덧붙이고 전송 태스크를 깨움)"""
+    global dose_event_next_seq, dose_events_dropped, _dose_event_file_records, dose_event_last
+    try:
+        src = DOSE_SOURCE_NAMES.index(source) if source in DOSE_SOURCE_NAMES else 0
+        end_secs = time.time()
+        rec = struct.pack(DOSE_EVENT_FMT, dose_event_next_seq, pump_id, result, src,
+                          planned_ms, max(0, actual_ms), end_secs)
+        dose_event_last = [dose_event_next_seq, pump_id, max(0, actual_ms), end_secs]
+        dose_event_next_seq += 1
+        dose_event_pending.append(rec)
+        if len(dose_event_pending) > DOSE_EVENT_MAX_PENDING:
+            dose_event_pending.pop(0)
+            dose_events_dropped += 1
+            log_message(f"투여 이벤트 보관 한도 초과: 가장 오래된 이벤트 버림 (누적 {dose_events_dropped})", level="WARNING")
+        if _dose_event_file_records >= 2 * DOSE_EVENT_MAX_PENDING:
+            save_dose_events()      # 확인된 레코드가 쌓인 파일을 미확인분만으로 줄임
+        else:
+            with SECTION_FLASH_DOSE_EVENTS:
+                if _dose_event_file_records or _dose_event_dirty:
+                    with open(DOSE_EVENT_FILENAME, 'ab') as f:
+                        f.write(rec)
+                    _dose_event_file_records += 1
+                else:
+                    save_dose_events()
+    except Exception as e:
+        log_message(f"투여 이벤트 기록 실패: {e}")
+    dose_event_signal.set()
+
+def dose_event_payload(rec):
+    """이벤트 레코드 -> JSON 문자열"""
+    seq, pump_id, result, src, planned_ms, actual_ms, end_secs = struct.unpack(DOSE_EVENT_FMT, rec)
+    end = None
+    if end_secs >= 757382400:   # 시간 동기화 후 기록된 이벤트만 시각 표시 (2024-01-01 이후)
+        t = time.localtime(end_secs + TIMEZONE_OFFSET)
+        end = "{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}".format(t[0], t[1], t[2], t[3], t[4], t[5])
+    return ujson.dumps({'seq': seq, 'pump': pump_id, 'planned_ms': planned_ms, 'actual_ms': actual_ms,
+                        'result': DOSE_RESULT_NAMES[result] if result < len(DOSE_RESULT_NAMES) else result,
+                        'source': DOSE_SOURCE_NAMES[src] if src < len(DOSE_SOURCE_NAMES) else src,
+                        'end': end})
+
+def dose_event_on_puback(pid):
+    """PUBACK 수신: 해당 이벤트를 미확인 목록에서 삭제 (파일 정리는 지연)"""
+    global _dose_event_dirty, _dose_event_dirty_since
+    seq = dose_event_inflight.pop(pid, None)
+    if seq is None:
+        return
+    for i in range(len(dose_event_pending)):
+        if struct.unpack_from("<I", dose_event_pending[i])[0] == seq:
+            dose_event_pending.pop(i)
+            if not _dose_event_dirty:
+                _dose_event_dirty = True
+                _dose_event_dirty_since = time.ticks_ms()
+            break
+    dose_event_signal.set()
+
+def dose_event_reset_inflight():
+    """새 연결: PUBACK 을 기다리던 이벤트를 다시 보낼 대상으로 되돌림"""
+    dose_event_inflight.clear()
+    dose_event_signal.set()
+
+async def dose_event_sender_task():
+    """미확인 투여 이벤트를 QoS 1 로 전송 (동시 DOSE_EVENT_INFLIGHT_MAX 건, PUBACK 이 오면 다음 이벤트)"""
+    global _dose_event_sent_ms
+    while True:
+        try:
+            if dose_event_inflight:
+                try:
+                    await asyncio.wait_for_ms(dose_event_signal.wait(), DOSE_EVENT_ACK_TIMEOUT_MS)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await dose_event_signal.wait()
+            dose_event_signal.clear()
+            if dose_event_inflight and \
+               time.ticks_diff(time.ticks_ms(), _dose_event_sent_ms) >= DOSE_EVENT_ACK_TIMEOUT_MS:
+                log_message(f"투여 이벤트 PUBACK 없음: {len(dose_event_inflight)}건 다시 전송", level="WARNING")
+                dose_event_inflight.clear()
+            client = mqtt_client
+            if not (mqtt_connected and client and client.is_connected()):
+                continue
+            sending = list(dose_event_inflight.values())
+            for rec in dose_event_pending:
+                if len(dose_event_inflight) >= DOSE_EVENT_INFLIGHT_MAX:
+                    break
+                seq = struct.unpack_from("<I", rec)[0]
+                if seq in sending:
+                    continue
+                pid = client.publish(MQTT_DOSE_EVENT_TOPIC, dose_event_payload(rec), qos=1)
+                dose_event_inflight[pid] = seq
+                _dose_event_sent_ms = time.ticks_ms()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log_message(f"투여 이벤트 전송 오류: {e}", False)
+            await asyncio.sleep(1)
+            dose_event_signal.set()
 
 def get_local_time():
     """현재 로컬 시간 튜플 반환 (시간 동기화 안됐으면 2000년 반환)"""
@@ -1655,18 +3729,21 @@ def get_local_time():
     
     try:
         current_utc_secs = time.time()
-        log_message(f"DEBUG: get_local_time() read time.time() = {current_utc_secs}", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("get_local_time() read time.time() = %s", current_utc_secs)
         
         if current_utc_secs < SECONDS_SINCE_2000_TO_2024:
-            log_message(f"DEBUG: current_utc_secs ({current_utc_secs}) is < {SECONDS_SINCE_2000_TO_2024}. Returning default time.", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("current_utc_secs (%s) is < %s. Returning default time.", current_utc_secs, SECONDS_SINCE_2000_TO_2024)
             return (2000, 1, 1, 0, 0, 0, 0, 1)
         
-        log_message(f"DEBUG: current_utc_secs ({current_utc_secs}) is >= {SECONDS_SINCE_2000_TO_2024}. Calculating local time.", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("current_utc_secs (%s) is >= %s. Calculating local time.", current_utc_secs, SECONDS_SINCE_2000_TO_2024)
         local_secs = current_utc_secs + TIMEZONE_OFFSET
         return time.localtime(local_secs)
         
     except Exception as e:
-        log_message(f"로컬 시간 변환 오류: {e}", False)
+        log_at(LOG_INFO, "로컬 시간 변환 오류: %s", e, publish_mqtt=False)
         return (2000, 1, 1, 0, 0, 0, 0, 1)
 
 # --- UI 디스플레이 함수들 ---
@@ -1743,41 +3820,11 @@ def display_main_screen():
     next_sched_str = "Next: --:--"
     if now[0] > 2000:
         try:
-            now_minutes_day = now[3] * 60 + now[4]
-            next_sched_info = None
-            min_diff_future = float('inf')
-            first_sched_tomorrow_info = None
-            first_sched_tomorrow_minutes = float('inf')
-
-            all_schedules_flat = []
-            for p, sl in schedules.items():
-                for schedule_item in sl:
-                    # 새로운 4개 요소 형식과 기존 3개 요소 형식 모두 지원
-                    if len(schedule_item) >= 2:
-                        h, m = schedule_item[0], schedule_item[1]
-                        sched_minutes = h * 60 + m
-                        info = f"P{p} {h:02d}:{m:02d}"
-                        all_schedules_flat.append((sched_minutes, info))
-
-            if all_schedules_flat:
-                all_schedules_flat.sort(key=lambda x: x[0])
-                for sched_minutes, info in all_schedules_flat:
-                    if sched_minutes > now_minutes_day:
-                        diff = sched_minutes - now_minutes_day
-                        if diff < min_diff_future:
-                            min_diff_future = diff
-                            next_sched_info = info
-                    if sched_minutes < first_sched_tomorrow_minutes:
-                        first_sched_tomorrow_minutes = sched_minutes
-                        first_sched_tomorrow_info = info
-
-                if next_sched_info is None and first_sched_tomorrow_info is not None:
-                    next_sched_info = first_sched_tomorrow_info
-
+            next_sched_info = next_schedule_label(now[3] * 60 + now[4])
             if next_sched_info:
                 next_sched_str = f"Next: {next_sched_info}"
         except Exception as e:
-            log_message(f"다음 스케줄 계산 오류: {e}")
+            log_at(LOG_INFO, "다음 스케줄 계산 오류: %s", e)
 
     if next_sched_str != last_next_schedule or force_screen_update:
         oled.fill_rect(0, 42, SCREEN_WIDTH, 8, 0)
@@ -1797,10 +3844,12 @@ def display_main_screen():
 def display_select_pump_screen():
     global force_screen_update
     if not oled: 
-        log_message("DEBUG: OLED not available in display_select_pump_screen", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("OLED not available in display_select_pump_screen")
         return
     
-    log_message("DEBUG: Displaying SELECT_PUMP screen", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("Displaying SELECT_PUMP screen")
     oled.fill(0)
     oled.text("Select Pump", (SCREEN_WIDTH - 11*8)//2, 0)
 
@@ -1816,7 +3865,8 @@ def display_select_pump_screen():
     oled.text("UP/DN, SEL, BCK", 0, 55)
     oled.show()
     force_screen_update = False
-    log_message("DEBUG: SELECT_PUMP screen displayed and oled.show() called", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("SELECT_PUMP screen displayed and oled.show() called")
 
 def display_view_schedule_screen():
     global force_screen_update, schedule_cursor
@@ -1858,6 +3908,8 @@ def display_view_schedule_screen():
                     schedule_str = "{:02d}:{:02d} ({}s)".format(h, m, dur_s)
                 else:
                     schedule_str = "{:02d}:{:02d} ({}s/{}d)".format(h, m, dur_s, interval_days)
+                if pump_schedules.recurrence(display_idx) != (0, 0, SCHED_NO_ANCHOR):
+                    schedule_str += "*"  # 요일/날짜/기준일 규칙 있음
                 prefix = ">" if display_idx == schedule_cursor else " "
                 oled.text(prefix + schedule_str, 5, 15 + i * 10)
 
@@ -1871,8 +3923,9 @@ def display_view_schedule_screen():
     force_screen_update = True
 
 def display_add_edit_schedule_screen():
-    log_message("DEBUG: display_add_edit_schedule_screen() called", False)
-    log_message(f"DEBUG: Current values - hour:{edit_hour}, minute:{edit_minute}, duration:{edit_duration_sec}, interval:{edit_interval_days}, cursor_pos:{edit_cursor_pos}", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("display_add_edit_schedule_screen() called")
+        log_debug("Current values - hour:%s, minute:%s, duration:%s, interval:%s, cursor_pos:%s", edit_hour, edit_minute, edit_duration_sec, edit_interval_days, edit_cursor_pos)
     if not oled: return
 
     oled.fill(0)
@@ -1882,7 +3935,8 @@ def display_add_edit_schedule_screen():
     time_str = "{:02d}:{:02d}".format(edit_hour, edit_minute)
     duration_str = f"Dur:{edit_duration_sec: >3}s"
     interval_str = f"Int:{edit_interval_days: >3}d"
-    log_message(f"DEBUG: Display strings - time:{time_str}, duration:{duration_str}, interval:{interval_str}", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("Display strings - time:%s, duration:%s, interval:%s", time_str, duration_str, interval_str)
     oled.text(time_str, 20, 15)
     oled.text(duration_str, 20, 25)
     oled.text(interval_str, 20, 35)
@@ -1909,7 +3963,8 @@ def display_add_edit_schedule_screen():
         num_start_x = 20 + len("Int:") * char_width
         cursor_x = num_start_x + (len(num_str) * char_width // 2)
         cursor_y = 35 + cursor_y_offset
-        log_message(f"DEBUG: Cursor position 3 - cursor_x:{cursor_x}, cursor_y:{cursor_y}, num_str:{num_str}", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("Cursor position 3 - cursor_x:%s, cursor_y:%s, num_str:%s", cursor_x, cursor_y, num_str)
     
     oled.text(cursor_char, cursor_x - (len(cursor_char)*char_width//2), cursor_y)
 
@@ -1917,16 +3972,19 @@ def display_add_edit_schedule_screen():
     oled.text("SEL Save, BCK Cancel", 0, 58)
 
     oled.show()
-    log_message("DEBUG: oled.show() called - screen should be updated now", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("oled.show() called - screen should be updated now")
     force_screen_update = True
 
 def display_manual_control_screen():
     global force_screen_update, manual_selected_pump, manual_pump_states, pump_tasks
     if not oled: 
-        log_message("DEBUG: OLED not available in display_manual_control_screen", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("OLED not available in display_manual_control_screen")
         return
 
-    log_message("DEBUG: Displaying MANUAL_CONTROL screen", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("Displaying MANUAL_CONTROL screen")
     oled.fill(0)
     oled.text("Manual Control", (SCREEN_WIDTH - 14*8)//2, 0)
 
@@ -1956,16 +4014,19 @@ def display_manual_control_screen():
     oled.text("U/D Sel, SEL Tog, L Exit", 0, 55)
     oled.show()
     force_screen_update = False
-    log_message("DEBUG: MANUAL_CONTROL screen displayed and oled.show() called", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("MANUAL_CONTROL screen displayed and oled.show() called")
 
 def display_pump_menu_screen():
     """펌프 메뉴 화면 (Schedule/Calibration 선택)"""
     global force_screen_update, pump_menu_cursor, selected_pump
     if not oled: 
-        log_message("DEBUG: OLED not available in display_pump_menu_screen", False)
+        if DEBUG_LOG_BUILD:
+            log_debug("OLED not available in display_pump_menu_screen")
         return
 
-    log_message("DEBUG: Displaying PUMP_MENU screen", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("Displaying PUMP_MENU screen")
     oled.fill(0)
     oled.text(f"Pump {selected_pump} Menu", (SCREEN_WIDTH - 12*8)//2, 0)
     
@@ -1983,7 +4044,8 @@ def display_pump_menu_screen():
     oled.text("U/D Sel, SEL OK, L Back", 0, 55)
     oled.show()
     force_screen_update = False
-    log_message("DEBUG: PUMP_MENU screen displayed and oled.show() called", False)
+    if DEBUG_LOG_BUILD:
+        log_debug("PUMP_MENU screen displayed and oled.show() called")
 
 def display_calibrate_pump_screen():
     """펌프 캘리브레이션 화면"""
@@ -2073,7 +4135,8 @@ def button_thread_func():
                 '_debounce_start_time': 0
             }
             
-            log_message(f"DEBUG: Button {name} thread init - readings={readings}, stable_state={stable_state}, pressed={initial_pressed}", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Button %s thread init - readings=%s, stable_state=%s, pressed=%s", name, readings, stable_state, initial_pressed)
     
     # 메인 폴링 루프
     consecutive_errors = 0
@@ -2091,8 +4154,8 @@ def button_thread_func():
                     confirmed_state = state_info['_confirmed_state']
 
                     # SELECT 버튼 특별 디버깅
-                    if name == 'SELECT' and is_physically_pressed != confirmed_state:
-                        log_message(f"DEBUG: SELECT button state change detected - Physical: {is_physically_pressed}, Confirmed: {confirmed_state}", False)
+                    if DEBUG_LOG_BUILD and name == 'SELECT' and is_physically_pressed != confirmed_state:
+                        log_debug("SELECT button state change detected - Physical: %s, Confirmed: %s", is_physically_pressed, confirmed_state)
 
                     if is_physically_pressed != confirmed_state:
                         if state_info['_debounce_start_time'] == 0:
@@ -2110,13 +4173,16 @@ def button_thread_func():
 
                                 # 버튼이 눌렸을 때만 이벤트 발생 (릴리즈는 무시)
                                 if recheck_pressed:
-                                    log_message(f"DEBUG: Button {name} PRESS confirmed (pin={recheck_value})", False)
+                                    if DEBUG_LOG_BUILD:
+                                        log_debug("Button %s PRESS confirmed (pin=%s)", name, recheck_value)
                                     with button_lock:
                                         button_events[name] = True
                                         if name == 'SELECT':
-                                            log_message(f"DEBUG: SELECT button event set to True - current button_events: {button_events}", False)
+                                            if DEBUG_LOG_BUILD:
+                                                log_debug("SELECT button event set to True - current button_events: %s", button_events)
                                 else:
-                                    log_message(f"DEBUG: Button {name} RELEASE (pin={recheck_value})", False)
+                                    if DEBUG_LOG_BUILD:
+                                        log_debug("Button %s RELEASE (pin=%s)", name, recheck_value)
 
                             state_info['_debounce_start_time'] = 0
                     else:
@@ -2124,7 +4190,7 @@ def button_thread_func():
                         state_info['_debounce_start_time'] = 0
                         
                 except Exception as pin_error:
-                    log_message(f"Pin {name} read error: {pin_error}", False)
+                    log_at(LOG_INFO, "Pin %s read error: %s", name, pin_error, publish_mqtt=False)
                     continue
 
             consecutive_errors = 0  # 성공적으로 완료되면 에러 카운터 리셋
@@ -2132,7 +4198,7 @@ def button_thread_func():
 
         except Exception as e:
             consecutive_errors += 1
-            log_message(f"버튼 스레드 오류 #{consecutive_errors}: {e}", False)
+            log_at(LOG_INFO, "버튼 스레드 오류 #%s: %s", consecutive_errors, e, publish_mqtt=False)
             
             if consecutive_errors > 10:
                 log_message("버튼 스레드 오류가 너무 많아 긴 대기합니다.", False)
@@ -2151,11 +4217,8 @@ def check_button_event(name):
         if button_events[name]:
             pressed = True
             button_events[name] = False
-            # SELECT 버튼 특별 디버깅
-            if name == 'SELECT':
-                log_message(f"DEBUG: SELECT button event consumed - returning True", False)
-            else:
-                log_message(f"DEBUG: Button event consumed - {name}", False)
+            if DEBUG_LOG_BUILD:
+                log_debug("Button event consumed - %s", name)
     
     return pressed
 
@@ -2173,13 +4236,14 @@ async def handle_buttons_async():
     last_debug_time = 0  # 디버깅용 시간 추적
 
     while True:
+        t_iter = time.ticks_us()
         current_time = time.ticks_ms()
         
         # 5초마다 버튼 상태 디버깅 출력
-        if time.ticks_diff(current_time, last_debug_time) > 5000:
+        if DEBUG_LOG_BUILD and time.ticks_diff(current_time, last_debug_time) > 5000:
             with button_lock:
                 button_status = {name: button_events[name] for name in button_events}
-            log_message(f"DEBUG: Periodic check - Screen: {current_screen}, Button events: {button_status}", False)
+            log_debug("Periodic check - Screen: %s, Button events: %s", current_screen, button_status)
             last_debug_time = current_time
         
         # 캘리브레이션 모드에서는 자동 메인화면 전환 방지
@@ -2196,7 +4260,9 @@ async def handle_buttons_async():
             current_screen = "MAIN"
             force_screen_update = True
             last_action_time = current_time
+            t_sleep = perf_iter_done(PERF_TASK_BUTTONS, t_iter)
             await asyncio.sleep_ms(1)
+            perf_wake(PERF_TASK_BUTTONS, t_sleep, 1)
             continue
 
         up = check_button_event('UP')
@@ -2209,9 +4275,9 @@ async def handle_buttons_async():
         action_taken = False
 
         # 디버깅: 버튼 이벤트 발생 시에만 로그 출력
-        if up or down or left or right or select or back:
-            log_message(f"DEBUG: Button events detected - UP:{up} DOWN:{down} LEFT:{left} RIGHT:{right} SEL:{select} BACK:{back}", False)
-            log_message(f"DEBUG: Current screen: {current_screen}", False)
+        if DEBUG_LOG_BUILD and (up or down or left or right or select or back):
+            log_debug("Button events detected - UP:%s DOWN:%s LEFT:%s RIGHT:%s SEL:%s BACK:%s", up, down, left, right, select, back)
+            log_debug("Current screen: %s", current_screen)
 
         if current_screen == "MAIN":
             if select:
@@ -2220,53 +4286,61 @@ async def handle_buttons_async():
                 selected_pump = 1
                 force_screen_update = True
                 action_taken = True
-                log_message(f"DEBUG: Screen changed to {current_screen}, force_update={force_screen_update}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("Screen changed to %s, force_update=%s", current_screen, force_screen_update)
                 # 즉시 화면 업데이트
                 if oled:
                     display_select_pump_screen()
-                    log_message("DEBUG: Immediate screen update called", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate screen update called")
             elif right:
                 log_message("UI: RIGHT pressed - Entering MANUAL_CONTROL screen", False)
                 current_screen = "MANUAL_CONTROL"
                 manual_selected_pump = 1
                 force_screen_update = True
                 action_taken = True
-                log_message(f"DEBUG: Screen changed to {current_screen}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("Screen changed to %s", current_screen)
                 # 즉시 화면 업데이트
                 if oled:
                     display_manual_control_screen()
-                    log_message("DEBUG: Immediate screen update called", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate screen update called")
 
         elif current_screen == "SELECT_PUMP":
             if up or down:
                 selected_pump = 1 if selected_pump == 2 else 2
-                log_message(f"UI: Selected Pump {selected_pump}", False)
+                log_at(LOG_INFO, "UI: Selected Pump %s", selected_pump, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_select_pump_screen()
             elif select:
-                log_message(f"UI: Entering PUMP_MENU for P{selected_pump}", False)
+                log_at(LOG_INFO, "UI: Entering PUMP_MENU for P%s", selected_pump, publish_mqtt=False)
                 current_screen = "PUMP_MENU"
                 pump_menu_cursor = 0
                 force_screen_update = True
                 action_taken = True
-                log_message(f"DEBUG: Screen changed to {current_screen}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("Screen changed to %s", current_screen)
                 # 즉시 화면 업데이트
                 if oled:
                     display_pump_menu_screen()
-                    log_message("DEBUG: Immediate PUMP_MENU screen update called", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate PUMP_MENU screen update called")
             elif back or left:
                 log_message("UI: Returning to MAIN screen from SELECT_PUMP", False)
                 current_screen = "MAIN"
                 force_screen_update = True
                 action_taken = True
-                log_message(f"DEBUG: Screen changed to {current_screen}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("Screen changed to %s", current_screen)
                 # 즉시 화면 업데이트
                 if oled:
                     display_main_screen()
-                    log_message("DEBUG: Immediate MAIN screen update called", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate MAIN screen update called")
 
         elif current_screen == "VIEW_SCHEDULE":
             pump_schedules = schedules.get(selected_pump, [])
@@ -2275,13 +4349,13 @@ async def handle_buttons_async():
             if up:
                 if num_schedules > 0:
                     schedule_cursor = max(0, schedule_cursor - 1)
-                    log_message(f"UI: Schedule cursor moved up to {schedule_cursor}", False)
+                    log_at(LOG_INFO, "UI: Schedule cursor moved up to %s", schedule_cursor, publish_mqtt=False)
                     force_screen_update = True
                     action_taken = True
             elif down:
                 if num_schedules > 0:
                     schedule_cursor = min(num_schedules - 1, schedule_cursor + 1)
-                    log_message(f"UI: Schedule cursor moved down to {schedule_cursor}", False)
+                    log_at(LOG_INFO, "UI: Schedule cursor moved down to %s", schedule_cursor, publish_mqtt=False)
                     force_screen_update = True
                     action_taken = True
             elif right:
@@ -2305,9 +4379,9 @@ async def handle_buttons_async():
                 if back:  # SELECT + BACK = 삭제
                     if num_schedules > 0 and 0 <= schedule_cursor < num_schedules:
                         schedule_to_delete = pump_schedules[schedule_cursor]
-                        pump_schedules.remove(schedule_to_delete)
-                        log_message(f"UI: 스케줄 삭제됨 - P{selected_pump}: {schedule_to_delete}")
-                        save_schedules()
+                        pump_schedules.delete(schedule_to_delete[0], schedule_to_delete[1])
+                        log_at(LOG_INFO, "UI: 스케줄 삭제됨 - P%s: %s", selected_pump, schedule_to_delete)
+                        journal_schedule_change(SCHED_JOURNAL_OP_DELETE, selected_pump, schedule_to_delete[0], schedule_to_delete[1])
                         schedule_cursor = max(0, min(schedule_cursor, len(pump_schedules) - 1))
                         force_screen_update = True
                         action_taken = True
@@ -2323,7 +4397,7 @@ async def handle_buttons_async():
                         edit_duration_sec = dur_ms // 1000
                         edit_cursor_pos = 0
                         editing_schedule_original = schedule_to_edit
-                        log_message(f"UI: Editing schedule - P{selected_pump}: {schedule_to_edit}")
+                        log_at(LOG_INFO, "UI: Editing schedule - P%s: %s", selected_pump, schedule_to_edit)
                         current_screen = "ADD_SCHEDULE"
                         force_screen_update = True
                         action_taken = True
@@ -2335,7 +4409,8 @@ async def handle_buttons_async():
 
         elif current_screen == "ADD_SCHEDULE":
             if up:
-                log_message(f"DEBUG: UP button in ADD_SCHEDULE, edit_cursor_pos={edit_cursor_pos}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("UP button in ADD_SCHEDULE, edit_cursor_pos=%s", edit_cursor_pos)
                 if edit_cursor_pos == 0:  # hour
                     edit_hour = (edit_hour + 1) % 24
                 elif edit_cursor_pos == 1:  # minute
@@ -2345,16 +4420,19 @@ async def handle_buttons_async():
                 elif edit_cursor_pos == 3:  # interval_days
                     old_value = edit_interval_days
                     edit_interval_days = min(30, edit_interval_days + 1)  # 최대 30일
-                    log_message(f"DEBUG: Interval days UP: {old_value} -> {edit_interval_days}", False)
-                log_message(f"UI: Edit value increased - {edit_hour:02d}:{edit_minute:02d} {edit_duration_sec}s {edit_interval_days}d", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Interval days UP: %s -> %s", old_value, edit_interval_days)
+                log_at(LOG_INFO, "UI: Edit value increased - %02d:%02d %ss %sd", edit_hour, edit_minute, edit_duration_sec, edit_interval_days, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_add_edit_schedule_screen()
-                    log_message("DEBUG: Immediate ADD_SCHEDULE screen update (UP)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate ADD_SCHEDULE screen update (UP)")
             elif down:
-                log_message(f"DEBUG: DOWN button in ADD_SCHEDULE, edit_cursor_pos={edit_cursor_pos}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("DOWN button in ADD_SCHEDULE, edit_cursor_pos=%s", edit_cursor_pos)
                 if edit_cursor_pos == 0:  # hour
                     edit_hour = (edit_hour - 1) % 24
                 elif edit_cursor_pos == 1:  # minute
@@ -2364,60 +4442,62 @@ async def handle_buttons_async():
                 elif edit_cursor_pos == 3:  # interval_days
                     old_value = edit_interval_days
                     edit_interval_days = max(1, edit_interval_days - 1)  # 최소 1일
-                    log_message(f"DEBUG: Interval days DOWN: {old_value} -> {edit_interval_days}", False)
-                log_message(f"UI: Edit value decreased - {edit_hour:02d}:{edit_minute:02d} {edit_duration_sec}s {edit_interval_days}d", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Interval days DOWN: %s -> %s", old_value, edit_interval_days)
+                log_at(LOG_INFO, "UI: Edit value decreased - %02d:%02d %ss %sd", edit_hour, edit_minute, edit_duration_sec, edit_interval_days, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_add_edit_schedule_screen()
-                    log_message("DEBUG: Immediate ADD_SCHEDULE screen update (DOWN)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate ADD_SCHEDULE screen update (DOWN)")
             elif left:
                 edit_cursor_pos = (edit_cursor_pos - 1) % 4  # 4개 필드로 변경
-                log_message(f"UI: Edit cursor moved left to position {edit_cursor_pos}", False)
+                log_at(LOG_INFO, "UI: Edit cursor moved left to position %s", edit_cursor_pos, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_add_edit_schedule_screen()
-                    log_message("DEBUG: Immediate ADD_SCHEDULE screen update (LEFT)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate ADD_SCHEDULE screen update (LEFT)")
             elif right:
                 edit_cursor_pos = (edit_cursor_pos + 1) % 4  # 4개 필드로 변경
-                log_message(f"UI: Edit cursor moved right to position {edit_cursor_pos}", False)
+                log_at(LOG_INFO, "UI: Edit cursor moved right to position %s", edit_cursor_pos, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_add_edit_schedule_screen()
-                    log_message("DEBUG: Immediate ADD_SCHEDULE screen update (RIGHT)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate ADD_SCHEDULE screen update (RIGHT)")
             elif select:  # 저장
                 new_schedule = (edit_hour, edit_minute, edit_duration_sec * 1000, edit_interval_days)
-                pump_schedules = schedules.setdefault(selected_pump, [])
+                pump_schedules = schedules[selected_pump]
                 
-                # 중복 체크 (시간만 체크, 기존 스케줄의 형식에 관계없이)
-                is_duplicate = False
-                for existing_schedule in pump_schedules:
-                    # 기존 스케줄이 3개 요소든 4개 요소든 처음 2개(시간, 분)만 비교
-                    if existing_schedule[0] == edit_hour and existing_schedule[1] == edit_minute:
-                        is_duplicate = True
-                        break
+                # 중복 체크 (시간만 체크)
+                is_duplicate = pump_schedules.find(edit_hour * 60 + edit_minute) >= 0
                 if not is_duplicate:
+                    recurrence = (0, 0, SCHED_NO_ANCHOR)
                     if editing_schedule_original is not None:
-                        # 수정 모드: 기존 스케줄 제거
-                        try:
-                            pump_schedules.remove(editing_schedule_original)
-                            log_message(f"UI: Original schedule removed: {editing_schedule_original}")
-                        except ValueError:
-                            pass
+                        # 수정 모드: 기존 스케줄 제거 (화면에서 편집하지 않는 요일/날짜/기준일 규칙은 유지)
+                        i = pump_schedules.find(editing_schedule_original[0] * 60 + editing_schedule_original[1])
+                        if i >= 0:
+                            recurrence = pump_schedules.recurrence(i)
+                        if pump_schedules.delete(editing_schedule_original[0], editing_schedule_original[1]):
+                            log_at(LOG_INFO, "UI: Original schedule removed: %s", editing_schedule_original)
+                            journal_schedule_change(SCHED_JOURNAL_OP_DELETE, selected_pump,
+                                                    editing_schedule_original[0], editing_schedule_original[1])
                     
-                    pump_schedules.append(new_schedule)
-                    log_message(f"UI: Schedule saved - P{selected_pump}: {new_schedule}")
-                    save_schedules()
+                    pump_schedules.add(edit_hour, edit_minute, edit_duration_sec * 1000, edit_interval_days, *recurrence)
+                    log_at(LOG_INFO, "UI: Schedule saved - P%s: %s", selected_pump, new_schedule)
+                    journal_schedule_change(SCHED_JOURNAL_OP_ADD, selected_pump, edit_hour, edit_minute)
                     current_screen = "VIEW_SCHEDULE"
                     force_screen_update = True
                     action_taken = True
                 else:
-                    log_message(f"UI: Duplicate schedule time - P{selected_pump} {edit_hour:02d}:{edit_minute:02d}")
+                    log_at(LOG_INFO, "UI: Duplicate schedule time - P%s %02d:%02d", selected_pump, edit_hour, edit_minute)
             elif back:  # 취소
                 log_message("UI: ADD_SCHEDULE cancelled", False)
                 current_screen = "VIEW_SCHEDULE"
@@ -2427,33 +4507,34 @@ async def handle_buttons_async():
         elif current_screen == "MANUAL_CONTROL":
             if up or down:
                 manual_selected_pump = 1 if manual_selected_pump == 2 else 2
-                log_message(f"UI: Manual control selection changed to P{manual_selected_pump}", False)
+                log_at(LOG_INFO, "UI: Manual control selection changed to P%s", manual_selected_pump, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_manual_control_screen()
-                    log_message("DEBUG: Immediate MANUAL_CONTROL screen update (UP/DOWN)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate MANUAL_CONTROL screen update (UP/DOWN)")
             elif select:
                 pump_id_to_toggle = manual_selected_pump
-                log_message(f"UI: SELECT pressed - Toggling P{pump_id_to_toggle} manually", False)
+                log_at(LOG_INFO, "UI: SELECT pressed - Toggling P%s manually", pump_id_to_toggle, publish_mqtt=False)
 
                 task = pump_tasks.get(pump_id_to_toggle)
                 if task is not None:
                     try:
                         task.cancel()
-                        log_message(f"UI: Cancelled running scheduled task for P{pump_id_to_toggle}")
+                        log_at(LOG_INFO, "UI: Cancelled running scheduled task for P%s", pump_id_to_toggle)
                     except Exception as e:
-                        log_message(f"UI: Error cancelling task for P{pump_id_to_toggle}: {e}")
+                        log_at(LOG_INFO, "UI: Error cancelling task for P%s: %s", pump_id_to_toggle, e)
 
                 if manual_pump_states.get(pump_id_to_toggle, False):
                     pump_off(pump_id_to_toggle)
                     manual_pump_states[pump_id_to_toggle] = False
-                    log_message(f"UI: P{pump_id_to_toggle} turned OFF manually.")
+                    log_at(LOG_INFO, "UI: P%s turned OFF manually.", pump_id_to_toggle)
                 else:
                     pump_on(pump_id_to_toggle)
                     manual_pump_states[pump_id_to_toggle] = True
-                    log_message(f"UI: P{pump_id_to_toggle} turned ON manually.")
+                    log_at(LOG_INFO, "UI: P%s turned ON manually.", pump_id_to_toggle)
 
                 publish_pump_status(pump_id_to_toggle)
                 force_screen_update = True
@@ -2461,7 +4542,8 @@ async def handle_buttons_async():
                 # 즉시 화면 업데이트
                 if oled:
                     display_manual_control_screen()
-                    log_message("DEBUG: Immediate MANUAL_CONTROL screen update (SELECT)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate MANUAL_CONTROL screen update (SELECT)")
 
             elif back or left:
                 log_message("UI: Exiting MANUAL_CONTROL screen", False)
@@ -2472,7 +4554,7 @@ async def handle_buttons_async():
                         manual_pump_states[pump_id] = False
                         pumps_turned_off_on_exit.append(f"P{pump_id}")
                 if pumps_turned_off_on_exit:
-                    log_message(f"UI: Turned off manually activated pumps on exit: {', '.join(pumps_turned_off_on_exit)}")
+                    log_at(LOG_INFO, "UI: Turned off manually activated pumps on exit: %s", ', '.join(pumps_turned_off_on_exit))
                     for pid_str in pumps_turned_off_on_exit:
                         try:
                             publish_pump_status(int(pid_str[1:]))
@@ -2485,30 +4567,33 @@ async def handle_buttons_async():
                 # 즉시 화면 업데이트
                 if oled:
                     display_main_screen()
-                    log_message("DEBUG: Immediate MAIN screen update (EXIT MANUAL)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate MAIN screen update (EXIT MANUAL)")
 
         elif current_screen == "PUMP_MENU":
             if up:
                 pump_menu_cursor = max(0, pump_menu_cursor - 1)
-                log_message(f"UI: Pump menu cursor moved up to {pump_menu_cursor}", False)
+                log_at(LOG_INFO, "UI: Pump menu cursor moved up to %s", pump_menu_cursor, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_pump_menu_screen()
-                    log_message("DEBUG: Immediate PUMP_MENU screen update (UP)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate PUMP_MENU screen update (UP)")
             elif down:
                 pump_menu_cursor = min(1, pump_menu_cursor + 1)  # 0: Schedule, 1: Calibration
-                log_message(f"UI: Pump menu cursor moved down to {pump_menu_cursor}", False)
+                log_at(LOG_INFO, "UI: Pump menu cursor moved down to %s", pump_menu_cursor, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_pump_menu_screen()
-                    log_message("DEBUG: Immediate PUMP_MENU screen update (DOWN)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate PUMP_MENU screen update (DOWN)")
             elif select:
                 if pump_menu_cursor == 0:  # Schedule
-                    log_message(f"UI: Entering VIEW_SCHEDULE for P{selected_pump}", False)
+                    log_at(LOG_INFO, "UI: Entering VIEW_SCHEDULE for P%s", selected_pump, publish_mqtt=False)
                     current_screen = "VIEW_SCHEDULE"
                     schedule_cursor = 0
                     force_screen_update = True
@@ -2516,9 +4601,10 @@ async def handle_buttons_async():
                     # 즉시 화면 업데이트
                     if oled:
                         display_view_schedule_screen()
-                        log_message("DEBUG: Immediate VIEW_SCHEDULE screen update", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Immediate VIEW_SCHEDULE screen update")
                 elif pump_menu_cursor == 1:  # Calibration
-                    log_message(f"UI: Entering CALIBRATE_PUMP for P{selected_pump}", False)
+                    log_at(LOG_INFO, "UI: Entering CALIBRATE_PUMP for P%s", selected_pump, publish_mqtt=False)
                     current_screen = "CALIBRATE_PUMP"
                     calibrating_pump = selected_pump
                     calibration_stage = 0
@@ -2529,7 +4615,8 @@ async def handle_buttons_async():
                     # 즉시 화면 업데이트
                     if oled:
                         display_calibrate_pump_screen()
-                        log_message("DEBUG: Immediate CALIBRATE_PUMP screen update", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Immediate CALIBRATE_PUMP screen update")
             elif back or left:
                 log_message("UI: Returning to SELECT_PUMP screen from PUMP_MENU", False)
                 current_screen = "SELECT_PUMP"
@@ -2538,32 +4625,37 @@ async def handle_buttons_async():
                 # 즉시 화면 업데이트
                 if oled:
                     display_select_pump_screen()
-                    log_message("DEBUG: Immediate SELECT_PUMP screen update", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate SELECT_PUMP screen update")
 
         elif current_screen == "CALIBRATE_PUMP":
             # SELECT 버튼 디버깅 강화
             if select:
-                log_message(f"DEBUG: SELECT button pressed in CALIBRATE_PUMP screen, calibration_stage={calibration_stage}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("SELECT button pressed in CALIBRATE_PUMP screen, calibration_stage=%s", calibration_stage)
                 if calibration_stage == 0:  # 준비 → 시작 (펌프 즉시 작동!)
-                    log_message(f"UI: Starting calibration for P{calibrating_pump} - PUMP STARTS NOW!", False)
+                    log_at(LOG_INFO, "UI: Starting calibration for P%s - PUMP STARTS NOW!", calibrating_pump, publish_mqtt=False)
                     calibration_stage = 1
                     calibration_start_time = time.ticks_ms()
                     # 50초간 펌프 실행 - 스레드로 실행
-                    log_message(f"DEBUG: About to start calibration thread for pump {calibrating_pump}", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("About to start calibration thread for pump %s", calibrating_pump)
                     try:
                         _thread.start_new_thread(calibration_pump_thread, (calibrating_pump, 50000))
-                        log_message(f"DEBUG: Calibration thread started successfully for pump {calibrating_pump}", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Calibration thread started successfully for pump %s", calibrating_pump)
                     except Exception as e:
-                        log_message(f"ERROR: Failed to start calibration thread: {e}", False)
+                        log_at(LOG_INFO, "ERROR: Failed to start calibration thread: %s", e, publish_mqtt=False)
                         calibration_stage = 0  # 실패 시 다시 준비 상태로
                     force_screen_update = True
                     action_taken = True
                     # 즉시 화면 업데이트
                     if oled:
                         display_calibrate_pump_screen()
-                        log_message("DEBUG: Calibration STARTED - pump is now running", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Calibration STARTED - pump is now running")
                 elif calibration_stage == 1:  # 실행 중 → 중단
-                    log_message(f"UI: Stopping calibration early for P{calibrating_pump}", False)
+                    log_at(LOG_INFO, "UI: Stopping calibration early for P%s", calibrating_pump, publish_mqtt=False)
                     # 스레드 중단 플래그 설정
                     calibration_thread_stop_flag = True
                     # 중단 후 바로 입력 화면으로 이동
@@ -2574,18 +4666,21 @@ async def handle_buttons_async():
                     # 즉시 화면 업데이트
                     if oled:
                         display_calibrate_input_screen()
-                        log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (STOP)", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Immediate CALIBRATE_INPUT screen update (STOP)")
                 elif calibration_stage == 2:  # 완료, 입력 대기
-                    log_message(f"UI: Moving to input screen for P{calibrating_pump}", False)
+                    log_at(LOG_INFO, "UI: Moving to input screen for P%s", calibrating_pump, publish_mqtt=False)
                     current_screen = "CALIBRATE_INPUT"
                     force_screen_update = True
                     action_taken = True
                     # 즉시 화면 업데이트
                     if oled:
                         display_calibrate_input_screen()
-                        log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (COMPLETED)", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Immediate CALIBRATE_INPUT screen update (COMPLETED)")
             elif back or left:
-                log_message(f"DEBUG: BACK/LEFT button pressed in CALIBRATE_PUMP screen, calibration_stage={calibration_stage}", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("BACK/LEFT button pressed in CALIBRATE_PUMP screen, calibration_stage=%s", calibration_stage)
                 if calibration_stage == 1:  # 실행 중인 경우 중단
                     calibration_thread_stop_flag = True
                 log_message("UI: Returning to PUMP_MENU from CALIBRATE_PUMP", False)
@@ -2595,7 +4690,8 @@ async def handle_buttons_async():
                 # 즉시 화면 업데이트
                 if oled:
                     display_pump_menu_screen()
-                    log_message("DEBUG: Immediate PUMP_MENU screen update (BACK)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate PUMP_MENU screen update (BACK)")
 
         elif current_screen == "CALIBRATE_INPUT":
             if up:
@@ -2605,13 +4701,14 @@ async def handle_buttons_async():
                     calibration_input_ml = min(999, calibration_input_ml + 10)
                 elif calibration_input_cursor == 2:  # 일의 자리
                     calibration_input_ml = min(999, calibration_input_ml + 1)
-                log_message(f"UI: Calibration input increased to {calibration_input_ml}ml", False)
+                log_at(LOG_INFO, "UI: Calibration input increased to %sml", calibration_input_ml, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_calibrate_input_screen()
-                    log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (UP)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate CALIBRATE_INPUT screen update (UP)")
             elif down:
                 if calibration_input_cursor == 0:  # 백의 자리
                     calibration_input_ml = max(0, calibration_input_ml - 100)
@@ -2619,31 +4716,34 @@ async def handle_buttons_async():
                     calibration_input_ml = max(0, calibration_input_ml - 10)
                 elif calibration_input_cursor == 2:  # 일의 자리
                     calibration_input_ml = max(0, calibration_input_ml - 1)
-                log_message(f"UI: Calibration input decreased to {calibration_input_ml}ml", False)
+                log_at(LOG_INFO, "UI: Calibration input decreased to %sml", calibration_input_ml, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_calibrate_input_screen()
-                    log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (DOWN)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate CALIBRATE_INPUT screen update (DOWN)")
             elif left:
                 calibration_input_cursor = max(0, calibration_input_cursor - 1)
-                log_message(f"UI: Calibration input cursor moved left to {calibration_input_cursor}", False)
+                log_at(LOG_INFO, "UI: Calibration input cursor moved left to %s", calibration_input_cursor, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_calibrate_input_screen()
-                    log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (LEFT)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate CALIBRATE_INPUT screen update (LEFT)")
             elif right:
                 calibration_input_cursor = min(2, calibration_input_cursor + 1)
-                log_message(f"UI: Calibration input cursor moved right to {calibration_input_cursor}", False)
+                log_at(LOG_INFO, "UI: Calibration input cursor moved right to %s", calibration_input_cursor, publish_mqtt=False)
                 force_screen_update = True
                 action_taken = True
                 # 즉시 화면 업데이트
                 if oled:
                     display_calibrate_input_screen()
-                    log_message("DEBUG: Immediate CALIBRATE_INPUT screen update (RIGHT)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate CALIBRATE_INPUT screen update (RIGHT)")
             elif select:  # 캘리브레이션 저장
                 if calibration_input_ml > 0:
                     # 예상: 50ml, 실제: calibration_input_ml
@@ -2658,7 +4758,7 @@ async def handle_buttons_async():
                     pump_pwm_duty[calibrating_pump] = new_duty
                     save_calibration()
                     
-                    log_message(f"UI: Calibration saved - P{calibrating_pump}: {current_duty} -> {new_duty} (Expected: {expected_ml}ml, Actual: {actual_ml}ml)")
+                    log_at(LOG_INFO, "UI: Calibration saved - P%s: %s -> %s (Expected: %sml, Actual: %sml)", calibrating_pump, current_duty, new_duty, expected_ml, actual_ml)
                     
                     current_screen = "PUMP_MENU"
                     force_screen_update = True
@@ -2666,7 +4766,8 @@ async def handle_buttons_async():
                     # 즉시 화면 업데이트
                     if oled:
                         display_pump_menu_screen()
-                        log_message("DEBUG: Immediate PUMP_MENU screen update (SAVE)", False)
+                        if DEBUG_LOG_BUILD:
+                            log_debug("Immediate PUMP_MENU screen update (SAVE)")
                 else:
                     log_message("UI: Invalid calibration input (0ml)", False)
             elif back:
@@ -2678,29 +4779,36 @@ async def handle_buttons_async():
                 # 즉시 화면 업데이트
                 if oled:
                     display_calibrate_pump_screen()
-                    log_message("DEBUG: Immediate CALIBRATE_PUMP screen update (CANCEL)", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Immediate CALIBRATE_PUMP screen update (CANCEL)")
 
         # 액션이 수행되었을 때만 타임아웃 리셋
         if action_taken:
             last_action_time = current_time
-            await asyncio.sleep_ms(1)
+            delay_ms = 1
         else:
-            await asyncio.sleep_ms(20)  # 50ms에서 20ms로 단축
+            delay_ms = 20  # 50ms에서 20ms로 단축
+        t_sleep = perf_iter_done(PERF_TASK_BUTTONS, t_iter)
+        await asyncio.sleep_ms(delay_ms)
+        perf_wake(PERF_TASK_BUTTONS, t_sleep, delay_ms)
 
 async def update_display_task():
-    global current_screen, oled 
+    global current_screen, oled, display_next_frame_ms
     
     while True:
         try:
+            t_iter = time.ticks_us()
             if oled:
                 # MAIN 화면이나 캘리브레이션 화면이 아닐 때만 디버깅 로그 출력
-                if current_screen not in ["MAIN", "CALIBRATE_PUMP", "CALIBRATE_INPUT"]:
-                    log_message(f"DEBUG: update_display_task - current_screen: {current_screen}", False)
+                if DEBUG_LOG_BUILD and current_screen not in ["MAIN", "CALIBRATE_PUMP", "CALIBRATE_INPUT"]:
+                    log_debug("update_display_task - current_screen: %s", current_screen)
                     
+                mem_before = gc.mem_alloc()
                 if current_screen == "MAIN":
                     display_main_screen()
                 elif current_screen == "SELECT_PUMP":
-                    log_message("DEBUG: Calling display_select_pump_screen from update_display_task", False)
+                    if DEBUG_LOG_BUILD:
+                        log_debug("Calling display_select_pump_screen from update_display_task")
                     display_select_pump_screen()
                 elif current_screen == "VIEW_SCHEDULE":
                     display_view_schedule_screen()
@@ -2715,7 +4823,7 @@ async def update_display_task():
                 elif current_screen == "CALIBRATE_INPUT":
                     display_calibrate_input_screen()
                 else:
-                    log_message(f"Warning: Unknown screen state '{current_screen}' in display task", False)
+                    log_at(LOG_INFO, "Warning: Unknown screen state '%s' in display task", current_screen, publish_mqtt=False)
                     oled.fill(0)
                     oled.text("Unknown Screen!", 0, 0)
                     oled.text(f"State: {current_screen}", 0, 10)
@@ -2723,8 +4831,10 @@ async def update_display_task():
                     await asyncio.sleep(1)
                     current_screen = "MAIN"
                     force_screen_update = True
+                mem_sample(MEM_OP_DISPLAY_FRAME, mem_before)
             else:
-                log_message("DEBUG: OLED not available in update_display_task", False)
+                if DEBUG_LOG_BUILD:
+                    log_debug("OLED not available in update_display_task")
 
             # 캘리브레이션 모드와 수동 제어 모드에서는 더 빠른 업데이트
             if current_screen in ["CALIBRATE_PUMP", "CALIBRATE_INPUT"]:
@@ -2735,97 +4845,131 @@ async def update_display_task():
                 delay_ms = 200
             else:
                 delay_ms = 150
+            t_sleep = perf_iter_done(PERF_TASK_DISPLAY, t_iter)
+            display_next_frame_ms = time.ticks_add(time.ticks_ms(), delay_ms)
             await asyncio.sleep_ms(delay_ms)
+            perf_wake(PERF_TASK_DISPLAY, t_sleep, delay_ms)
 
         except Exception as e:
-            log_message(f"Display Task Error: {e}")
+            log_at(LOG_INFO, "Display Task Error: %s", e)
             await asyncio.sleep_ms(1000)
 
+def run_due_schedules(minute_of_day):
+    """해당 분에 예정된 스케줄 실행 (큐에 넣은 투여 수 반환)"""
+    started = 0
+    for pump_id in schedules:
+        i = schedule_due_index(pump_id, minute_of_day)
+        if i < 0:
+            continue
+        store = schedules[pump_id]
+        h, m, duration_ms, interval_days = store[i]
+
+        # 요일/날짜/간격 체크
+        if schedule_runs_on(pump_id, store, i):
+            # 펌프가 작동 중이면 큐에서 기다렸다가 이어서 실행
+            if dose_enqueue(pump_id, duration_ms, DOSE_PRIO_SCHEDULED, "sched"):
+                log_at(LOG_INFO, "SCHED: P%s START at %02d:%02d for %sms (every %s day(s))", pump_id, h, m, duration_ms, interval_days)
+                # 실행 기록
+                record_schedule_run(pump_id, h, m)
+                started += 1
+            else:
+                log_at(LOG_INFO, "SCHED: P%s SKIPPED at %02d:%02d (queue full)", pump_id, h, m)
+        else:
+            log_at(LOG_INFO, "SCHED: P%s SKIPPED at %02d:%02d (not scheduled today)", pump_id, h, m)
+    return started
+
 async def check_schedules_task():
-    global schedules, pump_tasks, force_screen_update
-    last_check_minute = -1
+    """다음 스케줄 시각까지 잠들었다가 정각에 실행 (스케줄/시계 변경 시 schedule_wake_event 로 재계산)
     
+    처리한 분은 schedule_last_eval 로 판단하므로 재부팅 전에 저장된 분은 다시 처리하지 않는다.
+    """
     while True:
         try:
-            now = get_local_time()
-            current_year = now[0]
-            current_minute_of_day = now[3] * 60 + now[4]
-
-            if current_year > 2000 and current_minute_of_day != last_check_minute:
-                last_check_minute = current_minute_of_day
-
-                for pump_id, pump_schedule_list in schedules.items():
-                    for schedule_item in pump_schedule_list:
-                        # 새로운 4개 요소 형식과 기존 3개 요소 형식 모두 지원
-                        if len(schedule_item) == 4:
-                            h, m, duration_ms, interval_days = schedule_item
-                        else:  # len == 3 (기존 형식)
-                            h, m, duration_ms = schedule_item
-                            interval_days = 1  # 기본값: 매일
-                        
-                        if h == now[3] and m == now[4]:
-                            # 날짜 간격 체크
-                            if should_run_schedule(pump_id, h, m, interval_days):
-                                if pump_tasks.get(pump_id) is None:
-                                    log_message(f"SCHED: P{pump_id} START at {h:02d}:{m:02d} for {duration_ms}ms (every {interval_days} day(s))")
-                                    asyncio.create_task(run_pump_for_duration(pump_id, duration_ms))
-                                    # 실행 기록
-                                    record_schedule_run(pump_id, h, m)
-                                else:
-                                    log_message(f"SCHED: P{pump_id} SKIPPED at {h:02d}:{m:02d} (already running)")
-                            else:
-                                log_message(f"SCHED: P{pump_id} SKIPPED at {h:02d}:{m:02d} (interval {interval_days} days not met)")
-                            break
-
-                gc.collect()
-
-            await asyncio.sleep(10)
+            t_iter = time.ticks_us()
+            schedule_wake_event.clear()
+            wait_s = SCHED_UNSYNCED_RETRY_S
+            if get_local_time()[0] > 2000:
+                local_secs = int(time.time() + TIMEZONE_OFFSET)
+                second_of_day = local_secs % 86400
+                minute_key = local_secs // 60
+                if minute_key != schedule_last_eval:
+                    started = run_due_schedules(second_of_day // 60)
+                    # 재부팅/시간 미동기화/시계 변경으로 지나간 분이 있으면 보충 (현재 분 스케줄이 먼저 펌프를 잡음)
+                    catch_up_missed_doses(minute_key)
+                    mark_schedule_evaluated(minute_key)
+                    if started:
+                        # 투여 직후 재부팅해도 다시 실행하지 않도록 실행 기록은 지연 없이 저장 (플래시 쓰기는 writer 태스크가)
+                        schedule_ledger_flush_event.set()
+                    gc_request()
+                wait_s = seconds_until_next_schedule(second_of_day)
+                if wait_s is None or wait_s > SCHED_MAX_SLEEP_S:
+                    wait_s = SCHED_MAX_SLEEP_S
+
+            t_sleep = perf_iter_done(PERF_TASK_SCHEDULES, t_iter)
+            try:
+                await asyncio.wait_for_ms(schedule_wake_event.wait(), wait_s * 1000)
+            except asyncio.TimeoutError:
+                pass
+            perf_wake(PERF_TASK_SCHEDULES, t_sleep, wait_s * 1000)
 
         except Exception as e:
-            log_message(f"Schedule Check Task Error: {e}")
+            log_at(LOG_INFO, "Schedule Check Task Error: %s", e)
             await asyncio.sleep(60)
 
 async def mqtt_handler_task():
+    """MQTT 연결 감독 태스크 (재연결, 끊김 감지, 상태 프레임).
+    수신과 keepalive 는 AsyncMQTTClient 의 태스크가 처리하므로, 여기서는 고정 주기로 폴링하지 않고
+    연결 종료(closed_event) 또는 다음 기한(재연결 간격, 상태 프레임)까지 잠든다."""
     global mqtt_client, mqtt_connected, mqtt_connection_attempt_time, force_screen_update
     
     while True:
         try:
+            t_iter = time.ticks_us()
+            closed_event = None
+            wait_ms = MQTT_WIFI_CHECK_MS
             if wlan and wlan.isconnected():
                 if not mqtt_connected:
                     current_time = time.ticks_ms()
-                    if time.ticks_diff(current_time, mqtt_connection_attempt_time) > MQTT_RECONNECT_DELAY_S * 1000:
+                    elapsed = time.ticks_diff(current_time, mqtt_connection_attempt_time)
+                    if elapsed > MQTT_RECONNECT_DELAY_S * 1000:
                         log_message("Attempting MQTT reconnection...")
                         mqtt_connection_attempt_time = current_time
-                        connect_mqtt()
+                        await connect_mqtt()
                         safe_force_screen_update()
-                        gc.collect()
+                        gc_request()
+                        elapsed = 0
+                    # 연결됐으면 바로 다음 반복에서 감독 대기로 전환
+                    wait_ms = 0 if mqtt_connected else MQTT_RECONNECT_DELAY_S * 1000 - elapsed + 1
+                elif mqtt_client is None or not mqtt_client.is_connected():
+                    # 수신/송신 태스크가 연결 끊김을 감지해 클라이언트를 닫은 경우
+                    log_message("MQTT 연결 끊김 감지. 재연결 대기.")
+                    mqtt_connected = False
+                    safe_force_screen_update()
+                    mqtt_connection_attempt_time = time.ticks_ms()
+                    gc_request()
+                    wait_ms = MQTT_RECONNECT_DELAY_S * 1000 + 1
                 else:
-                    try:
-                        if mqtt_client:
-                            mqtt_client.check_msg()
-                            # Heartbeat 발행
-                            publish_heartbeat()
-                    except OSError as e:
-                        log_message(f"MQTT check_msg OSError: {e}. Disconnecting.")
-                        mqtt_connected = False
-                        safe_force_screen_update()
-                        mqtt_connection_attempt_time = time.ticks_ms()
-                        gc.collect()
-                    except Exception as e:
-                        log_message(f"MQTT check_msg Error: {e}")
+                    publish_health()
+                    closed_event = mqtt_client.closed_event
+                    wait_ms = health_wait_ms()
             else:
                 if mqtt_connected:
                     log_message("Wi-Fi disconnected, marking MQTT as disconnected.", False)
                     mqtt_connected = False
                     safe_force_screen_update()
-                    try:
-                        if mqtt_client:
-                            mqtt_client.disconnect()
-                    except:
-                        pass
+                    if mqtt_client:
+                        mqtt_client.close()
                     mqtt_client = None
 
-            await asyncio.sleep_ms(500)
+            t_sleep = perf_iter_done(PERF_TASK_MQTT, t_iter)
+            if closed_event is None:
+                await asyncio.sleep_ms(wait_ms)
+            else:
+                try:
+                    await asyncio.wait_for_ms(closed_event.wait(), wait_ms)
+                except asyncio.TimeoutError:
+                    pass
+            perf_wake(PERF_TASK_MQTT, t_sleep, wait_ms)
 
         except Exception as e:
             log_message(f"MQTT Handler Task Error: {e}")
@@ -2836,7 +4980,7 @@ async def mqtt_handler_task():
 # --- 전역 상태 점검 및 복구 ---
 async def check_global_state():
     """전역 상태 점검 및 복구 (주기적 호출 필요)"""
-    global wlan, mqtt_connected, force_screen_update, mqtt_client, last_mqtt_publish_time
+    global wlan, mqtt_connected, force_screen_update, mqtt_client, last_perf_publish_time, last_mem_publish_time
 
     # Wi-Fi 연결 점검 및 재연결 시도 (개선된 버전)
     if should_attempt_wifi_reconnect():
@@ -2847,30 +4991,36 @@ async def check_global_state():
             # 연결 성공 시 MQTT도 확인
             if not mqtt_connected:
                 log_message("MQTT 재연결 시도...")
-                connect_mqtt()
+                await connect_mqtt()
         else:
             log_message("Wi-Fi 상태 점검 완료 - 연결 실패")
 
-    # MQTT 연결 점검 및 재연결 시도
-    if mqtt_client is None or not mqtt_connected:
+    # MQTT 연결 점검 및 재연결 시도 (다른 태스크가 연결 중이면 그 클라이언트를 닫지 않음)
+    if (mqtt_client is None or not mqtt_connected) and not mqtt_connecting:
         log_message("MQTT 연결 상태 불량, 재연결 시도...", False)
-        try:
-            if mqtt_client is not None:
-                mqtt_client.disconnect()
-        except:
-            pass
+        if mqtt_client is not None:
+            mqtt_client.close()
         mqtt_client = None
         await asyncio.sleep(1)
-        connect_mqtt()
+        await connect_mqtt()
 
-    # 주기적으로 상태 발행 (예: 60초마다)
+    # 펌프/스케줄/대기열 상태는 바뀔 때 발행하고, 주기 요약은 상태 프레임(sta/health)이 담당
     current_time = time.ticks_ms()
-    if mqtt_connected and (time.ticks_diff(current_time, last_mqtt_publish_time) > 60000):
-        publish_all_status()
-        last_mqtt_publish_time = current_time
+
+    # 성능 계측 주기 발행
+    if mqtt_connected and MQTT_PERF_PUBLISH_INTERVAL_SEC > 0 and \
+       time.ticks_diff(current_time, last_perf_publish_time) > MQTT_PERF_PUBLISH_INTERVAL_SEC * 1000:
+        publish_perf_status()
+        last_perf_publish_time = current_time
+
+    # 힙 메모리 주기 발행
+    if mqtt_connected and MQTT_MEM_PUBLISH_INTERVAL_SEC > 0 and \
+       time.ticks_diff(current_time, last_mem_publish_time) > MQTT_MEM_PUBLISH_INTERVAL_SEC * 1000:
+        publish_status(MQTT_MEM_STATUS_TOPIC, mem_report(), retain=False)
+        last_mem_publish_time = current_time
 
     # 메모리 정리
-    gc.collect()
+    gc_request()
 
 # --- 주기적 작업 ---
 async def periodic_tasks():
@@ -2878,6 +5028,7 @@ async def periodic_tasks():
     global uptime_accum_seconds, last_uptime_tick, _last_uptime_saved_at
     while True:
         try:
+            t_iter = time.ticks_us()
             await check_global_state()
             # WDT 피드
             try:
@@ -2904,6 +5055,8 @@ async def periodic_tasks():
                 # 재부팅 조건
                 if uptime_accum_seconds >= REBOOT_AFTER_SECONDS:
                     log_message("Reboot threshold reached", False)
+                    # 누적값을 0으로 저장해야 재부팅 직후 다시 임계값에 걸리지 않음
+                    uptime_accum_seconds = 0
                     save_uptime_accumulator()
                     # 안전하게 리부트: 펌프 정지, 상태 발행, MQTT 연결해제 후 리셋
                     try:
@@ -2911,6 +5064,7 @@ async def periodic_tasks():
                         # 펌프 정지 및 상태 발행
                         for pid in (1, 2):
                             try:
+                                dose_queue_clear(pid)
                                 if pump_tasks.get(pid) is not None:
                                     try:
                                         pump_tasks[pid].cancel()
@@ -2922,16 +5076,21 @@ async def periodic_tasks():
                             except Exception as e:
                                 log_message(f"Error stopping pump {pid}: {e}", False)
 
+                        # 미저장 스케줄 실행 기록 저장
+                        flush_schedule_log()
+                        flush_dose_events()
+
                         # MQTT에 offline 상태 발행
                         try:
                             publish_status(MQTT_ONLINE_STATUS_TOPIC, "false", retain=True)
                         except Exception:
                             pass
 
-                        # MQTT 연결 해제
+                        # MQTT 연결 해제 (대기열의 offline 상태까지 송신 버퍼로 넘기고 DISCONNECT)
                         try:
                             if mqtt_client and mqtt_connected:
-                                mqtt_client.disconnect()
+                                mqtt_outbox_transfer(None)
+                                await mqtt_client.disconnect()
                         except Exception:
                             pass
 
@@ -2949,7 +5108,9 @@ async def periodic_tasks():
                 log_message(f"Uptime update error: {e}", False)
         except Exception as e:
             log_message(f"주기적 작업 중 오류: {e}")
-    await asyncio.sleep(10)  # 10초 간격
+        t_sleep = perf_iter_done(PERF_TASK_PERIODIC, t_iter)
+        await asyncio.sleep(10)  # 10초 간격
+        perf_wake(PERF_TASK_PERIODIC, t_sleep, 10000)
 
 
 # --- 메인 루프 ---
@@ -2969,6 +5130,12 @@ async def main():
     # 스케줄 로드
     load_schedules()
     
+    # 스케줄 실행 기록 로드
+    load_schedule_log()
+
+    # 미확인 투여 이벤트 로드
+    load_dose_events()
+
     # 캘리브레이션 데이터 로드
     load_calibration()
 
@@ -3000,6 +5167,14 @@ async def main():
     asyncio.create_task(mqtt_handler_task())
     asyncio.create_task(periodic_tasks()) # 주기적 작업 추가
     asyncio.create_task(monitor_wifi_connection()) # WiFi 모니터링 태스크 추가
+    asyncio.create_task(mqtt_log_shipper_task()) # MQTT 로그 배치 발행 태스크
+    asyncio.create_task(mqtt_sender_task()) # MQTT 송신 대기열 태스크
+    asyncio.create_task(dose_event_sender_task()) # 투여 이벤트 QoS 1 전송 태스크
+    asyncio.create_task(stall_monitor_task()) # 이벤트 루프 정지 감지 태스크
+    asyncio.create_task(gc_idle_task()) # 유휴 구간 GC 태스크
+    asyncio.create_task(schedule_ledger_writer_task()) # 스케줄 실행 기록 지연 저장 태스크
+    asyncio.create_task(dose_worker_task(1)) # 펌프별 투여 큐 실행 태스크
+    asyncio.create_task(dose_worker_task(2))
 
     log_message("메인 루프 실행 중...")
     # 메인 스레드를 살아있게 유지 (이벤트 루프가 작업들을 실행함)
@@ -3011,7 +5186,6 @@ async def main():
             log_message(f"WDT 피드 오류: {e}")
             
         await asyncio.sleep(10)  # 10초마다 WDT 피드
-        gc.collect()
 
 if __name__ == "__main__":
     try:
@@ -3028,7 +5202,7 @@ if __name__ == "__main__":
             log_message("Wi-Fi disconnected.")
         if mqtt_client and mqtt_connected:
             try: 
-                mqtt_client.disconnect()
+                mqtt_client.close()
                 log_message("MQTT disconnected.")
             except: 
                 pass
@@ -0,0 +1,330 @@
+"""
+펌웨어 핫패스 마이크로 벤치마크 (호스트 시뮬레이션 harness 사용)
+
+측정 항목 (ns/op, 라운드마다 반복 측정 중 최솟값을 구하고 라운드 간 다시 최솟값):
+- display_main_screen[N]    : 메인 화면 한 프레임 (스케줄 N개, 매 프레임 시계 1초 전진)
+- check_schedules_scan[N]   : 스케줄러가 한 번 깨어날 때의 작업 (해당 분 스케줄 조회 + 다음 대기 시간 계산)
+- mqtt_callback_run         : con/pump1 RUN:<ms> 처리 (투여 큐 추가, 대기열 상태 발행 포함)
+- mqtt_callback_schedule_add / mqtt_callback_schedule_delete[N] : 스케줄 추가/삭제 (저널 기록/압축, 상태 발행 포함)
+- mqtt_callback_schedule_set[50] : 스케줄 50개 일괄 교체 한 번 (검증, 파일 저장, 상태 발행, ack 포함)
+- log_message_<LEVEL>       : log_at(LEVEL, ...) 한 줄 (INFO 콘솔 임계값 기준)
+- save_schedules[N] / load_schedules[N]
+
+별도로 스케줄 1000개를 보관하는 데 드는 항목당 힙 바이트(tracemalloc 기준, 참고용)를 memory 에 보고한다.
+
+    python sim/bench_hotpaths.py                    # 결과 출력 + sim/bench_baseline.json 과 비교
+    python sim/bench_hotpaths.py --save-baseline    # 현재 결과를 기준값으로 저장
+    python sim/bench_hotpaths.py --output out.json --tolerance 0.3 --rounds 7
+
+호스트 부하에 따른 편차를 줄이기 위해 전체 측정을 --rounds 번(매번 새 시뮬레이션) 반복해
+항목별 최솟값(절대 ns)을 기준값과 비교하며 (부하는 측정을 느리게만 하므로 한 라운드라도 조용하면 됨),
+(1 + tolerance) 배보다 느린 항목이 있으면 종료 코드 1.
+항목마다 직전에 고정 연산(calibration)도 같은 방식으로 재서, 호스트가 기준값을 기록할 때보다
+느려져 있었으면 그 비율만큼만 보정한다 (빨라진 경우는 보정하지 않으므로 절대 시간이 빨라진 항목은
+회귀로 잡히지 않는다).
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+BASELINE_PATH = os.path.join(harness.SIM_DIR, 'bench_baseline.json')
+SCALES = (10, 100, 1000)
+SCAN_START = (2026, 10, 1, 0, 0, 0)     # 스캔 벤치마크는 00:00 부터 분 단위로 전진
+
+
+def make_schedules(count, skip_minutes=0):
+    """펌프 1/2 에 번갈아 count 개 스케줄 생성 (하루 중 앞쪽 skip_minutes 분은 비워 둠)"""
+    table = {1: [], 2: []}
+    span = 24 * 60 - skip_minutes
+    for i in range(count):
+        pump = 1 + i % 2
+        minute = skip_minutes + (i // 2) * span // ((count + 1) // 2)
+        table[pump].append((minute // 60, minute % 60, 1000 + i, 1 + i % 3))
+    return table
+
+
+def as_stores(fw, table):
+    """make_schedules() 결과를 펌웨어 스케줄 저장소로 변환"""
+    return {pump: fw.ScheduleStore.from_items(items) for pump, items in table.items()}
+
+
+def heap_bytes(build):
+    """build() 가 만든 객체가 차지하는 힙 바이트 (tracemalloc)"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del obj
+    return used
+
+
+def _calibration_work(n):
+    table = {}
+    for i in range(n):
+        table[i & 255] = table.get(i & 255, 0) + i
+        "%02d:%02d" % (i % 24, i % 60)
+
+
+def measure(fn, number, repeat):
+    """fn(number) 를 repeat 번 실행한 결과 중 가장 빠른 1회당 시간 (ns, 첫 실행은 예열로 버림)"""
+    fn(number)
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        fn(number)
+        per_op = (time.perf_counter_ns() - t0) / number
+        if best is None or per_op < best:
+            best = per_op
+    return best
+
+
+class HotpathBench:
+    def __init__(self, fs_dir, repeat):
+        self.repeat = repeat
+        self.sim = harness.Simulation(fs_dir, start_local=SCAN_START)
+        self.fw = self.sim.load()
+        self.sim.start()
+        self.sim.run_for(30)    # 부팅, Wi-Fi, NTP, MQTT 연결까지
+        self.results = {}
+        self.memory = {}
+        self.calibration = {}
+
+    def record(self, name, fn, number):
+        with self.sim.running():
+            self.calibration[name] = measure(_calibration_work, 5000, self.repeat)
+            ns = measure(fn, number, self.repeat)
+        self.results[name] = ns
+        self._discard_new_tasks()
+
+    def _discard_new_tasks(self):
+        """벤치마크 중 생성된 펌프 태스크/대기 투여 정리 (이벤트 루프는 다시 돌리지 않음)"""
+        fw = self.fw
+        for entry in harness.loop.queue:
+            task = entry[3]
+            if task.name == 'run_pump_for_duration' and not task.done():
+                task.coro.close()
+                task.done_flag = True
+        fw.pump_tasks[1] = None
+        fw.pump_tasks[2] = None
+        fw.dose_queues[1] = []
+        fw.dose_queues[2] = []
+
+    # --- 개별 벤치마크 ---
+    def bench_display(self):
+        fw = self.fw
+        clock = harness.clock
+        for count in (10, 100):
+            fw.schedules = as_stores(fw, make_schedules(count))
+            fw.rebuild_schedule_index()
+
+            def frames(n):
+                for _ in range(n):
+                    clock.advance_us(1000000)
+                    fw.display_main_screen()
+            self.record(f'display_main_screen[{count}]', frames, 200)
+
+    def bench_check_schedules(self):
+        fw = self.fw
+        for count in SCALES:
+            number = 50
+            fw.schedules = as_stores(fw, make_schedules(count, skip_minutes=(self.repeat + 1) * number + 60))
+            fw.rebuild_schedule_index()
+
+            def scans(n):
+                for minute in range(n):
+                    fw.run_due_schedules(minute)
+                    fw.seconds_until_next_schedule(minute * 60)
+            self.record(f'check_schedules_scan[{count}]', scans, number)
+
+    def bench_mqtt_callback(self):
+        fw = self.fw
+        topic_run = fw.MQTT_PUMP1_COMMAND_TOPIC.encode()
+        topic_add = fw.MQTT_SCHEDULE_ADD_TOPIC.encode()
+        topic_del = fw.MQTT_SCHEDULE_DELETE_TOPIC.encode()
+
+        def run_cmds(n):
+            for _ in range(n):
+                fw.dose_queues[1] = []
+                fw.mqtt_callback(topic_run, b'RUN:5000')
+        self.record('mqtt_callback_run', run_cmds, 500)
+
+        adds = [('{"pump": %d, "hour": %d, "minute": %d, "duration_ms": 3000}' % (1 + i % 2, (i // 2) // 60, (i // 2) % 60)).encode()
+                for i in range(200)]
+
+        def add_cmds(n):
+            fw.schedules = as_stores(fw, {1: [], 2: []})
+            for i in range(n):
+                fw.mqtt_callback(topic_add, adds[i])
+        self.record('mqtt_callback_schedule_add', add_cmds, len(adds))
+
+        for count in (10, 100):
+            table = make_schedules(count)
+            dels = [('{"pump": %d, "hour": %d, "minute": %d}' % (pump, item[0], item[1])).encode()
+                    for pump, items in table.items() for item in items]
+
+            def del_cmds(n):
+                fw.schedules = as_stores(fw, table)
+                for i in range(n):
+                    fw.mqtt_callback(topic_del, dels[i])
+            self.record(f'mqtt_callback_schedule_delete[{count}]', del_cmds, len(dels))
+
+        # 같은 50개 스케줄을 add 50번 대신 set 한 번으로 동기화
+        topic_set = fw.MQTT_SCHEDULE_SET_TOPIC.encode()
+        table = make_schedules(50)
+        set_msg = json.dumps({'id': 'bench', 'schedules': {str(p): [list(item) for item in items]
+                                                           for p, items in table.items()}}).encode()
+
+        def set_cmds(n):
+            for _ in range(n):
+                fw.mqtt_callback(topic_set, set_msg)
+        self.record('mqtt_callback_schedule_set[50]', set_cmds, 20)
+
+    def bench_log(self):
+        fw = self.fw
+        levels = (('DEBUG', fw.LOG_DEBUG), ('INFO', fw.LOG_INFO), ('WARNING', fw.LOG_WARNING), ('ERROR', fw.LOG_ERROR))
+        for name, level in levels:
+            def lines(n):
+                for i in range(n):
+                    fw.log_at(level, "P%d RUN 요청 (%dms)", 1, i)
+            self.record(f'log_message_{name}', lines, 2000)
+
+    def bench_schedule_file(self):
+        fw = self.fw
+        for count in SCALES:
+            table = as_stores(fw, make_schedules(count))
+
+            def saves(n):
+                for _ in range(n):
+                    fw.schedules = table
+                    fw.save_schedules()
+            number = 20000 // count
+            self.record(f'save_schedules[{count}]', saves, number)
+
+            def loads(n):
+                for _ in range(n):
+                    fw.load_schedules()
+            self.record(f'load_schedules[{count}]', loads, number)
+
+    def bench_schedule_memory(self):
+        fw = self.fw
+        count = SCALES[-1]
+        table = make_schedules(count)
+        as_tuples = heap_bytes(lambda: {p: [tuple(list(item)) for item in items] for p, items in table.items()})
+        as_store = heap_bytes(lambda: as_stores(fw, table))
+        self.memory['schedule_bytes_per_entry_tuples'] = round(as_tuples / count, 1)
+        self.memory['schedule_bytes_per_entry_store'] = round(as_store / count, 1)
+
+    def run(self):
+        self.bench_display()
+        self.bench_check_schedules()
+        self.bench_mqtt_callback()
+        self.bench_log()
+        self.bench_schedule_file()
+        self.bench_schedule_memory()
+        return self.results, self.memory, self.calibration
+
+
+def run_rounds(rounds, repeat):
+    """전체 벤치마크를 rounds 번 실행해 항목별 최솟값(ns), 메모리, 항목별 calibration 최솟값 반환"""
+    samples = {}
+    calibrations = {}
+    memory = {}
+    for _ in range(rounds):
+        fs_dir = tempfile.mkdtemp(prefix='dosebench-')
+        try:
+            results, memory, calibration = HotpathBench(fs_dir, repeat).run()
+        finally:
+            shutil.rmtree(fs_dir, ignore_errors=True)
+        for name, ns in results.items():
+            samples.setdefault(name, []).append(ns)
+            calibrations.setdefault(name, []).append(calibration[name])
+    results = {name: round(min(values), 1) for name, values in samples.items()}
+    calibration = {name: round(min(values), 1) for name, values in calibrations.items()}
+    return results, memory, calibration
+
+
+def host_slowdown(calibration, base_calibration):
+    """항목 측정 당시 호스트가 기준값 기록 때보다 느렸던 비율 (1.0 이상, 기준 calibration 이 없으면 1.0)"""
+    if not base_calibration:
+        return 1.0
+    return max(1.0, calibration / base_calibration)
+
+
+def compare(results, calibration, baseline, tolerance):
+    """기준값 대비 변화율(절대 ns, 호스트가 느려진 만큼 보정) 목록과 회귀 항목 반환"""
+    rows = []
+    regressions = []
+    base_results = baseline.get('results', {})
+    base_calibration = baseline.get('calibration_ns', {})
+    for name, ns in results.items():
+        base = base_results.get(name)
+        slowdown = host_slowdown(calibration[name], base_calibration.get(name))
+        ratio = ns / base / slowdown if base else None
+        rows.append((name, ns, base, ratio, slowdown))
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="펌웨어 핫패스 마이크로 벤치마크")
+    ap.add_argument('--repeat', type=int, default=3, help="라운드마다 항목별 반복 측정 횟수 (최솟값 사용)")
+    ap.add_argument('--rounds', type=int, default=10, help="전체 측정 반복 횟수 (항목별 최솟값 사용)")
+    ap.add_argument('--baseline', default=BASELINE_PATH)
+    ap.add_argument('--save-baseline', action='store_true', help="결과를 기준값 파일로 저장")
+    ap.add_argument('--tolerance', type=float, default=0.25, help="회귀 판정 허용 비율 (기본 25%%)")
+    ap.add_argument('--output', default=None, help="결과 JSON 저장 경로")
+    ap.add_argument('--only', default=None, help="이름에 이 문자열이 들어간 항목만 출력/비교")
+    args = ap.parse_args(argv)
+
+    results, memory, calibration = run_rounds(args.rounds, args.repeat)
+    if args.only:
+        results = {k: v for k, v in results.items() if args.only in k}
+
+    report = {
+        'unit': 'ns/op',
+        'host': {'python': platform.python_version(), 'machine': platform.machine()},
+        'rounds': args.rounds,
+        'calibration_ns': {k: calibration[k] for k in results},
+        'results': results,
+        'memory': memory,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    rows, regressions = compare(results, calibration, baseline, args.tolerance)
+    for name, ns, base, ratio, slowdown in rows:
+        if ratio is None:
+            print(f"{name:40s} {ns:12.1f} ns")
+        else:
+            note = f", 호스트 x{slowdown:.2f} 보정" if slowdown > 1 + args.tolerance else ""
+            flag = "  REGRESSION" if name in regressions else ""
+            print(f"{name:40s} {ns:12.1f} ns  (기준 {base:.1f}, x{ratio:.2f}{note}){flag}")
+    for name, value in memory.items():
+        print(f"{name:40s} {value:12.1f} B")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+MQTT 명령 -> 펌프 동작 종단 지연 벤치마크 (프로세스 내 브로커 + 가상 시계)
+
+폰 앱 역할로 {MQTT_BASE_TOPIC}/con/pumpN 에 RUN:<ms> 를 발행하고, 가상 시각 기준으로
+- actuation : 명령 발행 -> 펌프 PWM 시작
+- status    : 명령 발행 -> 펌프 동작 시작 후 브로커의 sta/pumpN 이 "ON" 이 된 시각
+지연의 p50/p90/p99/max 를 보고한다. 명령 간격은 지수 분포(평균 1/rate)이며 두 펌프에 번갈아 보낸다.
+펌프가 동작 중일 때 들어온 명령은 투여 큐에서 기다렸다 이어서 실행되므로 대기 시간이 지연에 포함된다.
+큐가 가득 차 거부된 명령은 rejected_full 로 따로 세고, 명령 -> 펌웨어 콜백 호출(command_to_callback)
+지연도 함께 보고한다.
+
+    python sim/bench_mqtt_latency.py --rate 0.2 --count 300
+    python sim/bench_mqtt_latency.py --rate 2 --count 500 --output lat.json
+    python sim/bench_mqtt_latency.py --save-baseline     # sim/bench_mqtt_latency_baseline.json 갱신
+
+태스크 실행 시간은 0 으로 취급하므로 결과는 주로 수신/대기열 처리 구조에 의한 지연이다.
+--cpu-scale 로 호스트 실행 시간을 반영할 수 있다.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+import machine  # noqa: E402
+
+BASELINE_PATH = os.path.join(harness.SIM_DIR, 'bench_mqtt_latency_baseline.json')
+WARMUP_S = 30       # 부팅, Wi-Fi, NTP, MQTT 연결 대기
+DRAIN_S = 10        # 마지막 명령 이후 대기
+
+
+def percentile(sorted_values, pct):
+    """nearest-rank 백분위수"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies_us):
+    values = sorted(latencies_us)
+    if not values:
+        return {'n': 0}
+    ms = lambda us: round(us / 1000, 2)     # noqa: E731
+    return {
+        'n': len(values),
+        'p50_ms': ms(percentile(values, 50)),
+        'p90_ms': ms(percentile(values, 90)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]),
+        'mean_ms': ms(sum(values) / len(values)),
+    }
+
+
+def status_on_since(log, t_act):
+    """t_act 이후 브로커의 펌프 상태가 처음 ON 인 시각 (연속 투여에서 OFF 가 송신 대기열에서
+    ON 으로 대체되어 나가지 않았으면 이미 ON 이므로 t_act)"""
+    state = None
+    for t, msg in log:
+        if t > t_act:
+            if state == b'ON':
+                return t_act
+            if msg == b'ON':
+                return t
+        state = msg
+    return t_act if state == b'ON' else None
+
+
+def run_latency(rate, count, run_ms, seed, cpu_scale, fs_dir):
+    sim = harness.Simulation(fs_dir, start_local=(2026, 10, 1, 12, 0, 0))
+    fw = sim.load()
+    harness.loop.cpu_scale = cpu_scale
+    sim.start()
+    sim.run_for(WARMUP_S)
+
+    command_topics = {fw.MQTT_PUMP1_COMMAND_TOPIC.encode(): 1, fw.MQTT_PUMP2_COMMAND_TOPIC.encode(): 2}
+    status_topics = {fw.MQTT_PUMP1_STATUS_TOPIC.encode(): 1, fw.MQTT_PUMP2_STATUS_TOPIC.encode(): 2}
+    status_log = {1: [], 2: []}     # 펌프별 (t_us, 페이로드)
+
+    def on_publish(t_us, topic, msg, retain):
+        pump = status_topics.get(topic)
+        if pump is not None:
+            status_log[pump].append((t_us, msg))
+    harness.broker.listeners.append(on_publish)
+
+    # 펌웨어 콜백이 호출된 시각 (브로커 -> 클라이언트 전달은 FIFO 이므로 펌프별 발행 순서와 같다)
+    delivered = {1: [], 2: []}
+    callback = fw.mqtt_client.cb
+
+    def recording_callback(topic, msg):
+        pump = command_topics.get(bytes(topic))
+        if pump is not None:
+            delivered[pump].append(harness.clock.mono_us)
+        callback(topic, msg)
+    fw.mqtt_client.set_callback(recording_callback)
+
+    # 명령마다 투여 큐 수락 여부 (펌프별 k 번째 수락 명령 -> k 번째 PWM 시작/ON 발행)
+    accepted = {1: [], 2: []}
+    dose_enqueue = fw.dose_enqueue
+
+    def recording_enqueue(pump_id, duration_ms, priority, source):
+        ok = dose_enqueue(pump_id, duration_ms, priority, source)
+        accepted[pump_id].append(ok)
+        return ok
+    fw.dose_enqueue = recording_enqueue
+
+    rng = random.Random(seed)
+    sent = {1: [], 2: []}   # 펌프별 명령 발행 시각
+    t_us = harness.clock.mono_us
+    for i in range(count):
+        t_us += int(rng.expovariate(rate) * 1000000)
+        pump = 1 + i % 2
+        sim.run_until_us(t_us)
+        sim.publish(f"con/pump{pump}", f"RUN:{run_ms}")
+        sent[pump].append(t_us)
+    sim.run_for(DRAIN_S + run_ms / 1000)
+
+    pin_to_pump = {fw.PUMP1_IN1_PIN: 1, fw.PUMP2_IN1_PIN: 2}
+    pwm_on = {1: [], 2: []}
+    for t, pin, duty in machine.pwm_events:
+        if duty and pin in pin_to_pump:
+            pwm_on[pin_to_pump[pin]].append(t)
+
+    delivery, actuation, status = [], [], []
+    undelivered = rejected = 0
+    for pump in (1, 2):
+        times = delivered[pump]
+        undelivered += len(sent[pump]) - len(times)
+        k_run = 0
+        for k, t_del in enumerate(times):
+            t_cmd = sent[pump][k]
+            delivery.append(t_del - t_cmd)
+            if not accepted[pump][k]:
+                rejected += 1
+                continue
+            # 큐는 FIFO 이므로 k_run 번째로 수락된 명령이 k_run 번째 PWM 시작에 해당
+            if k_run < len(pwm_on[pump]):
+                t_act = pwm_on[pump][k_run]
+                actuation.append(t_act - t_cmd)
+                t_on = status_on_since(status_log[pump], t_act)
+                if t_on is not None:
+                    status.append(t_on - t_cmd)
+            k_run += 1
+
+    return {
+        'rate_per_s': rate,
+        'commands': count,
+        'run_ms': run_ms,
+        'seed': seed,
+        'cpu_scale': cpu_scale,
+        'rejected_full': rejected,
+        'undelivered': undelivered,
+        'command_to_callback': summarize(delivery),
+        'command_to_actuation': summarize(actuation),
+        'command_to_status': summarize(status),
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MQTT 명령 -> 펌프 동작 종단 지연 벤치마크")
+    ap.add_argument('--rate', type=float, default=0.2, help="초당 평균 명령 수")
+    ap.add_argument('--count', type=int, default=300, help="보낼 명령 수")
+    ap.add_argument('--run-ms', type=int, default=1000, help="RUN 명령의 동작 시간 (ms)")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--cpu-scale', type=float, default=0.0)
+    ap.add_argument('--output', default=None, help="결과 JSON 저장 경로")
+    ap.add_argument('--baseline', default=BASELINE_PATH)
+    ap.add_argument('--save-baseline', action='store_true')
+    ap.add_argument('--tolerance', type=float, default=0.25, help="p99 회귀 판정 허용 비율")
+    args = ap.parse_args(argv)
+
+    fs_dir = tempfile.mkdtemp(prefix='doselat-')
+    try:
+        result = run_latency(args.rate, args.count, args.run_ms, args.seed, args.cpu_scale, fs_dir)
+    finally:
+        shutil.rmtree(fs_dir, ignore_errors=True)
+
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(text + '\n')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    same_setup = all(baseline.get(k) == result[k] for k in ('rate_per_s', 'commands', 'run_ms', 'seed', 'cpu_scale'))
+    if not same_setup:
+        print("기준값과 측정 조건이 달라 비교 생략")
+        return 0
+    failed = False
+    for key in ('command_to_actuation', 'command_to_status'):
+        base = baseline[key].get('p99_ms')
+        now = result[key].get('p99_ms')
+        if base and now is not None and now > base * (1 + args.tolerance):
+            print(f"REGRESSION {key} p99 {now}ms (기준 {base}ms)")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""
+dosingpumpfinal.py 호스트(CPython) 시뮬레이션 harness
+
+펌웨어 파일은 수정하지 않고 그대로 불러온다. MicroPython 전용 모듈은 stubs/ 의 대체 모듈로,
+내장 모듈인 `time`, `_thread`, `gc` 는 펌웨어 실행 중에만 sys.modules 에서 vclock / sim_thread /
+sim_gc 로 바꿔 끼운다.
+
+    sim = Simulation("/tmp/dosesim", start_local=(2026, 10, 1, 0, 0, 0))
+    sim.load()
+    sim.start()
+    sim.run_for(3 * 86400)
+    print(sim.summary())
+"""
+import calendar
+import contextlib
+import importlib.util
+import os
+import sys
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_DIR = os.path.join(SIM_DIR, 'stubs')
+FIRMWARE_PATH = os.path.join(os.path.dirname(SIM_DIR), 'dosingpumpfinal.py')
+
+for _path in (SIM_DIR, STUB_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+import vclock               # noqa: E402
+import sim_gc               # noqa: E402
+import sim_thread           # noqa: E402
+import machine              # noqa: E402
+import network              # noqa: E402
+import ntptime              # noqa: E402
+import uasyncio             # noqa: E402
+from umqtt import simple as umqtt_simple   # noqa: E402
+import mqtt_wire            # noqa: E402
+
+mqtt_wire.install()         # 펌웨어 AsyncMQTTClient 의 open_connection() -> 프로세스 내 브로커
+
+clock = vclock.clock
+loop = uasyncio._loop
+broker = umqtt_simple.broker
+
+
+# --- 빨리 감기(fast) 모드 ---
+# 버튼 폴링(20ms)과 정지 감지(100ms) 태스크는 시작하지 않고, 나머지 폴링 태스크는 sleep 을
+# FAST_POLL_FLOOR_MS 이상으로 늘린다. 스케줄/펌프 동작 시간은 영향을 받지 않지만 해당 태스크의
+# perf 히스토그램과 MQTT 명령 지연은 실제 기기와 달라진다.
+FAST_PARKED_TASKS = ('handle_buttons_async', 'stall_monitor_task')
+FAST_FLOOR_TASKS = ('update_display_task', 'mqtt_log_shipper_task', 'gc_idle_task', 'mqtt_handler_task')
+FAST_POLL_FLOOR_MS = 5000
+
+
+async def _parked_task():
+    await uasyncio.Event().wait()
+
+
+@contextlib.contextmanager
+def firmware_modules():
+    """펌웨어 코드가 실행되는 동안만 time/_thread/gc 를 대체 모듈로 교체"""
+    saved = {name: sys.modules.get(name) for name in ('time', '_thread', 'gc')}
+    sys.modules['time'] = vclock
+    sys.modules['_thread'] = sim_thread
+    sys.modules['gc'] = sim_gc
+    try:
+        yield
+    finally:
+        for name, module in saved.items():
+            sys.modules[name] = module
+
+
+def reset_stubs(wall_start=None):
+    """모든 대체 모듈 상태 초기화 (가상 시계 0, 브로커/핀 기록 비움)"""
+    clock.reset(wall_start)
+    loop.reset()
+    broker.reset()
+    machine.power_on_reset()
+    del machine.pwm_events[:]
+    network._interfaces.clear()
+    network.link_up = True
+    network.AP_SSID = None
+    ntptime.fail_next = 0
+    sim_gc.collect_count = 0
+    del sim_thread.started[:]
+
+
+class Simulation:
+    def __init__(self, fs_dir, start_local=None, firmware_path=FIRMWARE_PATH, console=None, fast=False):
+        """
+        fs_dir: 펌웨어 파일 시스템 역할의 디렉터리 (schedules.json 등이 여기에 저장됨)
+        start_local: NTP 동기화 시 맞출 기기 현지 시각 (년, 월, 일, 시, 분, 초), None 이면 현재 시각
+        console: 펌웨어 print 출력 대상 (파일 객체, None 이면 버림)
+        fast: 빨리 감기 모드 (FAST_* 설정 참고)
+        """
+        self.fs_dir = os.path.abspath(fs_dir)
+        self.start_local = start_local
+        self.firmware_path = firmware_path
+        self.console = console
+        self.fast = fast
+        self.fw = None
+        self.main_task = None
+        self.wdt_expired = []       # WDT 가 리셋시켰을 가상 시각 (us)
+        self.resets = []            # machine.reset() 으로 재부팅한 가상 시각 (us)
+        os.makedirs(self.fs_dir, exist_ok=True)
+        reset_stubs()
+
+    @contextlib.contextmanager
+    def running(self):
+        """펌웨어 실행 환경 (fs_dir, 대체 모듈, 콘솔 출력 전환)"""
+        cwd = os.getcwd()
+        os.chdir(self.fs_dir)
+        out = self.console if self.console is not None else open(os.devnull, 'w')
+        try:
+            with firmware_modules(), contextlib.redirect_stdout(out):
+                yield
+        finally:
+            if self.console is None:
+                out.close()
+            os.chdir(cwd)
+
+    def load(self):
+        """펌웨어 모듈 로드 (모듈 수준 코드 실행)"""
+        with self.running():
+            fw = self._exec_firmware()
+        network.AP_SSID = fw.WIFI_SSID
+        if self.start_local is not None:
+            clock.wall_start = calendar.timegm(tuple(self.start_local[:6])) - fw.TIMEZONE_OFFSET
+        return fw
+
+    def _exec_firmware(self):
+        spec = importlib.util.spec_from_file_location('dosingpumpfinal', self.firmware_path)
+        fw = importlib.util.module_from_spec(spec)
+        sys.modules['dosingpumpfinal'] = fw
+        spec.loader.exec_module(fw)
+        self.fw = fw
+        return fw
+
+    def _reboot(self):
+        """machine.reset(): 태스크/하드웨어 상태를 버리고 펌웨어를 다시 실행 (파일, RTC, 브로커 보존 메시지 유지)"""
+        self.resets.append(clock.mono_us)
+        loop.clear()
+        broker.drop_clients()
+        machine.power_on_reset()
+        network._interfaces.clear()
+        clock.reboot()
+        self._exec_firmware()
+        self.start()
+
+    def start(self):
+        """main() 태스크 생성 (실행은 run_for/run_until_us 에서)"""
+        if self.fast:
+            for name in FAST_PARKED_TASKS:
+                setattr(self.fw, name, _parked_task)
+            loop.sleep_floor_us = FAST_POLL_FLOOR_MS * 1000
+            loop.floor_tasks = FAST_FLOOR_TASKS
+        self.main_task = uasyncio.create_task(self.fw.main())
+        return self.main_task
+
+    def call(self, func, *args):
+        """펌웨어 함수를 시뮬레이션 환경(가상 시계, 파일 시스템)에서 직접 호출"""
+        with self.running():
+            return func(*args)
+
+    def run_for(self, seconds, slice_s=60):
+        self.run_until_us(clock.mono_us + int(seconds * 1000000), slice_s)
+
+    def run_until_us(self, stop_us, slice_s=60):
+        slice_us = slice_s * 1000000
+        with self.running():
+            while clock.mono_us < stop_us:
+                try:
+                    loop.run_until(min(stop_us, clock.mono_us + slice_us))
+                except machine.ResetRequested:
+                    self._reboot()
+                    continue
+                self._check_wdt()
+                if self.main_task is not None and self.main_task.done() and self.main_task.exc is not None:
+                    raise self.main_task.exc
+
+    def _check_wdt(self):
+        wdt = machine.wdt
+        if wdt is not None and wdt.expired():
+            self.wdt_expired.append(wdt.last_feed_us + wdt.timeout_ms * 1000)
+            wdt.last_feed_us = clock.mono_us    # 같은 공백을 중복 집계하지 않도록
+
+    # --- 외부 입력 ---
+    def publish(self, topic_suffix, msg, retain=False):
+        """폰 앱 역할: {MQTT_BASE_TOPIC}/{topic_suffix} 로 발행"""
+        broker.publish(f"{self.fw.MQTT_BASE_TOPIC}/{topic_suffix}", msg, retain)
+
+    def press(self, name):
+        """버튼 눌림 이벤트 주입 (UP, DOWN, SELECT, BACK ...)"""
+        with self.fw.button_lock:
+            self.fw.button_events[name] = True
+
+    # --- 결과 조회 ---
+    def local_time(self, t_us=None):
+        """가상 시각(us)을 기기 현지 시각 튜플로 변환"""
+        if t_us is None:
+            t_us = clock.mono_us
+        secs = clock.wall_start + t_us // 1000000 + self.fw.TIMEZONE_OFFSET
+        return vclock.gmtime(secs - vclock.EPOCH_2000)
+
+    def pump_runs(self):
+        """펌프별 실행 기록 {펌프: [(시작 us, 동작 us), ...]}"""
+        pin_to_pump = {self.fw.PUMP1_IN1_PIN: 1, self.fw.PUMP2_IN1_PIN: 2}
+        runs = {1: [], 2: []}
+        started = {}
+        for t_us, pin, duty in machine.pwm_events:
+            pump = pin_to_pump.get(pin)
+            if pump is None:
+                continue
+            if duty and pump not in started:
+                started[pump] = t_us
+            elif not duty and pump in started:
+                t0 = started.pop(pump)
+                runs[pump].append((t0, t_us - t0))
+        for pump, t0 in started.items():
+            runs[pump].append((t0, clock.mono_us - t0))
+        return runs
+
+    def publish_counts(self):
+        counts = {}
+        prefix = (self.fw.MQTT_BASE_TOPIC + '/').encode()
+        for _, topic, _, _, sender in broker.log:
+            if sender is None:
+                continue
+            key = topic[len(prefix):].decode() if topic.startswith(prefix) else topic.decode()
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def summary(self):
+        runs = self.pump_runs()
+        pumps = {}
+        for pump, items in runs.items():
+            total_ms = sum(us for _, us in items) // 1000
+            ml_ms = self.fw.pump_ml_ms.get(pump, 1000) or 1000
+            pumps[pump] = {'runs': len(items), 'on_ms': total_ms, 'ml': round(total_ms / ml_ms, 2)}
+        wdt = machine.wdt
+        return {
+            'virtual_s': clock.mono_us / 1000000,
+            'local_time': "%04d-%02d-%02d %02d:%02d:%02d" % self.local_time()[:6],
+            'loop_steps': loop.steps,
+            'gc_collects': sim_gc.collect_count,
+            'pumps': pumps,
+            'mqtt_publish': self.publish_counts(),
+            'wdt_max_gap_s': wdt.max_gap_us / 1000000 if wdt else None,
+            'wdt_expired': len(self.wdt_expired),
+            'resets': len(self.resets),
+            'task_errors': [repr(e) for _, e in loop.errors],
+            'threads_not_run': sorted({f.__name__ for f, _ in sim_thread.started}),
+        }
@@ -0,0 +1,181 @@
+"""
+MQTT 3.1.1 바이트 스트림 <-> 프로세스 내 브로커(umqtt.simple.broker) 어댑터
+
+펌웨어의 AsyncMQTTClient 가 uasyncio.open_connection() 으로 연결하면 BrokerSession 이 상대편이 되어
+CONNECT/SUBSCRIBE/PUBLISH/PINGREQ/DISCONNECT 를 해석하고, 브로커가 배달하는 메시지를 PUBLISH 패킷으로
+스트림에 넣는다. 브로커 입장에서는 umqtt.simple.MQTTClient 와 같은 클라이언트로 보인다
+(client_id, subscriptions, inbox, lw, sock).
+
+    import mqtt_wire
+    mqtt_wire.install()     # harness 가 import 시 호출
+"""
+import struct
+
+import network
+import uasyncio
+from umqtt.simple import broker, topic_matches
+
+
+def _encode_remaining(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        out.append(b | 0x80 if n else b)
+        if not n:
+            return out
+
+
+def _packet(first, body):
+    return bytes((first,)) + _encode_remaining(len(body)) + body
+
+
+def _read_str(body, pos):
+    n = struct.unpack_from('!H', body, pos)[0]
+    return body[pos + 2:pos + 2 + n], pos + 2 + n
+
+
+class _Inbox:
+    """브로커의 client.inbox.append((topic, msg)) 를 PUBLISH 패킷 전송으로 바꿈"""
+
+    def __init__(self, session):
+        self.session = session
+
+    def append(self, item):
+        topic, msg = item
+        self.session.send_publish(topic, msg, False)
+
+
+class BrokerSession:
+    def __init__(self, stream):
+        self.stream = stream
+        self.client_id = None
+        self.subscriptions = []
+        self.inbox = _Inbox(self)
+        self.lw = None
+        self.sock = True
+        self.buf = bytearray()
+        self.connected = False
+        self.next_pid = 0
+
+    # 브로커 -> 펌웨어
+    def send(self, data):
+        # AP 가 끊긴 동안 보낸 데이터는 기기에 닿지 않음
+        if self.sock is not None and network.link_up:
+            self.stream._feed(data)
+
+    def send_publish(self, topic, msg, retain):
+        self.send(_packet(0x30 | (1 if retain else 0), struct.pack('!H', len(topic)) + topic + msg))
+
+    def drop(self):
+        """브로커 측 연결 종료 (broker.drop_clients 에서 호출)"""
+        self.connected = False
+        self.sock = None
+        self.stream._feed_eof()
+
+    # 펌웨어 -> 브로커
+    def _link_ok(self):
+        return broker.up and network.link_up and self.sock is not None
+
+    def on_write(self, data):
+        if not self._link_ok():
+            self._lost()
+            raise OSError(104)          # ECONNRESET
+        self.buf += data
+        while True:
+            if len(self.buf) < 2:
+                return
+            n = 0
+            shift = 0
+            pos = 1
+            while True:
+                if pos >= len(self.buf):
+                    return
+                b = self.buf[pos]
+                pos += 1
+                n |= (b & 0x7F) << shift
+                if not b & 0x80:
+                    break
+                shift += 7
+            if len(self.buf) < pos + n:
+                return
+            first = self.buf[0]
+            body = bytes(self.buf[pos:pos + n])
+            del self.buf[:pos + n]
+            self._handle(first, body)
+
+    def on_close(self):
+        """펌웨어가 소켓을 닫음 (DISCONNECT 없이 닫았으면 LWT 발행)"""
+        if self.connected:
+            self.connected = False
+            broker.detach(self, graceful=False)
+        self.sock = None
+
+    def _lost(self):
+        if self.connected:
+            self.connected = False
+            broker.detach(self, graceful=False)
+        self.sock = None
+        self.stream._feed_eof()
+
+    def _handle(self, first, body):
+        kind = first & 0xF0
+        if kind == 0x10:        # CONNECT
+            pos = 2 + struct.unpack_from('!H', body)[0]
+            flags = body[pos + 1]
+            pos += 4            # 프로토콜 레벨, 플래그, keepalive
+            self.client_id, pos = _read_str(body, pos)
+            self.lw = None
+            if flags & 0x04:
+                topic, pos = _read_str(body, pos)
+                msg, pos = _read_str(body, pos)
+                self.lw = (topic, msg, bool(flags & 0x20))
+            if flags & 0x02:
+                self.subscriptions = []
+            self.connected = True
+            broker.attach(self)
+            self.send(b'\x20\x02\x00\x00')
+        elif kind == 0x30:      # PUBLISH
+            topic, pos = _read_str(body, 0)
+            qos = (first >> 1) & 0x03
+            if qos:
+                pid = body[pos:pos + 2]
+                pos += 2
+            broker.publish(topic, body[pos:], bool(first & 0x01), sender=self)
+            if qos == 1:
+                self.send(b'\x40\x02' + pid)
+        elif kind == 0x80:      # SUBSCRIBE
+            pid = body[:2]
+            pos = 2
+            topics = []
+            while pos < len(body):
+                topic, pos = _read_str(body, pos)
+                pos += 1        # 요청 QoS (0 으로 허용)
+                topics.append(topic)
+                if topic not in self.subscriptions:
+                    self.subscriptions.append(topic)
+            self.send(b'\x90' + _encode_remaining(2 + len(topics)) + pid + b'\x00' * len(topics))
+            for topic in topics:
+                for r_topic, r_msg in broker.retained.items():
+                    if topic_matches(topic, r_topic):
+                        self.send_publish(r_topic, r_msg, True)
+        elif kind == 0x40:      # PUBACK (브로커 -> 펌웨어 QoS 1 은 보내지 않으므로 무시)
+            pass
+        elif kind == 0xC0:      # PINGREQ
+            self.send(b'\xd0\x00')
+        elif kind == 0xE0:      # DISCONNECT
+            self.connected = False
+            broker.detach(self, graceful=True)
+            self.sock = None
+            self.stream._feed_eof()
+
+
+def connect(host, port, stream):
+    """uasyncio.open_connection 처리: 브로커/링크가 살아 있으면 세션 생성"""
+    if not (broker.up and network.link_up and network.WLAN(network.STA_IF).isconnected()):
+        raise OSError(-202)             # getaddrinfo 실패
+    return BrokerSession(stream)
+
+
+def install():
+    uasyncio.connect_handler = connect
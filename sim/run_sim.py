@@ -0,0 +1,103 @@
+"""
+dosingpumpfinal.py 를 가상 시계로 N일간 실행하고 투여 결과를 요약한다.
+
+예) 한 달치 투여 시뮬레이션 (펌프1 매일 08:00 5초, 펌프2 이틀마다 20:30 3초)
+    python sim/run_sim.py --days 30 --schedule 1,08:00,5000 --schedule 2,20:30,3000,2
+
+--profile 을 주면 cProfile 결과를 저장한다 (python -m pstats 로 확인).
+"""
+import argparse
+import cProfile
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+def parse_schedule(text):
+    """'펌프,HH:MM,duration_ms[,interval_days]' -> (펌프, [h, m, duration_ms, interval_days])"""
+    parts = text.split(',')
+    if len(parts) not in (3, 4):
+        raise argparse.ArgumentTypeError(f"잘못된 스케줄 형식: {text}")
+    h, m = (int(x) for x in parts[1].split(':'))
+    interval = int(parts[3]) if len(parts) == 4 else 1
+    return int(parts[0]), [h, m, int(parts[2]), interval]
+
+
+def parse_start(text):
+    """'YYYY-MM-DD[THH:MM]' -> 시각 튜플"""
+    date, _, hm = text.partition('T')
+    y, mo, d = (int(x) for x in date.split('-'))
+    h, mi = (int(x) for x in hm.split(':')) if hm else (0, 0)
+    return (y, mo, d, h, mi, 0)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    ap.add_argument('--days', type=float, default=1.0, help="시뮬레이션 기간 (일)")
+    ap.add_argument('--start', type=parse_start, default=None, help="시작 현지 시각 YYYY-MM-DD[THH:MM]")
+    ap.add_argument('--schedule', type=parse_schedule, action='append', default=[],
+                    help="펌프,HH:MM,duration_ms[,interval_days] (여러 번 지정 가능)")
+    ap.add_argument('--fs-dir', default=None, help="펌웨어 파일 시스템 디렉터리 (기본: 임시 디렉터리)")
+    ap.add_argument('--firmware', default=harness.FIRMWARE_PATH)
+    ap.add_argument('--console', default=None, help="펌웨어 콘솔 출력을 저장할 파일")
+    ap.add_argument('--fast', action='store_true',
+                    help="빨리 감기: 버튼/정지 감지 태스크 생략, 폴링 간격 완화 (투여 결과만 볼 때)")
+    ap.add_argument('--cpu-scale', type=float, default=0.0,
+                    help="태스크 실행에 걸린 호스트 시간 x 배율만큼 가상 시계 전진 (0: 실행 시간 0)")
+    ap.add_argument('--profile', default=None, help="cProfile 결과 저장 경로")
+    ap.add_argument('--doses', action='store_true', help="개별 투여 기록 출력")
+    args = ap.parse_args(argv)
+
+    fs_dir = args.fs_dir or tempfile.mkdtemp(prefix='dosesim-')
+    if args.schedule:
+        table = {}
+        for pump, item in args.schedule:
+            table.setdefault(str(pump), []).append(item)
+        os.makedirs(fs_dir, exist_ok=True)
+        with open(os.path.join(fs_dir, 'schedules.json'), 'w') as f:
+            json.dump(table, f)
+
+    console = open(args.console, 'w') if args.console else None
+    sim = harness.Simulation(fs_dir, start_local=args.start, firmware_path=args.firmware, console=console, fast=args.fast)
+    sim.load()
+    harness.loop.cpu_scale = args.cpu_scale
+    sim.start()
+
+    profiler = cProfile.Profile() if args.profile else None
+    t0 = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        sim.run_for(args.days * 86400)
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if console:
+            console.close()
+    host_s = time.perf_counter() - t0
+
+    result = sim.summary()
+    result['host_s'] = round(host_s, 2)
+    result['fs_dir'] = fs_dir
+    if args.doses:
+        result['doses'] = {
+            pump: ["%04d-%02d-%02d %02d:%02d:%02d %dms" % (sim.local_time(t0_us)[:6] + (us // 1000,))
+                   for t0_us, us in runs]
+            for pump, runs in sim.pump_runs().items()
+        }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not args.fs_dir:
+        shutil.rmtree(fs_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""
+gc 모듈 대체 (내장 모듈이라 harness 가 sys.modules 에 직접 연결)
+
+collect() 는 호출 횟수만 센다 (호스트 CPython 의 수집 비용은 기기와 무관하고 시뮬레이션을
+크게 느리게 한다). mem_alloc() 은 tracemalloc 이 켜져 있으면 추적 중인 호스트 메모리를,
+아니면 고정값을 보고한다.
+"""
+import gc as _host_gc
+import tracemalloc
+
+HEAP_SIZE = 2 * 1024 * 1024     # ESP32-S2 (PSRAM 2MB) MicroPython 힙 크기
+HEAP_BASELINE = 96 * 1024       # tracemalloc 미사용 시 보고할 사용량
+
+collect_count = 0
+_threshold = -1
+_enabled = True
+
+
+def collect():
+    global collect_count
+    collect_count += 1
+    return 0
+
+
+def mem_alloc():
+    if tracemalloc.is_tracing():
+        return min(tracemalloc.get_traced_memory()[0], HEAP_SIZE)
+    return HEAP_BASELINE
+
+
+def mem_free():
+    return HEAP_SIZE - mem_alloc()
+
+
+def threshold(amount=None):
+    global _threshold
+    if amount is None:
+        return _threshold
+    _threshold = amount
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def isenabled():
+    return _enabled
+
+
+get_referrers = _host_gc.get_referrers
@@ -0,0 +1,27 @@
+"""
+_thread 모듈 대체 (내장 모듈이라 경로로 가릴 수 없어 harness 가 sys.modules 에 직접 연결)
+
+start_new_thread() 로 시작한 함수는 실행하지 않고 기록만 한다 (버튼 폴링/캘리브레이션
+스레드는 time.sleep_ms 루프이므로 가상 시계에서는 돌릴 수 없다). 버튼 입력은 harness 가
+펌웨어의 button_events 에 직접 넣는다.
+"""
+import _thread as _host_thread
+
+started = []    # (함수, 인자)
+
+
+def allocate_lock():
+    return _host_thread.allocate_lock()
+
+
+def start_new_thread(function, args, kwargs=None):
+    started.append((function, args))
+    return len(started)
+
+
+def get_ident():
+    return 1
+
+
+def stack_size(size=None):
+    return 0
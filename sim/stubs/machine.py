@@ -0,0 +1,158 @@
+"""
+machine 모듈 대체 (Pin, PWM, WDT, I2C, unique_id, freq, reset)
+
+핀/PWM 변화는 가상 시각과 함께 기록되어 harness 가 펌프 동작 시간을 집계한다.
+"""
+from vclock import clock
+
+UNIQUE_ID = b'\x5e\xc1\x00\x00\xd0\x5e'   # CLIENT_ID -> "5ec10000d05e"
+I2C_DEVICES = [0x3c]                       # OLED 존재
+cpu_freq = 160000000
+
+pins = {}           # 핀 번호 -> 마지막으로 생성된 Pin
+pwm_events = []     # (t_us, 핀 번호, duty) - deinit 은 duty 0 으로 기록
+wdt = None          # 마지막으로 생성된 WDT
+_active_pwms = []
+
+
+class ResetRequested(BaseException):
+    """machine.reset() 호출 (시뮬레이션 중단)"""
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 2
+    PULL_DOWN = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        if value is None:
+            value = 1 if pull == Pin.PULL_UP else 0
+        self._value = value
+        self.handler = None
+        pins[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self._value = value
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self.handler = handler
+
+
+class PWM:
+    def __init__(self, pin, freq=5000, duty=None, duty_u16=None):
+        self.pin = pin
+        self._freq = freq
+        if duty_u16 is not None:
+            duty = duty_u16 >> 6
+        self._duty = 512 if duty is None else duty
+        self.active = True
+        _active_pwms.append(self)
+        pwm_events.append((clock.mono_us, pin.id, self._duty))
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty(self, d=None):
+        if d is None:
+            return self._duty
+        self._duty = d
+        pwm_events.append((clock.mono_us, self.pin.id, d))
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty << 6
+        self.duty(d >> 6)
+
+    def deinit(self):
+        if self.active:
+            self.active = False
+            _active_pwms.remove(self)
+            pwm_events.append((clock.mono_us, self.pin.id, 0))
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        global wdt
+        self.timeout_ms = timeout
+        self.last_feed_us = clock.mono_us
+        self.max_gap_us = 0
+        wdt = self
+
+    def feed(self):
+        gap = clock.mono_us - self.last_feed_us
+        if gap > self.max_gap_us:
+            self.max_gap_us = gap
+        self.last_feed_us = clock.mono_us
+
+    def expired(self):
+        return clock.mono_us - self.last_feed_us > self.timeout_ms * 1000
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.freq = freq
+
+    def scan(self):
+        return list(I2C_DEVICES)
+
+    def writeto(self, addr, buf, stop=True):
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        pass
+
+
+def power_on_reset():
+    """harness 용: 리셋 시 PWM 출력 정지, 핀/WDT 상태 초기화"""
+    global wdt
+    for pwm in list(_active_pwms):
+        pwm.deinit()
+    pins.clear()
+    wdt = None
+
+
+def unique_id():
+    return UNIQUE_ID
+
+def freq(hz=None):
+    global cpu_freq
+    if hz is None:
+        return cpu_freq
+    cpu_freq = hz
+
+def reset():
+    raise ResetRequested()
+
+def soft_reset():
+    raise ResetRequested()
+
+def reset_cause():
+    return 1
+
+def idle():
+    pass
@@ -0,0 +1,38 @@
+"""
+micropython 모듈 대체 - const() 는 값을 그대로 반환한다
+"""
+
+
+def const(value):
+    return value
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=None):
+    pass
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def heap_lock():
+    return 0
+
+
+def heap_unlock():
+    return 0
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def native(func):
+    return func
+
+
+viper = native
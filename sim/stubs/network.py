@@ -0,0 +1,111 @@
+"""
+network 모듈 대체 (WLAN)
+
+connect() 후 CONNECT_DELAY_MS 가 지나야 isconnected() 가 True 가 된다.
+harness 에서 set_link(False) 로 AP 단절을 흉내낼 수 있다.
+"""
+from vclock import clock
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 1000
+STAT_CONNECTING = 1001
+STAT_GOT_IP = 1010
+STAT_NO_AP_FOUND = 201
+STAT_WRONG_PASSWORD = 202
+STAT_BEACON_TIMEOUT = 200
+STAT_ASSOC_FAIL = 203
+STAT_HANDSHAKE_TIMEOUT = 204
+
+CONNECT_DELAY_MS = 1500
+AP_SSID = None      # 주변 AP 이름 (None 이면 어떤 SSID 로 연결해도 성공)
+AP_RSSI = -58
+AP_CHANNEL = 6
+link_up = True      # AP 도달 가능 여부
+
+_interfaces = {}
+
+
+def set_link(up):
+    """AP 연결 가능 여부 변경 (False 면 연결된 인터페이스도 끊김)"""
+    global link_up
+    link_up = up
+    if not up:
+        for wlan in _interfaces.values():
+            wlan._connected_at = None
+
+
+class WLAN:
+    PM_NONE = 0
+    PM_PERFORMANCE = 1
+    PM_POWERSAVE = 2
+
+    def __new__(cls, interface_id=STA_IF):
+        wlan = _interfaces.get(interface_id)
+        if wlan is None:
+            wlan = object.__new__(cls)
+            wlan._init(interface_id)
+            _interfaces[interface_id] = wlan
+        return wlan
+
+    def _init(self, interface_id):
+        self.interface_id = interface_id
+        self._active = False
+        self._ssid = None
+        self._connected_at = None   # 연결 완료 예정 시각 (us)
+        self._config = {'mac': b'\x5e\xc1\x00\x00\xd0\x5e', 'txpower': 20, 'hostname': 'esp32', 'pm': self.PM_PERFORMANCE}
+        self.connect_count = 0
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self._active
+        self._active = bool(is_active)
+        if not self._active:
+            self._connected_at = None
+
+    def connect(self, ssid=None, key=None, bssid=None):
+        if not self._active:
+            raise OSError("Wifi Not Started")
+        self._ssid = ssid
+        self.connect_count += 1
+        if link_up and (AP_SSID is None or ssid == AP_SSID):
+            self._connected_at = clock.mono_us + CONNECT_DELAY_MS * 1000
+        else:
+            self._connected_at = None
+
+    def disconnect(self):
+        self._connected_at = None
+
+    def isconnected(self):
+        return self._active and link_up and self._connected_at is not None and clock.mono_us >= self._connected_at
+
+    def status(self, param=None):
+        if param == 'rssi':
+            if not self.isconnected():
+                raise OSError("STA is not connected")
+            return AP_RSSI
+        if param is not None:
+            raise ValueError("unknown status param")
+        if self.isconnected():
+            return STAT_GOT_IP
+        if self._connected_at is not None:
+            return STAT_CONNECTING
+        return STAT_IDLE
+
+    def scan(self):
+        if not self._active:
+            raise OSError("Wifi Not Started")
+        if not link_up or AP_SSID is None:
+            return []
+        return [(AP_SSID.encode(), b'\x00\x11\x22\x33\x44\x55', AP_CHANNEL, AP_RSSI, 3, False)]
+
+    def ifconfig(self, config=None):
+        if self.isconnected():
+            return ('192.168.0.50', '255.255.255.0', '192.168.0.1', '192.168.0.1')
+        return ('0.0.0.0', '0.0.0.0', '0.0.0.0', '0.0.0.0')
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
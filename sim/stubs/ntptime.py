@@ -0,0 +1,22 @@
+"""
+ntptime 모듈 대체 - settime() 은 가상 시계의 RTC 를 시뮬레이션 시작 시각에 맞춘다
+"""
+import network
+from vclock import clock
+
+host = "pool.ntp.org"
+timeout = 1
+fail_next = 0       # 남은 강제 실패 횟수 (동기화 실패 경로 시험용)
+
+
+def time():
+    return clock.wall_time() - 946684800
+
+
+def settime():
+    global fail_next
+    if fail_next > 0 or not network.link_up:
+        fail_next = max(0, fail_next - 1)
+        clock.advance_us(timeout * 1000000)     # 응답 대기 시간만큼 블로킹
+        raise OSError(110)                      # ETIMEDOUT
+    clock.sync_rtc()
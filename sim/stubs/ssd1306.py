@@ -0,0 +1,80 @@
+"""
+ssd1306 모듈 대체
+
+픽셀 대신 text() 호출을 (x, y, 문자열) 로 모아 두고, show() 시점의 화면을 `frame` 에 남긴다.
+"""
+
+
+class SSD1306:
+    def __init__(self, width, height, external_vcc=False):
+        self.width = width
+        self.height = height
+        self.external_vcc = external_vcc
+        self.texts = []
+        self.frame = []     # 마지막 show() 시점의 텍스트 목록
+        self.frames = 0     # show() 호출 횟수
+        self.on = True
+
+    def fill(self, c):
+        self.texts = []
+
+    def fill_rect(self, x, y, w, h, c):
+        self.texts = [t for t in self.texts if not (x <= t[0] < x + w and y <= t[1] < y + h)]
+
+    def rect(self, x, y, w, h, c):
+        pass
+
+    def hline(self, x, y, w, c):
+        pass
+
+    def vline(self, x, y, h, c):
+        pass
+
+    def line(self, x1, y1, x2, y2, c):
+        pass
+
+    def pixel(self, x, y, c=None):
+        return 0 if c is None else None
+
+    def text(self, s, x, y, c=1):
+        if c:
+            self.texts.append((x, y, s))
+
+    def scroll(self, dx, dy):
+        pass
+
+    def blit(self, fbuf, x, y, key=-1):
+        pass
+
+    def show(self):
+        self.frame = sorted(self.texts, key=lambda t: (t[1], t[0]))
+        self.frames += 1
+
+    def poweroff(self):
+        self.on = False
+
+    def poweron(self):
+        self.on = True
+
+    def contrast(self, contrast):
+        pass
+
+    def invert(self, invert):
+        pass
+
+    def rotate(self, rotate):
+        pass
+
+    def screen_lines(self):
+        """마지막 프레임을 줄 단위 문자열로 반환"""
+        lines = {}
+        for x, y, s in self.frame:
+            lines.setdefault(y, []).append(s)
+        return [" ".join(lines[y]) for y in sorted(lines)]
+
+
+class SSD1306_I2C(SSD1306):
+    def __init__(self, width, height, i2c, addr=0x3C, external_vcc=False):
+        self.i2c = i2c
+        self.addr = addr
+        super().__init__(width, height, external_vcc)
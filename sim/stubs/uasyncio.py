@@ -0,0 +1,322 @@
+"""
+가상 시계 기반 uasyncio 대체 모듈
+
+실행할 태스크가 없으면 다음 깨어날 시각으로 가상 시계를 바로 건너뛰므로, 며칠치 스케줄을
+몇 초 안에 돌릴 수 있다. 펌웨어가 쓰는 API(create_task, current_task, sleep, sleep_ms, run,
+wait_for, wait_for_ms, CancelledError, TimeoutError, Event, open_connection/Stream)만 구현하고, 시뮬레이션 제어용으로
+`_loop.run_until()` 을 제공한다. open_connection() 은 `connect_handler(host, port, stream)` 가 돌려준 상대편(peer)과
+가상 스트림으로 연결한다 (peer.on_write(bytes) 로 송신 전달, peer 는 stream._feed()/_feed_eof() 로 응답).
+"""
+import heapq
+import time as _host_time
+import traceback
+
+from vclock import clock
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class _Sleep:
+    """sleep 요청 (loop 로 yield 됨)"""
+    __slots__ = ('us',)
+
+    def __init__(self, us):
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+class _Wait:
+    """태스크/이벤트 대기 요청 (waiters 목록에 등록 후 깨워질 때까지 정지)"""
+    __slots__ = ('waiters',)
+
+    def __init__(self, waiters):
+        self.waiters = waiters
+
+    def __await__(self):
+        yield self
+
+
+class _WaitTimeout:
+    """_Wait + 시간 제한 (먼저 일어난 쪽이 태스크를 깨움)"""
+    __slots__ = ('waiters', 'us')
+
+    def __init__(self, waiters, us):
+        self.waiters = waiters
+        self.us = us
+
+    def __await__(self):
+        yield self
+
+
+class Task:
+    def __init__(self, coro):
+        self.coro = coro
+        self.name = getattr(coro, '__name__', '')
+        self.done_flag = False
+        self.result = None
+        self.exc = None
+        self.waiters = []
+        self.token = 0          # 예약 세대 번호 (취소/재예약 시 이전 예약 무효화)
+        self.cancel_pending = False
+
+    def done(self):
+        return self.done_flag
+
+    def cancel(self):
+        if self.done_flag:
+            return False
+        self.cancel_pending = True
+        _loop.schedule(self, 0)
+        return True
+
+    def __await__(self):
+        if not self.done_flag:
+            yield _Wait(self.waiters)
+        if self.exc is not None:
+            raise self.exc
+        return self.result
+
+
+class Event:
+    def __init__(self):
+        self.state = False
+        self.waiters = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        _loop.wake_all(self.waiters)
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        if not self.state:
+            await _Wait(self.waiters)
+        return True
+
+
+class _Loop:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.clear()
+        self.cpu_scale = 0.0    # >0 이면 각 태스크 스텝의 호스트 실행 시간 x cpu_scale 만큼 가상 시계 전진
+        self.sleep_floor_us = 0 # floor_tasks 에 속한 태스크의 sleep 최소값 (빨리 감기용 폴링 간격 완화)
+        self.floor_tasks = ()   # 최상위 코루틴 함수 이름
+        self.steps = 0
+        self.errors = []        # (task, exc) - 처리되지 않은 태스크 예외
+
+    def clear(self):
+        """예약된 태스크 모두 제거 (재부팅)"""
+        self.queue = []
+        self.seq = 0
+        self.cur = None
+
+    def schedule(self, task, delay_us):
+        task.token += 1
+        self.seq += 1
+        heapq.heappush(self.queue, (clock.mono_us + delay_us, self.seq, task.token, task))
+
+    def wake_all(self, waiters):
+        for task, token in waiters:
+            if task.token == token and not task.done_flag:
+                self.schedule(task, 0)
+        del waiters[:]
+
+    def run_until(self, stop_us=None):
+        """stop_us(가상 us) 까지 실행. stop_us 가 None 이면 큐가 빌 때까지 실행"""
+        queue = self.queue
+        while queue:
+            wake_us, _, token, task = queue[0]
+            if stop_us is not None and wake_us > stop_us:
+                break
+            heapq.heappop(queue)
+            if token != task.token or task.done_flag:
+                continue
+            clock.advance_to_us(wake_us)
+            self._step(task)
+        if stop_us is not None:
+            clock.advance_to_us(stop_us)
+
+    def _step(self, task):
+        self.cur = task
+        self.steps += 1
+        t0 = _host_time.perf_counter() if self.cpu_scale else 0
+        try:
+            if task.cancel_pending:
+                task.cancel_pending = False
+                req = task.coro.throw(CancelledError())
+            else:
+                req = task.coro.send(None)
+        except StopIteration as e:
+            self._finish(task, e.value, None)
+        except CancelledError as e:
+            self._finish(task, None, e)
+        except Exception as e:
+            awaited = bool(task.waiters)
+            self._finish(task, None, e)
+            if not awaited:
+                self.errors.append((task, e))
+                _print_task_exception(e)
+        else:
+            if req is None:
+                self.schedule(task, 0)
+            elif type(req) is _Sleep:
+                us = req.us
+                if us < self.sleep_floor_us and task.name in self.floor_tasks:
+                    us = self.sleep_floor_us
+                self.schedule(task, us)
+            elif type(req) is _WaitTimeout:
+                # 같은 세대 번호로 타이머와 대기를 함께 등록: 먼저 깨운 쪽이 schedule() 로 번호를 올려 나머지를 무효화
+                self.schedule(task, req.us)
+                req.waiters.append((task, task.token))
+            else:
+                task.token += 1
+                req.waiters.append((task, task.token))
+        finally:
+            self.cur = None
+            if self.cpu_scale:
+                clock.advance_us((_host_time.perf_counter() - t0) * 1000000 * self.cpu_scale)
+
+    def _finish(self, task, result, exc):
+        task.done_flag = True
+        task.result = result
+        task.exc = exc
+        self.wake_all(task.waiters)
+
+
+def _print_task_exception(e):
+    print("Task exception wasn't retrieved")
+    traceback.print_exception(type(e), e, e.__traceback__)
+
+
+_loop = _Loop()
+
+
+def create_task(coro):
+    task = Task(coro)
+    _loop.schedule(task, 0)
+    return task
+
+
+def current_task():
+    return _loop.cur
+
+
+def sleep(seconds):
+    return _Sleep(int(seconds * 1000000))
+
+
+def sleep_ms(ms):
+    return _Sleep(int(ms) * 1000)
+
+
+async def wait_for(aw, timeout):
+    task = aw if isinstance(aw, Task) else create_task(aw)
+    if timeout is not None and not task.done_flag:
+        await _WaitTimeout(task.waiters, int(timeout * 1000000))
+        if not task.done_flag:
+            task.cancel()
+            raise TimeoutError()
+    return await task
+
+
+def wait_for_ms(aw, timeout):
+    return wait_for(aw, None if timeout is None else timeout / 1000)
+
+
+def run(coro):
+    task = create_task(coro)
+    while not task.done_flag and _loop.queue:
+        _loop.run_until(_loop.queue[0][0])
+    return task.result
+
+
+def get_event_loop():
+    return _loop
+
+
+# --- 가상 TCP 스트림 ---
+connect_handler = None      # fn(host, port, stream) -> peer (연결할 수 없으면 OSError)
+
+
+class Stream:
+    """open_connection() 이 돌려주는 스트림 (읽기/쓰기 겸용, MicroPython 처럼 reader 와 writer 가 같은 객체)"""
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.rx = bytearray()
+        self.eof = False
+        self.waiters = []
+        self.out = bytearray()
+        self.closed = False
+
+    # 상대편에서 호출
+    def _feed(self, data):
+        self.rx += data
+        _loop.wake_all(self.waiters)
+
+    def _feed_eof(self):
+        self.eof = True
+        _loop.wake_all(self.waiters)
+
+    # 펌웨어 API
+    async def read(self, n=-1):
+        while not self.rx and not self.eof:
+            await _Wait(self.waiters)
+        if n < 0:
+            n = len(self.rx)
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    async def readexactly(self, n):
+        while len(self.rx) < n:
+            if self.eof:
+                raise EOFError()
+            await _Wait(self.waiters)
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def write(self, buf):
+        if self.closed:
+            raise OSError(9)
+        self.out += buf
+
+    async def drain(self):
+        if self.closed:
+            raise OSError(9)
+        if self.out:
+            data = bytes(self.out)
+            self.out = bytearray()
+            self.peer.on_write(data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._feed_eof()
+            self.peer.on_close()
+
+    async def wait_closed(self):
+        pass
+
+
+async def open_connection(host, port):
+    if connect_handler is None:
+        raise OSError(-202)
+    stream = Stream(None)
+    stream.peer = connect_handler(host, port, stream)
+    return stream, stream
@@ -0,0 +1 @@
+from json import dump, dumps, load, loads
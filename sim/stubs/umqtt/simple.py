@@ -0,0 +1,161 @@
+"""
+umqtt.simple 대체 + 프로세스 내 브로커
+
+모든 MQTTClient (와 mqtt_wire.BrokerSession) 는 모듈 전역 `broker` 에 붙는다. harness(또는 폰 앱 역할의 코드)는
+broker.publish() 로 명령을 넣고 broker.retained / broker.log 로 펌웨어 발행을 확인한다.
+check_msg() 는 실제 라이브러리처럼 한 번에 최대 한 개의 메시지만 처리한다.
+"""
+from collections import deque
+
+import network
+from vclock import clock
+
+
+class MQTTException(Exception):
+    pass
+
+
+def topic_matches(pattern, topic):
+    """MQTT 토픽 필터(+, #) 일치 여부 (bytes)"""
+    p_parts = pattern.split(b'/')
+    t_parts = topic.split(b'/')
+    for i, p in enumerate(p_parts):
+        if p == b'#':
+            return True
+        if i >= len(t_parts):
+            return False
+        if p != b'+' and p != t_parts[i]:
+            return False
+    return len(p_parts) == len(t_parts)
+
+
+class Broker:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.up = True
+        self.clients = []
+        self.retained = {}      # 토픽 -> 페이로드 (bytes)
+        self.log = []           # (t_us, 토픽, 페이로드, retain, 발행 클라이언트 ID 또는 None)
+        self.deliveries = []    # (t_us, 수신 클라이언트 ID, 토픽, 페이로드) - 콜백 호출 시점
+        self.keep_log = True
+        self.listeners = []     # fn(t_us, topic, msg, retain) - 발행마다 호출
+
+    def attach(self, client):
+        if client not in self.clients:
+            self.clients.append(client)
+
+    def detach(self, client, graceful=True):
+        if client in self.clients:
+            self.clients.remove(client)
+            if not graceful and client.lw:
+                self.publish(*client.lw)
+
+    def publish(self, topic, msg, retain=False, sender=None):
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        now = clock.mono_us
+        if retain:
+            if msg:
+                self.retained[topic] = msg
+            else:
+                self.retained.pop(topic, None)
+        if self.keep_log:
+            self.log.append((now, topic, msg, retain, sender.client_id if sender else None))
+        for fn in self.listeners:
+            fn(now, topic, msg, retain)
+        for client in self.clients:
+            for pattern in client.subscriptions:
+                if topic_matches(pattern, topic):
+                    client.inbox.append((topic, msg))
+                    break
+
+    def drop_clients(self):
+        """브로커 측 연결 강제 종료 (LWT 발행)"""
+        for client in list(self.clients):
+            client.sock = None
+            self.detach(client, graceful=False)
+            drop = getattr(client, 'drop', None)     # mqtt_wire.BrokerSession: 스트림에 EOF
+            if drop is not None:
+                drop()
+
+
+broker = Broker()
+
+
+class MQTTClient:
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
+                 ssl=False, ssl_params={}):
+        if isinstance(client_id, str):
+            client_id = client_id.encode()
+        self.client_id = client_id
+        self.server = server
+        self.port = port
+        self.user = user
+        self.pswd = password
+        self.keepalive = keepalive
+        self.cb = None
+        self.sock = None
+        self.lw = None
+        self.subscriptions = []
+        self.inbox = deque()
+
+    def set_callback(self, f):
+        self.cb = f
+
+    def set_last_will(self, topic, msg, retain=False, qos=0):
+        self.lw = (topic, msg, retain)
+
+    def _check_link(self):
+        if self.sock is None:
+            raise OSError(9)            # EBADF
+        if not (broker.up and network.link_up and self in broker.clients):
+            self.sock = None
+            raise OSError(104)          # ECONNRESET
+
+    def connect(self, clean_session=True):
+        if not (broker.up and network.WLAN(network.STA_IF).isconnected()):
+            raise OSError(-202)         # getaddrinfo 실패
+        self.sock = True
+        if clean_session:
+            self.subscriptions = []
+            self.inbox.clear()
+        broker.attach(self)
+        return 0
+
+    def disconnect(self):
+        broker.detach(self)
+        self.sock = None
+
+    def ping(self):
+        self._check_link()
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        self._check_link()
+        broker.publish(topic, msg, retain, sender=self)
+
+    def subscribe(self, topic, qos=0):
+        self._check_link()
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+        for r_topic, r_msg in broker.retained.items():
+            if topic_matches(topic, r_topic):
+                self.inbox.append((r_topic, r_msg))
+
+    def wait_msg(self):
+        self._check_link()
+        if not self.inbox:
+            return None
+        topic, msg = self.inbox.popleft()
+        if broker.keep_log:
+            broker.deliveries.append((clock.mono_us, self.client_id, topic, msg))
+        self.cb(topic, msg)
+        return 0x30
+
+    def check_msg(self):
+        return self.wait_msg()
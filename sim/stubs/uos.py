@@ -0,0 +1 @@
+from os import listdir, mkdir, remove, rename, rmdir, stat, statvfs, getcwd, chdir
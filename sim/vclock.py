@@ -0,0 +1,106 @@
+"""
+가상 시계 + MicroPython 호환 `time` 모듈
+
+시뮬레이션 동안 펌웨어의 `import time` 은 이 모듈로 연결된다 (harness.firmware_modules 참고).
+- ticks_ms/ticks_us 는 실제 기기처럼 2**30 주기로 순환한다 (ticks_ms 는 약 12.4일마다 순환).
+- time()/localtime()/mktime() 은 MicroPython 과 같이 2000-01-01 기준 초를 사용한다.
+- RTC 는 ntptime.settime() 전까지 0(=2000년)에서 시작하므로 펌웨어의 '시간 미동기' 경로도 그대로 실행된다.
+- sleep()/sleep_ms() 는 가상 시계를 그 자리에서 전진시킨다 (이벤트 루프를 막는 블로킹 호출과 동일한 효과).
+"""
+import calendar
+import time as _host_time
+
+EPOCH_2000 = 946684800          # 1970 -> 2000 오프셋 (초)
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class VirtualClock:
+    """부팅 후 경과 시간(us)과 RTC 를 가진 가상 시계"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, wall_start=None):
+        """wall_start: NTP 동기화 시 RTC 에 설정할 시작 시각 (유닉스 초, None 이면 현재 호스트 시각)"""
+        self.mono_us = 0
+        self.boot_us = 0        # 마지막 부팅 시점 (ticks 는 부팅마다 0 부터 다시 시작)
+        self.rtc_base = 0       # mono_us == 0 시점의 RTC 값 (2000년 기준 초)
+        self.wall_start = _host_time.time() if wall_start is None else wall_start
+
+    def now_us(self):
+        return self.mono_us
+
+    def advance_us(self, us):
+        if us > 0:
+            self.mono_us += int(us)
+
+    def advance_to_us(self, t_us):
+        if t_us > self.mono_us:
+            self.mono_us = int(t_us)
+
+    def reboot(self):
+        """machine.reset() 이후: ticks 는 0 부터, RTC 는 유지"""
+        self.boot_us = self.mono_us
+
+    def rtc_seconds(self):
+        return self.rtc_base + self.mono_us // 1000000
+
+    def set_rtc(self, secs_2000):
+        """RTC 를 2000년 기준 초로 설정"""
+        self.rtc_base = int(secs_2000) - self.mono_us // 1000000
+
+    def sync_rtc(self):
+        """NTP 동기화 대용: wall_start + 부팅 후 경과 시간으로 RTC 설정"""
+        self.set_rtc(self.wall_start - EPOCH_2000 + self.mono_us // 1000000)
+
+    def wall_time(self):
+        """현재 가상 시각 (유닉스 초, RTC 동기 여부와 무관)"""
+        return self.wall_start + self.mono_us / 1000000
+
+
+clock = VirtualClock()
+
+
+# --- MicroPython time API ---
+def ticks_us():
+    return (clock.mono_us - clock.boot_us) & TICKS_MAX
+
+def ticks_ms():
+    return ((clock.mono_us - clock.boot_us) // 1000) & TICKS_MAX
+
+def ticks_cpu():
+    return ticks_us()
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+def sleep(seconds):
+    clock.advance_us(seconds * 1000000)
+
+def sleep_ms(ms):
+    clock.advance_us(ms * 1000)
+
+def sleep_us(us):
+    clock.advance_us(us)
+
+def time():
+    return clock.rtc_seconds()
+
+def time_ns():
+    return (clock.rtc_base * 1000000 + clock.mono_us) * 1000
+
+def gmtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _host_time.gmtime(int(secs) + EPOCH_2000)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+localtime = gmtime  # 기기 RTC 는 UTC (시간대 보정은 펌웨어의 TIMEZONE_OFFSET 이 담당)
+
+def mktime(tup):
+    return calendar.timegm(tuple(tup[:6])) - EPOCH_2000